@@ -1,11 +1,21 @@
 import json
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable
+from urllib.parse import quote
 
 import requests
 from avala_shared.logs import logger
 from avala_shared.util import colorize
 
 from .config import DOT_DIR_PATH, ConnectionConfig
-from .models import UnscopedAttackData
+from .models import (
+    ServiceScopedAttackData,
+    TargetScopedAttackData,
+    UnscopedAttackData,
+)
 from .schemas import GameResponse, ScheduleResponse
 
 
@@ -20,6 +30,9 @@ class APIClient:
         self.conn_str: str
         self.game: GameResponse
         self.schedule: ScheduleResponse
+        self.attack_data_version: str | None = None
+        self._attack_data_lock = threading.RLock()
+        self._attack_data_request: Future[UnscopedAttackData] | None = None
 
     def connect(self):
         """Connect to the server and fetch game information."""
@@ -150,20 +163,105 @@ class APIClient:
         Fetches the latest attack data from the server by long polling.
         Useful for starting the attacks using the latest up-to-date attack data.
 
+        Once a version of attack data was received, waits for a newer version, and
+        keeps using the cached attack data if none is published before the end of the
+        current tick. Newer versions are received as deltas applied to the cached
+        attack data, if the server still has the cached version.
+
+        Only one long poll runs at a time. Threads calling this while it runs get the
+        attack data it receives.
+
         :return: Unscoped attack data covering flag IDs from all services, targets and ticks.
         :rtype: UnscopedAttackData
         """
+        with self._attack_data_lock:
+            request = self._attack_data_request
+            if request is None:
+                request = self._attack_data_request = Future()
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            return request.result()
+
         try:
-            response = requests.get(f"{self.conn_str}/attack-data/subscribe")
-            response.raise_for_status()
+            request.set_result(self._long_poll_attack_data())
+        except BaseException as e:
+            request.set_exception(e)
+        finally:
+            with self._attack_data_lock:
+                self._attack_data_request = None
 
-            if response.status_code == 200:
-                self._cache_attack_data(response.json())
+        return request.result()
 
-            return UnscopedAttackData(response.json())
+    def _long_poll_attack_data(self) -> UnscopedAttackData:
+        """
+        Makes a single long poll for attack data newer than the cached version, and
+        caches the result.
+
+        :return: Unscoped attack data covering flag IDs from all services, targets and ticks.
+        :rtype: UnscopedAttackData
+        """
+        wait = self._get_seconds_until_next_tick()
+        try:
+            response = requests.get(
+                f"{self.conn_str}/attack-data/subscribe",
+                params=(
+                    {"since": self.attack_data_version, "delta": True, "timeout": wait}
+                    if self.attack_data_version
+                    else None
+                ),
+                timeout=(5, wait + 5),
+            )
+            response.raise_for_status()
+
+            if response.status_code == 304:
+                return self._read_cached_attack_data()
+
+            if response.status_code != 200:
+                return UnscopedAttackData(response.json())
+
+            with self._attack_data_lock:
+                if response.headers.get("X-Avala-Delta-Base") is not None:
+                    try:
+                        data = apply_attack_data_delta(
+                            self._read_cached_attack_data().serialize(),
+                            response.json(),
+                        )
+                    except Exception:
+                        # The cached copy is missing or out of sync, start over.
+                        self.attack_data_version = None
+                        return self.get_attack_data()
+                else:
+                    data = response.json()
+
+                self._cache_attack_data(data)
+                self.attack_data_version = response.headers.get("X-Avala-Version")
+
+            return UnscopedAttackData(data)
         except Exception:
             return self._get_cached_attack_data()
 
+    def _get_seconds_until_next_tick(self, minimum: float = 2) -> float:
+        """
+        Returns the number of seconds left until the next tick starts, so long polls don't outlive the tick
+        they were made in. If less than `minimum` is left, the clock is assumed to be slightly behind the
+        server's, and the end of the following tick is used instead.
+
+        :param minimum: Shortest time worth waiting, defaults to 2.
+        :type minimum: float, optional
+        :return: Seconds until the next tick.
+        :rtype: float
+        """
+        tick_duration = self.schedule.tick_duration
+        elapsed = (
+            datetime.now(self.schedule.first_tick_start.tzinfo)
+            - self.schedule.first_tick_start
+        ).total_seconds()
+        remaining = tick_duration - elapsed % tick_duration
+        return remaining if remaining >= minimum else remaining + tick_duration
+
     def get_attack_data(self) -> UnscopedAttackData:
         """
         Fetches the current available attack data from the server.
@@ -177,12 +275,77 @@ class APIClient:
             response.raise_for_status()
 
             if response.status_code == 200:
-                self._cache_attack_data(response.json())
+                with self._attack_data_lock:
+                    self._cache_attack_data(response.json())
+                    self.attack_data_version = response.headers.get("X-Avala-Version")
 
             return UnscopedAttackData(response.json())
         except Exception:
             return self._get_cached_attack_data()
 
+    def listen_for_attack_data(
+        self,
+        callback: Callable[[str, int | None], None],
+        retry_interval: float = 5,
+    ) -> None:
+        """
+        Listens for attack data updates pushed by the server, and calls the callback with the version and tick
+        of each new version. Reconnects if the connection is lost. Blocks, so it should run in its own thread.
+
+        :param callback: Function called with the version and tick of new attack data.
+        :type callback: Callable[[str, int | None], None]
+        :param retry_interval: Seconds to wait before reconnecting, defaults to 5.
+        :type retry_interval: float, optional
+        """
+        while True:
+            try:
+                with requests.get(
+                    f"{self.conn_str}/attack-data/stream",
+                    stream=True,
+                    timeout=(5, None),
+                ) as response:
+                    response.raise_for_status()
+                    for line in response.iter_lines(decode_unicode=True):
+                        if line and line.startswith("data: "):
+                            update = json.loads(line[len("data: ") :])
+                            callback(update["version"], update.get("tick"))
+            except Exception as e:
+                logger.debug("Attack data stream disconnected: {error}", error=e)
+
+            time.sleep(retry_interval)
+
+    def get_service_attack_data(self, service: str) -> ServiceScopedAttackData:
+        """
+        Fetches the current attack data of a single service, without downloading attack data of other services.
+
+        :param service: Name of the service.
+        :type service: str
+        :return: Attack data for the specified service and all its targets.
+        :rtype: ServiceScopedAttackData
+        """
+        response = requests.get(f"{self.conn_str}/attack-data/{quote(service, safe='')}")
+        response.raise_for_status()
+        return ServiceScopedAttackData(response.json())
+
+    def get_target_attack_data(
+        self, service: str, target: str
+    ) -> TargetScopedAttackData:
+        """
+        Fetches the current attack data of a single target of a service.
+
+        :param service: Name of the service.
+        :type service: str
+        :param target: IP address or hostname of the target/victim team.
+        :type target: str
+        :return: Attack data for the specified service and target.
+        :rtype: TargetScopedAttackData
+        """
+        response = requests.get(
+            f"{self.conn_str}/attack-data/{quote(service, safe='')}/{quote(target, safe='')}"
+        )
+        response.raise_for_status()
+        return TargetScopedAttackData(response.json())
+
     def _cache_attack_data(self, response_json: dict) -> None:
         """
         Caches the fetched attack data to a JSON file as a temporary fallback in case of
@@ -204,7 +367,17 @@ class APIClient:
         :rtype: UnscopedAttackData
         """
         logger.warning("Failed to fetch attack data. Using cached attack data instead.")
+        return self._read_cached_attack_data()
 
+    def _read_cached_attack_data(self) -> UnscopedAttackData:
+        """
+        Reads the attack data cached by the last successful fetch.
+
+        :raises FileNotFoundError: Attack data was never fetched.
+        :raises RuntimeError: Attack data is corrupted or was never fetched.
+        :return: Unscoped attack data covering flag IDs from all services, targets and ticks.
+        :rtype: UnscopedAttackData
+        """
         if not (DOT_DIR_PATH / "cached_attack_data.json").exists():
             raise FileNotFoundError("Attack data was never fetched.")
 
@@ -213,3 +386,35 @@ class APIClient:
                 return UnscopedAttackData(json.load(file))
             except Exception:
                 raise RuntimeError("Attack data is corrupted or was never fetched.")
+
+
+def apply_attack_data_delta(data: dict, delta: dict) -> dict:
+    """
+    Applies a delta received from the server to attack data. Each target either gets
+    new ticks prepended to its flag IDs, which are then cut to the new length, or its
+    flag IDs replaced. Services and targets set to None are removed.
+
+    :param data: Attack data the delta is based on.
+    :type data: dict
+    :param delta: Delta received from the server.
+    :type delta: dict
+    :return: Updated attack data.
+    :rtype: dict
+    """
+    for service, targets_delta in delta.items():
+        if targets_delta is None:
+            data.pop(service, None)
+            continue
+
+        targets = data.setdefault(service, {})
+        for target, change in targets_delta.items():
+            if change is None:
+                targets.pop(target, None)
+            elif "replace" in change:
+                targets[target] = change["replace"]
+            else:
+                targets[target] = (change["prepend"] + targets[target])[
+                    : change["length"]
+                ]
+
+    return data
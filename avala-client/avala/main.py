@@ -2,6 +2,7 @@ import concurrent.futures
 import importlib
 import importlib.util
 import re
+import threading
 from concurrent.futures import Future
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -52,6 +53,11 @@ class Avala:
         )
         self._client: APIClient
         self._scheduler: BlockingScheduler
+        self._first_tick_start: datetime
+
+        self._attack_data_lock = threading.Lock()
+        self._attack_data_waiter: Future[UnscopedAttackData] | None = None
+        self._pushed_attack_data: tuple[int | None, UnscopedAttackData] | None = None
 
         self._exploit_directories: list[Path] = []
         self._before_all_hook: Callable | None = None
@@ -73,6 +79,7 @@ class Avala:
             self._client.schedule.first_tick_start,
             self._client.schedule.tz,
         )
+        self._first_tick_start = first_tick_start
 
         next_tick_start = get_next_tick_start(
             first_tick_start,
@@ -88,6 +95,13 @@ class Avala:
             next_run_time=next_tick_start,
         )
 
+        # Start exploits that need flag IDs as soon as the server pushes them.
+        threading.Thread(
+            target=self._client.listen_for_attack_data,
+            args=(self._on_attack_data_pushed,),
+            daemon=True,
+        ).start()
+
         # Schedule job that enqueues pending (non forwarded) flags every 15 seconds.
         self._scheduler.add_job(
             func=self._enqueue_pending_flags,
@@ -393,7 +407,7 @@ class Avala:
         fetching attack_data and running before_all and after_all hooks.
         """
         executor = concurrent.futures.ThreadPoolExecutor()
-        attack_data_future = executor.submit(self._client.wait_for_attack_data)
+        attack_data_future = self._get_attack_data_future(executor)
 
         if self._before_all_hook:
             self._before_all_hook()
@@ -438,6 +452,76 @@ class Avala:
         if self._after_all_hook:
             self._after_all_hook()
 
+    def _get_attack_data_future(
+        self, executor: concurrent.futures.Executor
+    ) -> Future[UnscopedAttackData]:
+        """
+        Returns a future resolved with attack data of the current tick, either pushed by the server or fetched
+        by long polling, whichever comes first. Attack data pushed before the local tick started, for example
+        due to clock skew, is used right away.
+
+        :param executor: Executor to long poll for attack data in.
+        :type executor: concurrent.futures.Executor
+        :return: Future object that will return `UnscopedAttackData` of the current tick.
+        :rtype: Future[UnscopedAttackData]
+        """
+        future: Future[UnscopedAttackData] = Future()
+
+        with self._attack_data_lock:
+            pushed, self._pushed_attack_data = self._pushed_attack_data, None
+            if pushed is not None and (pushed[0] or 0) >= self._get_current_tick():
+                future.set_result(pushed[1])
+                return future
+            self._attack_data_waiter = future
+
+        def wait_for_attack_data():
+            try:
+                attack_data = self._client.wait_for_attack_data()
+            except Exception as e:
+                attack_data, error = None, e
+
+            with self._attack_data_lock:
+                if self._attack_data_waiter is future:
+                    self._attack_data_waiter = None
+                if future.done():
+                    return
+                if attack_data is not None:
+                    future.set_result(attack_data)
+                else:
+                    future.set_exception(error)
+
+        executor.submit(wait_for_attack_data)
+        return future
+
+    def _on_attack_data_pushed(self, version: str, tick: int | None):
+        """
+        Fetches attack data pushed by the server, and hands it to exploits waiting for it. If none are waiting
+        yet, it's kept for the next tick.
+
+        :param version: Version of the new attack data.
+        :type version: str
+        :param tick: Tick of the new attack data.
+        :type tick: int | None
+        """
+        if version == self._client.attack_data_version:
+            return
+
+        attack_data = self._client.wait_for_attack_data()
+        logger.info("Received new attack data pushed by the server.")
+
+        with self._attack_data_lock:
+            if self._attack_data_waiter is not None:
+                if not self._attack_data_waiter.done():
+                    self._attack_data_waiter.set_result(attack_data)
+                self._attack_data_waiter = None
+            else:
+                self._pushed_attack_data = (tick, attack_data)
+
+    def _get_current_tick(self) -> int:
+        now = datetime.now(self._first_tick_start.tzinfo)
+        tick_duration = timedelta(seconds=self._client.schedule.tick_duration)
+        return (now - self._first_tick_start) // tick_duration + 1
+
     def _run_hook(self, func: Callable | None):
         """
         Runs a hook function, catches and logs any exceptions that occur.
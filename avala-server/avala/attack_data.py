@@ -1,130 +1,683 @@
 import asyncio
+import gzip
 import hashlib
+import inspect
 import json
 import os
 import sys
 import time
+from collections import deque
+from datetime import datetime
 from importlib import import_module, reload
-from typing import Any, Callable
+from typing import Any, Callable, Literal
 
 from avala_shared.logs import logger
 
+from .broadcast import broadcast
 from .config import config
-from .database import get_sync_db_session
-from .state import StateManager
+from .database import get_async_db_session
+from .schemas import AttackDataUpdate
+from .state import AsyncStateManager
+
+try:
+    import zstandard
+except ImportError:  # Optional, served only if installed
+    zstandard = None
 
 attack_data_updated_event: asyncio.Event = asyncio.Event()
+attack_data_loop: asyncio.AbstractEventLoop | None = None
+background_polling: asyncio.Task | None = None
+
+# Validators (e.g. ETag) of the last response of the game server, kept across
+# reloads of the user's module for conditional requests.
+fetch_validators: dict[str, str] = {}
+
+# Fingerprint of the last raw response body returned by the user's fetch function,
+# used to skip parsing bodies identical to the last one.
+raw_fingerprint: str | None = None
+
+
+def fingerprint_bytes(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def fingerprint_attack_data(data: Any) -> str:
+    """
+    Computes a fingerprint of fetched attack data that doesn't depend on the order of keys, by hashing its
+    canonical serialization. Serializing with sorted keys runs in C, unlike rebuilding the data in Python.
+
+    :param data: Fetched attack data.
+    :type data: Any
+    :return: Fingerprint of the attack data.
+    :rtype: str
+    """
+    canonical_json = json.dumps(
+        data, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return fingerprint_bytes(canonical_json.encode())
+
+
+# Bodies smaller than this are served uncompressed, since compression barely
+# shrinks them.
+MIN_COMPRESSED_SIZE = 1024
+
+
+class EncodedAttackData:
+    """
+    Attack data encoded once as JSON and served as-is to every client, along with its compressed variants. The
+    version (and ETag) is derived from the encoded data, so clients that already have it get a 304.
+
+    :param body: Attack data encoded as JSON.
+    :type body: bytes
+    :param tick: Tick the attack data was fetched in, or None if unknown.
+    :type tick: int | None
+    """
+
+    def __init__(self, body: bytes, tick: int | None) -> None:
+        self.body = body
+        self.tick = tick
+        self.version = fingerprint_bytes(self.body)
+        self.etag = '"%s"' % self.version
+        self.deltas: dict[str, EncodedAttackData] = {}
+
+        # Ordered by preference, zstd is smaller and faster to decompress.
+        self.encodings: dict[str, bytes] = {}
+        if len(self.body) < MIN_COMPRESSED_SIZE:
+            return
+        if zstandard is not None:
+            self.encodings["zstd"] = zstandard.ZstdCompressor(level=3).compress(
+                self.body
+            )
+        self.encodings["gzip"] = gzip.compress(self.body, 6)
+
+
+class AttackDataSnapshot(EncodedAttackData):
+    """
+    Latest processed attack data, along with slices of it for each service and each target of a service. The
+    slices are encoded once along with the snapshot and have their own versions, so clients that only need
+    some services don't download the rest, and don't download it again if their slice didn't change.
+
+    Deltas from previous versions are encoded as well, so clients that have one of them only download what
+    changed since (see `diff_attack_data`).
+
+    :param json_hash: Hash of the raw attack data the snapshot was processed from.
+    :type json_hash: str
+    :param attack_data: Processed attack data encoded as JSON.
+    :type attack_data: str
+    :param tick: Tick the attack data was fetched in, or None if unknown.
+    :type tick: int | None
+    :param previous: Snapshots of previous versions to encode deltas from, defaults to None.
+    :type previous: list[AttackDataSnapshot] | None, optional
+    """
+
+    def __init__(
+        self,
+        json_hash: str,
+        attack_data: str,
+        tick: int | None,
+        previous: list["AttackDataSnapshot"] | None = None,
+    ) -> None:
+        super().__init__(attack_data.encode(), tick)
+        self.json_hash = json_hash
+        self.data: dict[str, dict[str, list[Any]]] = json.loads(attack_data)
+
+        self.services: dict[str, EncodedAttackData] = {}
+        self.targets: dict[tuple[str, str], EncodedAttackData] = {}
+
+        for snapshot in previous or []:
+            if snapshot.version != self.version:
+                delta = diff_attack_data(snapshot.data, self.data)
+                self.deltas[snapshot.version] = EncodedAttackData(
+                    json.dumps(delta).encode(), tick
+                )
+
+        for service, targets in self.data.items():
+            self.services[service] = EncodedAttackData(
+                json.dumps(targets).encode(), tick
+            )
+            for target, ticks in targets.items():
+                self.targets[(service, target)] = EncodedAttackData(
+                    json.dumps(ticks).encode(), tick
+                )
+
+
+def diff_attack_data(
+    old: dict[str, dict[str, list[Any]]], new: dict[str, dict[str, list[Any]]]
+) -> dict[str, dict[str, dict | None] | None]:
+    """
+    Computes a delta between two versions of processed attack data. Lists of flag IDs of each target usually
+    shift by one tick between versions, so they are sent as the new ticks to prepend to the old list, which is
+    then cut to the new length. Targets whose flag IDs changed otherwise are sent whole.
+
+    Services and targets that didn't change are left out of the delta, while removed ones are set to None:
+
+    {
+        "SomeService": {
+            "10.10.24.5": {"prepend": ["foo"], "length": 5},
+            "10.10.25.5": {"replace": ["bar", "baz"]},
+            "10.10.26.5": None,
+        },
+        "RemovedService": None,
+    }
+
+    :param old: Attack data the client has.
+    :type old: dict[str, dict[str, list[Any]]]
+    :param new: Current attack data.
+    :type new: dict[str, dict[str, list[Any]]]
+    :return: Delta that turns the old attack data into the new one.
+    :rtype: dict[str, dict[str, dict | None] | None]
+    """
+    delta: dict[str, dict[str, dict | None] | None] = {
+        service: None for service in old.keys() - new.keys()
+    }
+
+    for service, targets in new.items():
+        old_targets = old.get(service, {})
+        service_delta: dict[str, dict | None] = {
+            target: None for target in old_targets.keys() - targets.keys()
+        }
+
+        for target, ticks in targets.items():
+            old_ticks = old_targets.get(target)
+            if ticks == old_ticks:
+                continue
+
+            if old_ticks is not None:
+                # Find the fewest new ticks that, prepended to the old ticks, give
+                # the new list. Prepending all of them is just a replacement.
+                for count in range(1, len(ticks)):
+                    if ticks[count:] == old_ticks[: len(ticks) - count]:
+                        service_delta[target] = {
+                            "prepend": ticks[:count],
+                            "length": len(ticks),
+                        }
+                        break
+
+            if target not in service_delta:
+                service_delta[target] = {"replace": ticks}
+
+        if service_delta:
+            delta[service] = service_delta
+
+    return delta
+
+
+current_snapshot: AttackDataSnapshot | None = None
+new_version_event: asyncio.Event = asyncio.Event()
+reload_finished_event: asyncio.Event = asyncio.Event()
+snapshot_history: deque[AttackDataSnapshot] = deque(
+    maxlen=config.attack_data.delta_history
+)
+snapshot_lock: asyncio.Lock = asyncio.Lock()
+
+
+def publish_snapshot(snapshot: AttackDataSnapshot):
+    """
+    Makes the snapshot the current attack data and wakes up clients waiting for a newer version. Must be
+    called from the event loop.
+    """
+    global current_snapshot, new_version_event
+
+    current_snapshot = snapshot
+    snapshot_history.append(snapshot)
+    new_version_event.set()
+    new_version_event = asyncio.Event()
+
+
+async def announce_snapshot(snapshot: AttackDataSnapshot):
+    """
+    Broadcasts the version of new attack data on the `attack_data` channel, pushing it to clients connected to
+    the attack data stream.
+    """
+    try:
+        await broadcast.publish(
+            channel="attack_data",
+            message=AttackDataUpdate(
+                version=snapshot.version, tick=snapshot.tick
+            ).model_dump_json(),
+        )
+    except Exception as e:
+        logger.error("Failed to announce new attack data: {error}", error=e)
+
+
+async def wait_for_new_version(since: str, timeout: float) -> AttackDataSnapshot | None:
+    """
+    Returns the current attack data right away if its version differs from `since`, or waits until a newer
+    version is published, a reload finishes without one, or the timeout passes.
+
+    :param since: Version of the attack data the client already has.
+    :type since: str
+    :param timeout: Maximum number of seconds to wait.
+    :type timeout: float
+    :return: Current attack data, which has the same version as `since` if there is no newer one.
+    :rtype: AttackDataSnapshot | None
+    """
+    if current_snapshot is not None and current_snapshot.version != since:
+        return current_snapshot
+
+    waiters = [
+        asyncio.ensure_future(new_version_event.wait()),
+        asyncio.ensure_future(reload_finished_event.wait()),
+    ]
+    try:
+        await asyncio.wait(
+            waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+        )
+    finally:
+        for waiter in waiters:
+            waiter.cancel()
+    return current_snapshot
+
+
+async def announce_reload(status: Literal["started", "finished"]):
+    """
+    Broadcasts the progress of reloading attack data on the `attack_data_reload` channel, so all server workers
+    hold and release clients waiting for attack data at the same time as the leader, which reloads it.
+    """
+    try:
+        await broadcast.publish(channel="attack_data_reload", message=status)
+    except Exception as e:
+        logger.error("Failed to announce attack data reload: {error}", error=e)
+
+
+async def follow_attack_data():
+    """
+    Keeps attack data of this server worker in sync with the leader, which fetches it. Runs in every worker,
+    but has no effect in the leader, which already has the latest attack data.
+    """
+    async with broadcast.subscribe(channel="attack_data_reload") as subscriber:
+        async for event in subscriber:
+            if event.message == "started":
+                attack_data_updated_event.clear()
+                continue
+
+            try:
+                await load_attack_data_snapshot()
+            except Exception as e:
+                logger.error("Failed to load attack data: {error}", error=e)
+            notify_attack_data_updated()
+
+
+async def load_attack_data_snapshot(version: str | None = None) -> bool:
+    """
+    Loads attack data stored in the database into the current snapshot, unless it already holds it.
+
+    :param version: Version to load, defaults to None. If the current snapshot already has it, the database
+        isn't read at all.
+    :type version: str | None, optional
+    :return: True if the current snapshot was replaced.
+    :rtype: bool
+    """
+    async with snapshot_lock:
+        if current_snapshot is not None and current_snapshot.version == version:
+            return False
 
+        json_hash, attack_data, tick = await load_attack_data()
+        if not json_hash or not attack_data:
+            return False
+        if current_snapshot is not None and current_snapshot.json_hash == json_hash:
+            return False
+
+        publish_snapshot(
+            await asyncio.to_thread(
+                AttackDataSnapshot,
+                json_hash,
+                attack_data,
+                int(tick) if tick else None,
+                list(snapshot_history),
+            )
+        )
+        return True
 
-def reload_attack_data():
+
+async def recover_attack_data_snapshot():
+    """
+    Loads the last stored attack data from the database after a restart, so it's served until the next tick.
+    """
+    if await load_attack_data_snapshot():
+        logger.info(
+            "Recovered attack data (<yellow>{hash}</>).",
+            hash=current_snapshot.json_hash[:8],
+        )
+
+
+async def reload_attack_data():
     """
     Reloads and updates the attack data by fetching and processing new JSON data using user-defined functions,
     comparing it against the current data (by comparing hashes), and updating if new data is found. When data
     is updated, the event `attack_data_updated_event` is set, signaling clients that new data is available.
+
+    Runs on the server's event loop at the start of each tick. Synchronous user functions and database access
+    run in the default executor, so waiting for the game server never blocks request handling. If the old data
+    is reused, polling continues in the background until new data appears or the tick ends.
     """
+    global attack_data_loop, background_polling
+    attack_data_loop = asyncio.get_running_loop()
+
+    if background_polling is not None:
+        background_polling.cancel()
+        background_polling = None
+
     attack_data_updated_event.clear()
+    await announce_reload("started")
+    try:
+        poller = await AttackDataPoller.create()
+        if poller is not None and not await poller.poll_until_fallback():
+            background_polling = asyncio.create_task(poller.poll_until_tick_ends())
+    finally:
+        notify_attack_data_updated()
+        await announce_reload("finished")
+
+
+class AttackDataPoller:
+    """
+    Polls the game server for attack data of the current tick. Polls every `retry_interval` seconds during the
+    first `dense_period` seconds of the tick, when new flag IDs usually appear, and every `sparse_interval`
+    seconds afterwards.
+
+    :param fetch_json: User's fetch function.
+    :type fetch_json: Callable
+    :param process_json: User's process function.
+    :type process_json: Callable
+    :param json_hash: Hash of the current attack data, or None if there is none.
+    :type json_hash: str | None
+    :param tick: Number of the tick the poller fetches attack data for.
+    :type tick: int
+    """
 
-    fetch_json, process_json = import_user_functions()
+    def __init__(
+        self,
+        fetch_json: Callable,
+        process_json: Callable,
+        json_hash: str | None,
+        tick: int,
+    ) -> None:
+        self.fetch_json = fetch_json
+        self.process_json = process_json
+        self.json_hash = json_hash
+        self.tick = tick
+        self.tick_started_at = time.monotonic()
 
-    if not fetch_json or not process_json:
-        attack_data_updated_event.set()
-        return
+    @classmethod
+    async def create(cls) -> "AttackDataPoller | None":
+        from .scheduler import get_tick_number
 
-    with get_sync_db_session() as db, StateManager(db) as state:
-        old_json_hash = state.attack_data_hash
+        fetch_json, process_json = import_user_functions()
+        if not fetch_json or not process_json:
+            return None
+
+        json_hash = current_snapshot.json_hash if current_snapshot else None
+        if json_hash is None:
+            # Without stored data, a "not modified" response would leave clients
+            # without attack data for the whole game.
+            fetch_validators.clear()
+
+        return cls(fetch_json, process_json, json_hash, get_tick_number(datetime.now()))
+
+    def get_poll_interval(self) -> float:
+        elapsed = time.monotonic() - self.tick_started_at
+        if elapsed < config.attack_data.dense_period:
+            return config.attack_data.retry_interval
+        return config.attack_data.sparse_interval
+
+    async def poll_until_fallback(self) -> bool:
+        """
+        Polls until new attack data is fetched or `max_attempts` attempts are made.
+
+        :return: True if new attack data was stored, False if the old data is reused.
+        :rtype: bool
+        """
         attempts_left = config.attack_data.max_attempts
+        error = None
 
         while attempts_left:
             try:
-                new_json = fetch_json()
+                if await self.poll():
+                    return True
+                error = None
             except Exception as e:
-                attempts_left -= 1
+                error = e
                 logger.error(
                     "An error occurred while fetching attack data: {error}", error=e
                 )
-                if attempts_left:
-                    logger.info(
-                        "Retrying in {interval}s, {attempts} attempts left.",
-                        interval=config.attack_data.retry_interval,
-                        attempts=attempts_left,
-                    )
-                    time.sleep(config.attack_data.retry_interval)
-                else:
-                    logger.warning(
-                        "It seems that your <b>{module}.py</> module is not working properly. Please check it.",
-                        module=config.attack_data.module,
-                    )
-
-            new_json_norm = normalize_dict(new_json)
-            new_json_str = json.dumps(new_json_norm)
-            new_json_hash = hashlib.md5(new_json_str.encode()).hexdigest()
-
-            json_is_updated = new_json_hash != old_json_hash or old_json_hash is None
-
-            if not json_is_updated and attempts_left:
-                attempts_left -= 1
+
+            attempts_left -= 1
+            if attempts_left:
+                interval = self.get_poll_interval()
                 logger.info(
-                    "Fetched old attack data (<yellow>{hash}</>). Retrying in {interval}s, {attempts} attempts left.",
-                    hash=old_json_hash[:8],
-                    interval=config.attack_data.retry_interval,
+                    "Retrying in {interval}s, {attempts} attempts left.",
+                    interval=interval,
                     attempts=attempts_left,
                 )
-                time.sleep(config.attack_data.retry_interval)
-            else:
-                break
+                await asyncio.sleep(interval)
 
-        if json_is_updated:
-            logger.info(
-                "Fetched new attack data (<yellow>{old_hash}</> -> <green>{new_hash}</>).",
-                old_hash=str(old_json_hash)[:8],
-                new_hash=new_json_hash[:8],
+        if error is not None:
+            logger.warning(
+                "It seems that your <b>{module}.py</> module is not working properly. Please check it.",
+                module=config.attack_data.module,
             )
 
-            processed_attack_data = process_json(new_json)
-
-            state.attack_data_hash = new_json_hash
-            state.attack_data = json.dumps(processed_attack_data)
-        elif old_json_hash:
+        if self.json_hash:
             logger.info(
                 "Reusing old attack data (<yellow>{hash}</>) to avoid wasting tick time.",
-                hash=old_json_hash[:8],
+                hash=self.json_hash[:8],
             )
         else:
             logger.error(
                 "Failed to fetch attack data. Please fix your <b>fetch</> function in your <b>{module}.py</> module.",
                 module=config.attack_data.module,
             )
+        return False
 
-    attack_data_updated_event.set()
+    async def poll_until_tick_ends(self):
+        """
+        Keeps polling after falling back to old attack data, so clients get new data mid-tick as soon as the
+        game server publishes it.
+        """
+        tick_ends_at = self.tick_started_at + config.game.tick_duration.total_seconds()
+
+        while time.monotonic() + self.get_poll_interval() < tick_ends_at:
+            await asyncio.sleep(self.get_poll_interval())
+            try:
+                if await self.poll():
+                    notify_attack_data_updated()
+                    await announce_reload("finished")
+                    return
+            except Exception as e:
+                logger.debug("Background attack data fetch failed: {error}", error=e)
+
+    async def poll(self) -> bool:
+        """
+        Fetches attack data once, and processes and stores it if it changed.
+
+        :return: True if new attack data was stored.
+        :rtype: bool
+        """
+        global raw_fingerprint
+
+        new_json = await fetch_hedged(self.fetch_json)
+        if new_json is None:
+            logger.info(
+                "Attack data not modified since <yellow>{hash}</>.",
+                hash=str(self.json_hash)[:8],
+            )
+            return False
+
+        new_raw_fingerprint = None
+        if isinstance(new_json, (bytes, str)):
+            raw = new_json.encode() if isinstance(new_json, str) else new_json
+            new_raw_fingerprint = await asyncio.to_thread(fingerprint_bytes, raw)
+            if new_raw_fingerprint == raw_fingerprint and self.json_hash:
+                logger.info(
+                    "Fetched old attack data (<yellow>{hash}</>).",
+                    hash=self.json_hash[:8],
+                )
+                return False
 
+            new_json = await asyncio.to_thread(json.loads, raw)
 
-def normalize_dict(data: dict | list | Any) -> dict | list | Any:
+        new_json_hash = await asyncio.to_thread(fingerprint_attack_data, new_json)
+
+        if new_json_hash == self.json_hash:
+            logger.info(
+                "Fetched old attack data (<yellow>{hash}</>).",
+                hash=self.json_hash[:8],
+            )
+            raw_fingerprint = new_raw_fingerprint or raw_fingerprint
+            return False
+
+        logger.info(
+            "Fetched new attack data (<yellow>{old_hash}</> -> <green>{new_hash}</>).",
+            old_hash=str(self.json_hash)[:8],
+            new_hash=new_json_hash[:8],
+        )
+
+        snapshot = await asyncio.to_thread(
+            self.create_snapshot, new_json, new_json_hash, list(snapshot_history)
+        )
+        # Stored before it's announced, so other server workers can load it as soon
+        # as clients ask them for it.
+        await store_attack_data(new_json_hash, snapshot.body.decode(), self.tick)
+        publish_snapshot(snapshot)
+        await announce_snapshot(snapshot)
+        self.json_hash = new_json_hash
+        # Only remembered once stored, so data that failed to process is fetched again.
+        raw_fingerprint = new_raw_fingerprint
+        return True
+
+    def create_snapshot(
+        self,
+        new_json: dict | list,
+        json_hash: str,
+        previous: list[AttackDataSnapshot],
+    ) -> AttackDataSnapshot:
+        """
+        Processes fetched attack data and encodes it into a snapshot. Runs in the default executor, since
+        processing and encoding large attack data would hold up the event loop.
+        """
+        attack_data = json.dumps(self.process_json(new_json))
+        return AttackDataSnapshot(json_hash, attack_data, self.tick, previous)
+
+
+async def fetch_hedged(fetch_json: Callable[..., Any]) -> Any:
     """
-    Recursively sort keys and items in a dictionary. This is useful for not mistaking
-    a differently ordered dictionary as a different one, which sometimes happens with
-    attack.json / teams.json files.
+    Calls the user's fetch function. If `hedge_delay` is configured and the call doesn't return within the
+    delay, another call is started in parallel, up to `hedged_requests` calls. The first successful result is
+    returned, so a single slow response from the game server doesn't hold back the attack data.
 
-    Note: It doesn't handle lists of "unsortable" items (e.g. lists of dictionaries).
-    Function will return such lists without sorting them.
+    :param fetch_json: User's fetch function, either synchronous or a coroutine function.
+    :type fetch_json: Callable[..., Any]
+    :return: Fetched JSON data, or None if not modified.
+    :rtype: Any
+    :raises Exception: Error of the last failed call, if all calls fail.
     """
-    if isinstance(data, dict):
-        return {key: normalize_dict(value) for key, value in sorted(data.items())}
-    elif isinstance(data, list):
-        normalized_list = [normalize_dict(item) for item in data]
-        try:
-            return sorted(normalized_list)
-        except TypeError:
-            # If sorting is not possible, return the list as is
-            return normalized_list
+    hedge_delay = config.attack_data.hedge_delay
+    if hedge_delay is None:
+        return await call_fetch_json(fetch_json)
+
+    pending = {asyncio.ensure_future(call_fetch_json(fetch_json))}
+    started_count = 1
+    error: BaseException | None = None
+
+    try:
+        while pending:
+            can_hedge = started_count < config.attack_data.hedged_requests
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=hedge_delay if can_hedge else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+
+            for task in done:
+                if task.cancelled():
+                    continue
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+
+            if not done and can_hedge:
+                started_count += 1
+                logger.info(
+                    "Fetching attack data is taking over {delay}s, sending request <b>#{number}</>.",
+                    delay=hedge_delay,
+                    number=started_count,
+                )
+                pending.add(asyncio.ensure_future(call_fetch_json(fetch_json)))
+
+        raise error or RuntimeError("All attempts to fetch attack data were cancelled.")
+    finally:
+        # Calls running in the executor can't be interrupted, so their results
+        # are discarded instead.
+        for task in pending:
+            task.cancel()
+
+
+async def call_fetch_json(fetch_json: Callable[..., Any]) -> Any:
+    """
+    Awaits the user's fetch function if it's a coroutine function, or runs it in the default executor. If the
+    function takes an argument, it's given `fetch_validators` for conditional requests, and may return None
+    if the game server responds with 304 Not Modified.
+    """
+    args = (fetch_validators,) if inspect.signature(fetch_json).parameters else ()
+
+    if inspect.iscoroutinefunction(fetch_json):
+        return await fetch_json(*args)
+    return await asyncio.to_thread(fetch_json, *args)
+
+
+def notify_attack_data_updated():
+    """
+    Wakes up clients waiting for new attack data. Safe to call from any thread, since asyncio events can
+    only be set from the thread running their event loop.
+    """
+    try:
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+
+    if attack_data_loop is None or running_loop is attack_data_loop:
+        finish_reload()
     else:
-        return data
+        attack_data_loop.call_soon_threadsafe(finish_reload)
+
+
+def finish_reload():
+    """
+    Marks the attack data as updated, and releases clients waiting for a newer version, even if the reload
+    didn't produce one. Must be called from the event loop.
+    """
+    global reload_finished_event
+
+    attack_data_updated_event.set()
+    reload_finished_event.set()
+    reload_finished_event = asyncio.Event()
+
+
+async def load_attack_data() -> tuple[str | None, str | None, str | None]:
+    async with get_async_db_session() as db:
+        state = AsyncStateManager(db)
+        json_hash, attack_data, tick = await state.get_many(
+            "attack_data_hash", "attack_data", "attack_data_tick"
+        )
+        return json_hash, attack_data, tick
+
+
+async def store_attack_data(json_hash: str, attack_data: str, tick: int):
+    async with get_async_db_session() as db:
+        state = AsyncStateManager(db)
+        await state.put("attack_data_hash", json_hash)
+        await state.put("attack_data", attack_data)
+        await state.put("attack_data_tick", str(tick))
 
 
-def import_user_functions() -> (
-    tuple[Callable[[], dict | list], Callable[[dict], dict[str, dict[str, list[Any]]]]]
-):
+def import_user_functions() -> tuple[
+    Callable[..., dict | list | bytes | str | None] | None,
+    Callable[[dict | list], dict[str, dict[str, list[Any]]]] | None,
+]:
     """
-    Imports and reloads the fetch and process functions that fetch and process attack data.
+    Imports and reloads the fetch and process functions that fetch and process attack data. The fetch
+    function may also be defined with `async def`, in which case it runs on the server's event loop. It may
+    return the raw response body instead of parsed JSON, so bodies identical to the last one aren't parsed.
     """
     module_name = config.attack_data.module
 
@@ -30,5 +30,6 @@ class PostgresEmitter:
             cur.execute("SELECT pg_notify(%s, %s);", (channel, message))
 
 
-broadcast = Broadcast(postgres_url)
+# Subscribers LISTEN on a long-lived connection, which needs a real session.
+broadcast = Broadcast(config.database.dsn(direct=True))
 emitter = PostgresEmitter(postgres_url)
@@ -25,11 +25,25 @@ def cli():
 
 
 @cli.command()
-def server():
+@click.option(
+    "-w",
+    "--workers",
+    type=click.IntRange(min=1),
+    help="Number of server worker processes. Overrides server.workers.",
+)
+def server(workers):
     show_banner()
     from .main import main as server_main
 
-    server_main()
+    server_main(workers=workers)
+
+
+@cli.command(name="all-in-one")
+def all_in_one():
+    show_banner()
+    from .main import main as server_main
+
+    server_main(all_in_one=True)
 
 
 @cli.command()
@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Literal
 
 from avala_shared.logs import logger
 from pydantic import (
@@ -63,6 +64,40 @@ class GameConfig(BaseModel):
     model_config = ConfigDict(extra="forbid")
 
 
+class RateLimitConfig(BaseModel):
+    limit: PositiveFloat
+    per: PositiveFloat = 1
+    unit: Literal["flags", "requests"] = "flags"
+    burst: PositiveFloat | None = None
+
+    model_config = ConfigDict(extra="forbid")
+
+    @property
+    def rate(self) -> float:
+        return self.limit / self.per
+
+    @property
+    def capacity(self) -> float:
+        return self.burst or self.limit
+
+
+class AdaptiveBatchingConfig(BaseModel):
+    min_size: PositiveInt = 10
+    max_size: PositiveInt = 1000
+    target_latency: PositiveFloat = 5
+    increase: PositiveInt = 10
+    decrease_factor: float = Field(0.5, gt=0, lt=1)
+    max_requeue_ratio: float = Field(0.1, ge=0, le=1)
+
+    @model_validator(mode="after")
+    def check_bounds(cls, values):
+        if values.min_size > values.max_size:
+            raise ValueError("min_size must not be greater than max_size")
+        return values
+
+    model_config = ConfigDict(extra="forbid")
+
+
 class SubmitterConfig(BaseModel):
     module: str = "submitter"
     interval: PositiveInt | None = None
@@ -70,6 +105,12 @@ class SubmitterConfig(BaseModel):
     batch_size: PositiveInt | None = None
     max_batch_size: int | None = None
     streams: bool | None = False
+    workers: PositiveInt = 1
+    rate_limit: RateLimitConfig | None = None
+    retry_delays: list[PositiveFloat] = Field([1, 2, 4, 8, 16, 32], min_length=1)
+    adaptive_batching: AdaptiveBatchingConfig | None = None
+    prefetch: PositiveInt | None = None
+    flush_interval: PositiveFloat = 5
 
     @model_validator(mode="before")
     def check_required_fields(cls, values):
@@ -94,6 +135,31 @@ class SubmitterConfig(BaseModel):
             values.max_batch_size = float("inf")
         return values
 
+    @property
+    def max_buffer_size(self) -> int:
+        """
+        Largest number of flags buffered before submission in batched mode.
+        """
+        if not self.batch_size:
+            return 0
+        if self.adaptive_batching:
+            return max(self.batch_size, self.adaptive_batching.max_size)
+        return self.batch_size
+
+    @property
+    def prefetch_count(self) -> int:
+        """
+        Number of unacknowledged messages a consumer may hold. Defaults to twice the
+        number of flags buffered (or submitted at once in stream mode), so the next
+        batch is already on its way while the current one is being submitted. With
+        envelopes, each message may carry many flags, so this is an upper bound.
+        """
+        if self.prefetch:
+            return self.prefetch
+        if self.batch_size:
+            return 2 * self.max_buffer_size
+        return 2 * self.workers
+
     model_config = ConfigDict(extra="forbid")
 
 
@@ -101,6 +167,12 @@ class AttackDataConfig(BaseModel):
     module: str = "flag_ids"
     max_attempts: PositiveInt = 5
     retry_interval: PositiveFloat = 2
+    dense_period: PositiveFloat = 10
+    sparse_interval: PositiveFloat = 5
+    hedge_delay: PositiveFloat | None = None
+    hedged_requests: PositiveInt = 2
+    long_poll_timeout: PositiveFloat = 60
+    delta_history: int = Field(3, ge=0)
 
     model_config = ConfigDict(extra="forbid")
 
@@ -111,6 +183,7 @@ class ServerConfig(BaseModel):
     password: str | None = None
     cors: list[str] = []
     frontend: bool = True
+    workers: PositiveInt = 1
 
     model_config = ConfigDict(extra="forbid")
 
@@ -121,11 +194,48 @@ class DatabaseConfig(BaseModel):
     password: str
     host: str
     port: int = Field(5432, ge=1, le=65535)
+    pool_size: PositiveInt = 20
+    max_overflow: NonNegativeInt = 10
+    pool_timeout: PositiveFloat = 30
+    pool_recycle: PositiveInt | None = None
+    pgbouncer: bool = False
+    direct_host: str | None = None
+    direct_port: int | None = Field(None, ge=1, le=65535)
 
     model_config = ConfigDict(extra="forbid")
 
-    def dsn(self, driver: str = "") -> str:
-        return f"postgresql{'+' if driver else ''}{driver}://{self.user}:{self.password}@{self.host}:{self.port}/{self.name}"
+    def dsn(self, driver: str = "", direct: bool = False) -> str:
+        """
+        Returns the connection URL of the database.
+
+        :param driver: SQLAlchemy driver name, defaults to "" (plain Postgres URL).
+        :type driver: str, optional
+        :param direct: Bypass the connection pooler if `direct_host` or `direct_port`
+                       is set, for connections that LISTEN or hold advisory locks,
+                       defaults to False.
+        :type direct: bool, optional
+        """
+        host = (direct and self.direct_host) or self.host
+        port = (direct and self.direct_port) or self.port
+        return f"postgresql{'+' if driver else ''}{driver}://{self.user}:{self.password}@{host}:{port}/{self.name}"
+
+
+class QueueOptionsConfig(BaseModel):
+    type: Literal["classic", "quorum"] = "classic"
+    lazy: bool = False
+    max_length: PositiveInt | None = None
+    overflow: Literal["drop-head", "reject-publish", "reject-publish-dlx"] = "drop-head"
+    message_ttl: PositiveFloat | None = None
+
+    @model_validator(mode="after")
+    def check_queue_type(cls, values):
+        if values.type == "quorum" and values.lazy:
+            raise ValueError("lazy mode only applies to classic queues")
+        if values.type == "quorum" and values.overflow == "reject-publish-dlx":
+            raise ValueError("quorum queues don't support reject-publish-dlx overflow")
+        return values
+
+    model_config = ConfigDict(extra="forbid")
 
 
 class RabbitMQConfig(BaseModel):
@@ -134,6 +244,13 @@ class RabbitMQConfig(BaseModel):
     host: str
     port: int = Field(5672, ge=1, le=65535)
     management_port: int = Field(15672, ge=1, le=65535)
+    heartbeat: PositiveInt = 60
+    blocked_connection_timeout: PositiveFloat | None = 300
+    envelopes: bool = False
+    queues: dict[
+        Literal["submission_queue", "persisting_queue", "expired_queue"],
+        QueueOptionsConfig,
+    ] = {}
 
     model_config = ConfigDict(extra="forbid")
 
@@ -141,6 +258,22 @@ class RabbitMQConfig(BaseModel):
         return f"amqp://{self.user}:{self.password}@{self.host}:{self.port}/"
 
 
+class QueueConfig(BaseModel):
+    backend: Literal["rabbitmq", "postgres"] = "rabbitmq"
+    lease: PositiveFloat = 60
+    poll_interval: PositiveFloat = 1
+    prefetch: PositiveInt = 100
+
+    model_config = ConfigDict(extra="forbid")
+
+
+class AllInOneConfig(BaseModel):
+    queue_size: PositiveInt = 10000
+    journal: bool = False
+
+    model_config = ConfigDict(extra="forbid")
+
+
 class AvalaConfig(BaseSettings):
     game: GameConfig
     server: ServerConfig
@@ -148,6 +281,8 @@ class AvalaConfig(BaseSettings):
     attack_data: AttackDataConfig
     database: DatabaseConfig
     rabbitmq: RabbitMQConfig
+    queue: QueueConfig = QueueConfig()
+    all_in_one: AllInOneConfig = AllInOneConfig()
 
     model_config = SettingsConfigDict(
         extra="forbid",
@@ -165,6 +300,23 @@ class AvalaConfig(BaseSettings):
     ) -> tuple[PydanticBaseSettingsSource, ...]:
         return (YamlConfigSettingsSource(settings_cls),)  # type: ignore[arg-type]
 
+    @model_validator(mode="after")
+    def check_prefetch(cls, values):
+        # Prefetch counts messages, while the buffer counts flags. Without envelopes
+        # each message is a single flag, so a smaller prefetch never fills the
+        # buffer. An envelope may carry any number of flags, so any prefetch works.
+        submitter = values.submitter
+        if (
+            not values.rabbitmq.envelopes
+            and submitter.prefetch is not None
+            and submitter.prefetch < submitter.max_buffer_size
+        ):
+            raise ValueError(
+                "submitter.prefetch must be at least %d, otherwise the submission buffer never fills up"
+                % submitter.max_buffer_size
+            )
+        return values
+
 
 try:
     config: AvalaConfig = AvalaConfig()  # type: ignore[call-arg]
@@ -1,8 +1,15 @@
 from contextlib import asynccontextmanager, contextmanager
 from typing import AsyncIterator, Iterator
+from uuid import uuid4
 
-from sqlalchemy import create_engine
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import Connection, Engine, create_engine, text
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Session, sessionmaker
 
@@ -10,34 +17,86 @@ from .config import config
 
 Base = declarative_base()
 
+# Key of the Postgres advisory lock that keeps server workers from creating tables
+# at the same time.
+SCHEMA_LOCK_KEY = 0x61766C62
+
+
+# Engines are created on first use, so each process only opens a pool for the
+# driver it actually uses. The server and async workers use asyncpg, the standalone
+# persister uses psycopg2, and the submitter doesn't use the database at all.
+_sync_engine: Engine | None = None
+_async_engine: AsyncEngine | None = None
 
-sync_engine = create_engine(
-    config.database.dsn(driver="psycopg2"),
-    pool_size=80,
-    max_overflow=10,
-)
 SyncSessionLocal = sessionmaker(
     autocommit=False,
     autoflush=False,
-    bind=sync_engine,
-)
-
-
-async_engine = create_async_engine(
-    config.database.dsn(driver="asyncpg"),
-    pool_size=80,
-    max_overflow=10,
 )
 AsyncSessionLocal = async_sessionmaker(
     autocommit=False,
     autoflush=False,
-    bind=async_engine,
 )
 
 
+def pool_options() -> dict:
+    return {
+        "pool_size": config.database.pool_size,
+        "max_overflow": config.database.max_overflow,
+        "pool_timeout": config.database.pool_timeout,
+        "pool_recycle": config.database.pool_recycle or -1,
+    }
+
+
+def asyncpg_connect_args() -> dict:
+    """
+    Returns arguments for new asyncpg connections. Behind PgBouncer in transaction
+    mode, consecutive statements may run on different server connections, so
+    prepared statements are neither cached nor reused by name.
+    """
+    if not config.database.pgbouncer:
+        return {}
+
+    return {
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+    }
+
+
+def get_sync_engine() -> Engine:
+    global _sync_engine
+    if _sync_engine is None:
+        _sync_engine = create_engine(
+            config.database.dsn(driver="psycopg2"),
+            **pool_options(),
+        )
+    return _sync_engine
+
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            config.database.dsn(driver="asyncpg"),
+            connect_args=asyncpg_connect_args(),
+            **pool_options(),
+        )
+    return _async_engine
+
+
+async def dispose_engines():
+    """
+    Closes connections of the engines created so far.
+    """
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    if _sync_engine is not None:
+        _sync_engine.dispose()
+
+
 @contextmanager
 def get_sync_db_session() -> Iterator[Session]:
-    db = SyncSessionLocal()
+    db = SyncSessionLocal(bind=get_sync_engine())
     try:
         yield db
         db.commit()
@@ -55,7 +114,7 @@ def get_sync_db():
 
 @asynccontextmanager
 async def get_async_db_session() -> AsyncIterator[AsyncSession]:
-    db = AsyncSessionLocal()
+    db = AsyncSessionLocal(bind=get_async_engine())
     try:
         yield db
         await db.commit()
@@ -71,6 +130,150 @@ async def get_async_db():
         yield db
 
 
+# Keeps flag_status_counts up to date with every write to the flags table, whether
+# it comes from the server or from one of the workers.
+COUNT_FLAG_STATUSES_FUNCTION = """
+CREATE OR REPLACE FUNCTION count_flag_statuses() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO flag_status_counts (status, count)
+        SELECT status, count(*) FROM new_flags GROUP BY status;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO flag_status_counts (status, count)
+        SELECT status, sum(delta) FROM (
+            SELECT status, 1 AS delta FROM new_flags
+            UNION ALL
+            SELECT status, -1 AS delta FROM old_flags
+        ) AS changes
+        GROUP BY status
+        HAVING sum(delta) <> 0;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO flag_status_counts (status, count)
+        SELECT status, -count(*) FROM old_flags GROUP BY status;
+    ELSE
+        DELETE FROM flag_status_counts;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+COUNT_FLAG_STATUSES_TRIGGERS = {
+    "flags_count_inserts": "AFTER INSERT ON flags "
+    "REFERENCING NEW TABLE AS new_flags FOR EACH STATEMENT",
+    "flags_count_updates": "AFTER UPDATE ON flags "
+    "REFERENCING OLD TABLE AS old_flags NEW TABLE AS new_flags FOR EACH STATEMENT",
+    "flags_count_deletes": "AFTER DELETE ON flags "
+    "REFERENCING OLD TABLE AS old_flags FOR EACH STATEMENT",
+    "flags_count_truncates": "AFTER TRUNCATE ON flags FOR EACH STATEMENT",
+}
+
+
 async def create_tables():
-    async with async_engine.begin() as conn:
+    async with get_async_engine().begin() as conn:
+        await conn.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY}
+        )
         await conn.run_sync(Base.metadata.create_all)
+        # create_all doesn't add indexes to existing tables.
+        await conn.run_sync(create_missing_indexes)
+
+        await update_flag_status_constraint(conn)
+        await create_flag_status_triggers(conn)
+
+
+def create_missing_indexes(conn: Connection):
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+async def update_flag_status_constraint(conn: AsyncConnection):
+    """
+    Tables created by older versions have a status constraint without the
+    'expired' status, and create_all doesn't alter existing tables. Adding the
+    constraint locks and scans the whole table, so it's only rebuilt when it's
+    outdated.
+    """
+    definition = (
+        await conn.execute(
+            text(
+                "SELECT pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE conname = 'flags_status_check' "
+                "AND conrelid = 'flags'::regclass"
+            )
+        )
+    ).scalar_one_or_none()
+    if definition is not None and "'expired'" in definition:
+        return
+
+    await conn.execute(
+        text("ALTER TABLE flags DROP CONSTRAINT IF EXISTS flags_status_check")
+    )
+    await conn.execute(
+        text(
+            "ALTER TABLE flags ADD CONSTRAINT flags_status_check "
+            "CHECK (status IN ('queued', 'accepted', 'rejected', 'expired'))"
+        )
+    )
+
+
+async def create_flag_status_triggers(conn: AsyncConnection):
+    """
+    Creates the triggers counting flags by status and counts the existing flags.
+    Creating a trigger blocks writes to the flags table until the transaction
+    commits, so no flag is missed or counted twice. Like the status constraint,
+    the triggers are only created when they are missing.
+    """
+    existing = (
+        (
+            await conn.execute(
+                text(
+                    "SELECT tgname FROM pg_trigger "
+                    "WHERE tgrelid = 'flags'::regclass AND tgname = ANY(:names)"
+                ),
+                {"names": list(COUNT_FLAG_STATUSES_TRIGGERS)},
+            )
+        )
+        .scalars()
+        .all()
+    )
+    if len(existing) == len(COUNT_FLAG_STATUSES_TRIGGERS):
+        return
+
+    await conn.execute(text(COUNT_FLAG_STATUSES_FUNCTION))
+    for name, definition in COUNT_FLAG_STATUSES_TRIGGERS.items():
+        await conn.execute(text("DROP TRIGGER IF EXISTS %s ON flags" % name))
+        await conn.execute(
+            text(
+                "CREATE TRIGGER %s %s EXECUTE FUNCTION count_flag_statuses()"
+                % (name, definition)
+            )
+        )
+
+    await conn.execute(text("DELETE FROM flag_status_counts"))
+    await conn.execute(
+        text(
+            "INSERT INTO flag_status_counts (status, count) "
+            "SELECT status, count(*) FROM flags GROUP BY status"
+        )
+    )
+
+
+async def compact_flag_status_counts():
+    """
+    Sums up the rows inserted by the flag status triggers into a single row per
+    status, so reading the counts stays cheap. Rows inserted by transactions that
+    haven't committed yet are left for the next run.
+    """
+    async with get_async_engine().begin() as conn:
+        await conn.execute(
+            text(
+                "WITH removed AS ("
+                "DELETE FROM flag_status_counts RETURNING status, count"
+                ") "
+                "INSERT INTO flag_status_counts (status, count) "
+                "SELECT status, sum(count) FROM removed GROUP BY status "
+                "HAVING sum(count) <> 0"
+            )
+        )
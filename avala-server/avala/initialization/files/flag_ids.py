@@ -3,17 +3,43 @@ from typing import Any
 import requests
 
 
-def fetch_json() -> dict | list:
+def fetch_json(validators: dict) -> dict | list | bytes | None:
     """
     Fetches raw flag IDs from the game server and returns them as a dictionary.
     Exceptions and retries are handled internally by Avala. It's advisable to
     set a timeout for requests to prevent the server from hanging indefinitely.
+    Can also be defined as `async def` to fetch with an async HTTP client.
 
-    :return: Raw flag IDs fetched from the game server.
-    :rtype: dict | list
+    Avala polls the game server several times per tick, so the function can make
+    conditional requests to save bandwidth. `validators` is kept by Avala between
+    calls and holds the validators of the last response. Return None if the game
+    server responds with 304 Not Modified. The parameter can be omitted if the
+    game server doesn't support conditional requests.
+
+    Returning the response body as-is, instead of parsed JSON, lets Avala skip
+    parsing bodies identical to the last one. Avala parses it otherwise.
+
+    :param validators: Validators of the last response, such as its ETag.
+    :type validators: dict
+    :return: Raw flag IDs fetched from the game server, or None if not modified.
+    :rtype: dict | list | bytes | None
     """
-    response = requests.get("https://ad.fbi.com/teams.json", timeout=5)
-    return response.json()
+    headers = {}
+    if "etag" in validators:
+        headers["If-None-Match"] = validators["etag"]
+    if "last_modified" in validators:
+        headers["If-Modified-Since"] = validators["last_modified"]
+
+    response = requests.get("https://ad.fbi.com/teams.json", headers=headers, timeout=5)
+    if response.status_code == 304:
+        return None
+
+    if "ETag" in response.headers:
+        validators["etag"] = response.headers["ETag"]
+    if "Last-Modified" in response.headers:
+        validators["last_modified"] = response.headers["Last-Modified"]
+
+    return response.content
 
 
 def process_json(raw: dict) -> dict[str, dict[str, list[Any]]]:
@@ -1,3 +1,10 @@
+"""
+Flag submission module. Any of the functions below can also be written as
+`async def`. If submit() is async, Avala runs it on an asyncio event loop and
+keeps up to `submitter.workers` submissions in flight at once, which works
+well with HTTP flag checkers and async clients such as httpx or aiohttp.
+"""
+
 import requests
 from pwn import *
 
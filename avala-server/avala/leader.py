@@ -0,0 +1,105 @@
+import asyncio
+from typing import Callable
+
+import asyncpg
+from avala_shared.logs import logger
+
+from .config import config
+
+# Key of the Postgres advisory lock held by the leader. Arbitrary, but must not
+# collide with other advisory locks taken in the same database.
+LEADER_LOCK_KEY = 0x61766C61
+
+
+class LeaderElection:
+    """
+    Elects a single server worker to run scheduled jobs, such as fetching attack data,
+    when the server runs multiple workers. The leader holds a session-level Postgres
+    advisory lock on a dedicated connection, which Postgres releases as soon as the
+    leader's process exits, so another worker takes over on its next attempt.
+
+    The leader keeps checking its connection, since the lock is lost with it. If the
+    check fails, it stops running scheduled jobs and campaigns again.
+
+    :param on_elected: Function called once this worker becomes the leader.
+    :type on_elected: Callable[[], None]
+    :param on_demoted: Function called once this worker loses the leader lock.
+    :type on_demoted: Callable[[], None]
+    :param retry_interval: Seconds between attempts to become the leader, and between
+        checks of the lock connection, defaults to 5.
+    :type retry_interval: float, optional
+    """
+
+    def __init__(
+        self,
+        on_elected: Callable[[], None],
+        on_demoted: Callable[[], None],
+        retry_interval: float = 5,
+    ) -> None:
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.retry_interval = retry_interval
+        self.is_leader = False
+
+        self._connection: asyncpg.Connection | None = None
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        self._connection = await asyncpg.connect(config.database.dsn(direct=True))
+        self._task = asyncio.create_task(self._campaign())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+        if self._connection is not None:
+            await self._connection.close()  # Releases the lock
+            self._connection = None
+
+    async def _campaign(self):
+        while True:
+            await self._acquire()
+            logger.info("This worker is the leader and runs scheduled jobs.")
+            self.on_elected()
+
+            await self._hold()
+            logger.warning(
+                "This worker lost the leader lock and stopped running scheduled jobs."
+            )
+            self.on_demoted()
+
+    async def _acquire(self):
+        """
+        Tries to take the leader lock until it succeeds, reconnecting if the lock
+        connection was lost.
+        """
+        while not self.is_leader:
+            try:
+                if self._connection is None or self._connection.is_closed():
+                    self._connection = await asyncpg.connect(
+                        config.database.dsn(direct=True)
+                    )
+                self.is_leader = await self._connection.fetchval(
+                    "SELECT pg_try_advisory_lock($1)", LEADER_LOCK_KEY
+                )
+            except Exception as e:
+                logger.error("Failed to run leader election: {error}", error=e)
+
+            if not self.is_leader:
+                await asyncio.sleep(self.retry_interval)
+
+    async def _hold(self):
+        """
+        Checks the lock connection until it fails. The connection is then dropped, so
+        if Postgres still holds the lock, it's released once Postgres notices.
+        """
+        while self.is_leader:
+            await asyncio.sleep(self.retry_interval)
+            try:
+                await self._connection.fetchval("SELECT 1", timeout=self.retry_interval)
+            except Exception as e:
+                logger.error("Lost the leader lock connection: {error}", error=e)
+                self.is_leader = False
+                self._connection.terminate()
+                self._connection = None
@@ -9,11 +9,16 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
+from .attack_data import follow_attack_data, recover_attack_data_snapshot
 from .broadcast import broadcast, emitter
 from .config import DOT_DIR_PATH, config
-from .database import create_tables
+from .database import create_tables, dispose_engines
+from .leader import LeaderElection
+from .mq.broker import get_broker, set_broker
+from .mq.memory import MemoryConnection
 from .mq.monitoring import aggregate_flags
-from .mq.rabbit_async import RabbitQueue, rabbit
+from .mq.postgres import PostgresConnection
+from .mq.queues import get_submission_queue_arguments
 from .routes.attack_data import router as attack_data_router
 from .routes.connect import router as connect_router
 from .routes.flags import router as flags_router
@@ -25,42 +30,84 @@ from .scheduler import initialize_scheduler
 async def lifespan(app: FastAPI):
     create_dot_dir()
     await create_tables()
+    await recover_attack_data_snapshot()
     emitter.connect()
     await broadcast.connect()
-    await rabbit.connect()
 
-    submission_queue = await RabbitQueue(
-        channel=rabbit.channel,
-        routing_key="submission_queue",
+    broker = get_broker()
+    await broker.connect()
+    await broker.declare_queue(
+        "submission_queue",
         durable=True,
-    ).declare()
-    persisting_queue = await RabbitQueue(
-        channel=rabbit.channel,
-        routing_key="persisting_queue",
-        durable=True,
-    ).declare()
+        arguments=get_submission_queue_arguments(),
+    )
+    await broker.declare_queue("persisting_queue", durable=True)
+    await broker.declare_queue("expired_queue", durable=True)
 
-    rabbit.add_queue(submission_queue)
-    rabbit.add_queue(persisting_queue)
+    workers = (
+        start_embedded_workers(broker) if isinstance(broker, MemoryConnection) else []
+    )
 
+    # With multiple server workers, only the elected leader runs scheduled jobs,
+    # while every worker follows attack data the leader fetches.
     scheduler = initialize_scheduler()
-    scheduler.start()
+    tasks = [asyncio.create_task(follow_attack_data())]
+
+    leader_tasks: list[asyncio.Task] = []
+
+    def start_leader_jobs():
+        if scheduler.running:
+            scheduler.resume()
+        else:
+            scheduler.start()
+        leader_tasks.append(asyncio.create_task(aggregate_flags()))
 
-    asyncio.create_task(aggregate_flags())
+    def stop_leader_jobs():
+        scheduler.pause()
+        while leader_tasks:
+            leader_tasks.pop().cancel()
+
+    election = LeaderElection(on_elected=start_leader_jobs, on_demoted=stop_leader_jobs)
+    await election.start()
 
     yield
 
     logger.info("Shutting down...")
-    await rabbit.close()
+    for task in workers + tasks + leader_tasks:
+        task.cancel()
+    await asyncio.gather(*workers, *tasks, *leader_tasks, return_exceptions=True)
+    await election.stop()
+    await broker.close()
     await broadcast.disconnect()
     emitter.disconnect()
-    scheduler.shutdown()
+    await dispose_engines()
+    if scheduler.running:
+        scheduler.shutdown()
 
 
-app = FastAPI(lifespan=lifespan)
+def create_app(all_in_one: bool = False) -> FastAPI:
+    """
+    Creates the application. Called by every server worker when the server runs
+    multiple workers.
+    """
+    configure_logging()
+
+    if all_in_one:
+        set_broker(
+            MemoryConnection(
+                maxsize=config.all_in_one.queue_size,
+                journal_path=(
+                    DOT_DIR_PATH / "queue_journal.jsonl"
+                    if config.all_in_one.journal
+                    else None
+                ),
+            )
+        )
+    elif config.queue.backend == "postgres":
+        set_broker(PostgresConnection())
 
+    app = FastAPI(lifespan=lifespan)
 
-def main():
     app.include_router(flags_router)
     app.include_router(connect_router)
     app.include_router(attack_data_router)
@@ -69,17 +116,85 @@ def main():
     configure_cors(app)
     configure_static(app)
 
-    try:
-        uvicorn.run(
-            app,
-            host=config.server.host,
-            port=config.server.port,
-            log_config=configure_logging(),
+    return app
+
+
+def main(all_in_one: bool = False, workers: int | None = None):
+    workers = workers or config.server.workers
+    if all_in_one and workers > 1:
+        logger.warning(
+            "All-in-one mode keeps queues in memory of a single process, so the server runs a single worker."
         )
+        workers = 1
+
+    try:
+        if workers > 1:
+            uvicorn.run(
+                "avala.main:create_app",
+                factory=True,
+                workers=workers,
+                host=config.server.host,
+                port=config.server.port,
+                log_config=configure_logging(),
+            )
+        else:
+            uvicorn.run(
+                create_app(all_in_one),
+                host=config.server.host,
+                port=config.server.port,
+                log_config=configure_logging(),
+            )
     except KeyboardInterrupt:
         logger.info("Thanks for using Avala!")
 
 
+def start_embedded_workers(connection: MemoryConnection) -> list[asyncio.Task]:
+    """
+    Starts the submitter and the persister as tasks of the server's event loop, connected
+    to the server by in-memory queues.
+    """
+    from .workers.async_persister import AsyncPersister
+    from .workers.async_submitter import AsyncSubmitter
+    from .workers.submitter import (
+        create_batching,
+        create_rate_limiter,
+        import_user_module,
+    )
+
+    workers = [
+        asyncio.create_task(AsyncPersister(connection, owns_connection=False).start())
+    ]
+
+    try:
+        user_module = import_user_module()
+    except Exception as e:
+        logger.error(
+            "Unable to load module <b>{module}</>: {error}",
+            module=config.submitter.module,
+            error=e,
+        )
+        return workers
+
+    if getattr(user_module, "submit", None) is None:
+        logger.error(
+            "Required function not found within <b>{module}.py</>. Please make sure the module contains <b>submit</> function.",
+            module=config.submitter.module,
+        )
+        return workers
+
+    submitter = AsyncSubmitter(
+        user_module,
+        rate_limiter=create_rate_limiter(),
+        batching=create_batching(),
+        connection=connection,
+        owns_connection=False,
+    )
+    workers.append(asyncio.create_task(submitter.start()))
+
+    logger.info("Started embedded submitter and persister.")
+    return workers
+
+
 def configure_logging():
     """
     Configures the main logger and disables the default Uvicorn logger.
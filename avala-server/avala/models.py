@@ -1,7 +1,18 @@
 import uuid
 
-from sqlalchemy import Column, DateTime, Integer, String, Text, func
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    String,
+    Text,
+    func,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.schema import CheckConstraint
 
 from .database import Base
@@ -20,7 +31,33 @@ class Flag(Base):
     status = Column(String, nullable=False)
     response = Column(String, nullable=True)
 
-    __table_args__ = (CheckConstraint("status IN ('queued', 'accepted', 'rejected')"),)
+    __table_args__ = (
+        CheckConstraint(
+            "status IN ('queued', 'accepted', 'rejected', 'expired')",
+            name="flags_status_check",
+        ),
+        # Queued flags are counted by their age, which only needs the few of them
+        # still waiting for a verdict.
+        Index(
+            "ix_flags_queued_timestamp",
+            "timestamp",
+            postgresql_where=text("status = 'queued'"),
+        ),
+    )
+
+
+class FlagStatusCount(Base):
+    """
+    Change of the number of flags with a status, inserted by triggers on the flags
+    table (see `create_tables`). Writers only ever insert rows, so they never wait
+    on each other, and the rows are summed up by `compact_flag_status_counts`.
+    """
+
+    __tablename__ = "flag_status_counts"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    status = Column(String, nullable=False)
+    count = Column(BigInteger, nullable=False)
 
 
 class State(Base):
@@ -28,3 +65,26 @@ class State(Base):
 
     key = Column(String, primary_key=True)
     value = Column(Text, nullable=True)
+
+
+class QueueMessage(Base):
+    """
+    Message of a queue in the Postgres queue backend. Times are Unix timestamps
+    taken from the database clock.
+    """
+
+    __tablename__ = "queue_messages"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    queue = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    headers = Column(JSONB, nullable=True)
+    timestamp = Column(Float, nullable=True)
+    priority = Column(Integer, nullable=False, default=0)
+    available_at = Column(Float, nullable=False)
+    expires_at = Column(Float, nullable=True)
+
+    # Matches the dequeue order, so the next messages are found without sorting.
+    __table_args__ = (
+        Index("ix_queue_messages_dequeue", "queue", priority.desc(), "id"),
+    )
@@ -0,0 +1,21 @@
+from .memory import MemoryConnection
+from .postgres import PostgresConnection
+from .rabbit_async import RabbitConnection, rabbit
+
+Broker = RabbitConnection | MemoryConnection | PostgresConnection
+
+_broker: Broker = rabbit
+
+
+def get_broker() -> Broker:
+    """
+    Returns the connection the server publishes flags to. This is the RabbitMQ
+    connection, unless the Postgres queue backend is configured or the server runs
+    in all-in-one mode with in-memory queues.
+    """
+    return _broker
+
+
+def set_broker(connection: Broker):
+    global _broker
+    _broker = connection
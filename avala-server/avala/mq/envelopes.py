@@ -0,0 +1,41 @@
+COUNT_HEADER = "x-avala-count"
+
+
+def pack(items: list[str]) -> tuple[str, dict | None]:
+    """
+    Packs items (flags or serialized responses) into a single message body. A single
+    item is sent as a plain message, while multiple items are joined into a
+    newline-delimited envelope marked with a count header.
+
+    :param items: Items to pack. Items must not contain newlines.
+    :type items: list[str]
+    :return: Message body and headers to publish it with.
+    :rtype: tuple[str, dict | None]
+    """
+    if len(items) == 1:
+        return items[0], None
+    return "\n".join(items), {COUNT_HEADER: len(items)}
+
+
+def unpack(body: bytes, headers: dict | None) -> list[str]:
+    """
+    Splits a received message back into items. Plain messages hold a single item.
+
+    :param body: Body of the received message.
+    :type body: bytes
+    :param headers: Headers of the received message.
+    :type headers: dict | None
+    :return: Items contained in the message.
+    :rtype: list[str]
+    """
+    if not headers or COUNT_HEADER not in headers:
+        return [body.decode().strip()]
+    return [item.strip() for item in body.decode().split("\n") if item.strip()]
+
+
+def strip_envelope_headers(headers: dict | None) -> dict:
+    """
+    Returns a copy of message headers without envelope-specific headers, so they
+    can be reused for a message holding a different number of items.
+    """
+    return {key: value for key, value in (headers or {}).items() if key != COUNT_HEADER}
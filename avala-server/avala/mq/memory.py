@@ -0,0 +1,436 @@
+import asyncio
+import itertools
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, TextIO
+
+from avala_shared.logs import logger
+
+# Journal records are buffered and written together at most this often (in
+# seconds), so publishing doesn't wait for the disk.
+JOURNAL_FLUSH_INTERVAL = 0.05
+
+
+class MemoryMessage:
+    """
+    Message held by an in-memory queue. Mirrors the parts of aio-pika's
+    `IncomingMessage` used by the workers.
+    """
+
+    def __init__(
+        self,
+        queue: "MemoryQueue",
+        delivery_tag: int,
+        body: bytes,
+        headers: dict | None = None,
+        timestamp: float | None = None,
+        expires_at: float | None = None,
+        priority: int | None = None,
+    ) -> None:
+        self.queue = queue
+        self.delivery_tag = delivery_tag
+        self.body = body
+        self.headers = headers or {}
+        self.timestamp = timestamp
+        self.expires_at = expires_at
+        self.priority = priority or 0
+
+        # Called once the message is acknowledged or rejected, freeing a slot of
+        # the consumer's prefetch.
+        self.on_settled: Callable[[], None] | None = None
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.time() >= self.expires_at
+
+    async def ack(self):
+        self.settle()
+        self.queue.connection.journal_ack(self)
+
+    async def reject(self, requeue: bool = False):
+        self.settle()
+        if requeue:
+            await self.queue.put_message(self)
+        else:
+            await self.queue.dead_letter(self)
+
+    def settle(self):
+        if self.on_settled is not None:
+            self.on_settled()
+            self.on_settled = None
+
+    def to_record(self) -> dict:
+        return {
+            "op": "put",
+            "id": self.delivery_tag,
+            "queue": self.queue.routing_key,
+            "body": self.body.decode(),
+            "headers": self.headers,
+            "timestamp": self.timestamp,
+            "expires_at": self.expires_at,
+            "priority": self.priority,
+        }
+
+
+class MemoryQueue:
+    """
+    Bounded in-memory queue with the same interface as the async RabbitMQ queue.
+    Publishing waits while the queue is full, which slows down producers instead of
+    letting memory grow without bounds.
+
+    Supports the subset of RabbitMQ features used by Avala: message priorities,
+    per-message TTL, queue-wide TTL (used by delay queues) and dead-lettering of
+    expired or rejected messages to another queue.
+    """
+
+    def __init__(
+        self,
+        connection: "MemoryConnection",
+        routing_key: str,
+        maxsize: int,
+        arguments: dict | None = None,
+    ) -> None:
+        self.connection = connection
+        self.routing_key = routing_key
+        self.arguments = arguments or {}
+
+        self.message_ttl: float | None = (
+            self.arguments["x-message-ttl"] / 1000
+            if "x-message-ttl" in self.arguments
+            else None
+        )
+        self.dead_letter_routing_key: str | None = self.arguments.get(
+            "x-dead-letter-routing-key"
+        )
+
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue(maxsize)
+        self._sequence = itertools.count()
+
+    async def declare(self) -> "MemoryQueue":
+        return self
+
+    async def put(
+        self,
+        message: str,
+        ttl: str | None = None,
+        headers: dict | None = None,
+        timestamp: datetime | float | None = None,
+        priority: int | None = None,
+    ):
+        """
+        Publishes a message to the queue.
+
+        :param message: Content of the message.
+        :type message: str
+        :param ttl: Message expiration policy expressed in milliseconds as string, defaults to None.
+        :type ttl: str, optional
+        :param headers: Message headers, defaults to None.
+        :type headers: dict, optional
+        :param timestamp: Message timestamp as a datetime or a Unix timestamp, defaults to None.
+        :type timestamp: datetime | float, optional
+        :param priority: Message priority, defaults to None.
+        :type priority: int, optional
+        """
+        if isinstance(timestamp, datetime):
+            timestamp = timestamp.timestamp()
+
+        await self.put_message(
+            MemoryMessage(
+                queue=self,
+                delivery_tag=self.connection.next_delivery_tag(),
+                body=message.encode(),
+                headers=headers,
+                timestamp=timestamp,
+                expires_at=time.time() + int(ttl) / 1000 if ttl else None,
+                priority=priority,
+            )
+        )
+
+    async def put_message(self, message: MemoryMessage, journal: bool = True):
+        """
+        Adds a message to the queue, recording it in the journal first. Messages
+        of queues with a queue-wide TTL are held aside and dead-lettered once it
+        runs out.
+        """
+        message.queue = self
+        if journal:
+            self.connection.journal_put(message)
+
+        if self.message_ttl is not None:
+            self.connection.call_later(self.message_ttl, self.dead_letter, message)
+            return
+
+        await self._queue.put((-message.priority, next(self._sequence), message))
+
+    async def get(self) -> MemoryMessage | None:
+        """
+        Takes a message from the queue without waiting.
+
+        :return: Received message, or None if the queue is empty.
+        :rtype: MemoryMessage | None
+        """
+        while not self._queue.empty():
+            *_, message = self._queue.get_nowait()
+            if not message.expired:
+                return message
+            await self.dead_letter(message)
+        return None
+
+    async def size(self) -> int:
+        """
+        Returns the number of messages in the queue.
+
+        :return: Number of messages in the queue.
+        :rtype: int
+        """
+        return self._queue.qsize()
+
+    async def add_consumer(self, callback: Callable):
+        self.connection.spawn(self._consume(callback))
+
+    async def dead_letter(self, message: MemoryMessage):
+        """
+        Moves a message to the dead-letter queue of this queue, or drops it if this
+        queue has none.
+        """
+        if self.dead_letter_routing_key is None:
+            self.connection.journal_ack(message)
+            return
+
+        target = self.connection.get_queue(self.dead_letter_routing_key)
+        if target is not None:
+            await target.put_message(
+                MemoryMessage(
+                    queue=target,
+                    delivery_tag=self.connection.next_delivery_tag(),
+                    body=message.body,
+                    headers=message.headers,
+                    timestamp=message.timestamp,
+                    priority=message.priority,
+                )
+            )
+        self.connection.journal_ack(message)
+
+    async def _consume(self, callback: Callable):
+        """
+        Passes messages to the callback. Like RabbitMQ, a consumer holds at most
+        `prefetch` unacknowledged messages, so multiple consumers share the queue.
+        """
+        prefetch = self.connection.prefetch
+        unacknowledged = asyncio.Semaphore(prefetch) if prefetch else None
+
+        while True:
+            if unacknowledged is not None:
+                await unacknowledged.acquire()
+
+            *_, message = await self._queue.get()
+            if message.expired:
+                await self.dead_letter(message)
+                if unacknowledged is not None:
+                    unacknowledged.release()
+                continue
+
+            if unacknowledged is not None:
+                message.on_settled = unacknowledged.release
+            await callback(message)
+
+
+class MemoryConnection:
+    """
+    In-memory replacement for the async RabbitMQ connection, used when the server
+    runs the submitter and persister in the same process.
+
+    If a journal path is given, every published message is appended to the journal
+    and marked once acknowledged, so messages that were not acknowledged before a
+    restart are published again once their queues are declared. Records are
+    written in batches, so those published shortly before a crash may be lost.
+
+    :param maxsize: Maximum number of messages held by each queue.
+    :type maxsize: int
+    :param journal_path: Path of the on-disk journal, defaults to None (no journal).
+    :type journal_path: Path | None, optional
+    """
+
+    def __init__(self, maxsize: int, journal_path: Path | None = None) -> None:
+        self.maxsize = maxsize
+        self.journal_path = journal_path
+        self.queues: dict[str, MemoryQueue] = {}
+        self.prefetch: int | None = None
+
+        self._journal: TextIO | None = None
+        self._journal_buffer: list[str] = []
+        self._journal_writer: asyncio.Task | None = None
+        self._pending: dict[str, list[dict]] = {}
+        self._delivery_tags = itertools.count(1)
+        self._tasks: set[asyncio.Task] = set()
+        self._timers: set[asyncio.TimerHandle] = set()
+
+    async def connect(self):
+        if self.journal_path:
+            self._open_journal()
+
+        logger.info("Using in-memory queues.")
+
+    async def close(self):
+        for timer in self._timers:
+            timer.cancel()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        if self._journal_writer is not None:
+            await self._journal_writer
+        if self._journal:
+            self._flush_journal(self._journal_buffer)
+            self._journal_buffer = []
+            self._journal.close()
+            self._journal = None
+
+    async def declare_queue(
+        self,
+        routing_key: str,
+        durable: bool = False,
+        arguments: dict | None = None,
+    ) -> MemoryQueue:
+        """
+        Declares a queue and publishes messages left in the journal for it.
+        """
+        if routing_key in self.queues:
+            return self.queues[routing_key]
+
+        pending = self._pending.pop(routing_key, [])
+        queue = MemoryQueue(
+            self,
+            routing_key,
+            maxsize=max(self.maxsize, len(pending)),
+            arguments=arguments,
+        )
+        self.add_queue(queue)
+
+        for record in pending:
+            await queue.put_message(
+                MemoryMessage(
+                    queue=queue,
+                    delivery_tag=record["id"],
+                    body=record["body"].encode(),
+                    headers=record["headers"],
+                    timestamp=record["timestamp"],
+                    expires_at=record["expires_at"],
+                    priority=record["priority"],
+                ),
+                journal=False,  # Already in the compacted journal
+            )
+
+        if pending:
+            logger.info(
+                "Recovered {count} messages of {routing_key} from the journal.",
+                count=len(pending),
+                routing_key=routing_key,
+            )
+
+        return queue
+
+    async def set_prefetch(self, count: int):
+        """
+        Sets the number of unacknowledged messages each consumer added afterwards
+        may hold.
+        """
+        self.prefetch = count
+
+    async def ack(self, message: MemoryMessage, multiple: bool = False):
+        await message.ack()
+
+    async def reject(self, message: MemoryMessage, requeue: bool = False):
+        await message.reject(requeue=requeue)
+
+    def add_queue(self, queue: MemoryQueue):
+        self.queues[queue.routing_key] = queue
+
+    def get_queue(self, routing_key: str):
+        return self.queues.get(routing_key, None)
+
+    def next_delivery_tag(self) -> int:
+        return next(self._delivery_tags)
+
+    def spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def call_later(self, delay: float, function: Callable, *args):
+        """
+        Runs the coroutine returned by the function in a task after a delay. The
+        coroutine is only created once the delay runs out, so timers cancelled on
+        close don't leave coroutines that were never awaited.
+        """
+
+        def run():
+            self._timers.discard(timer)
+            self.spawn(function(*args))
+
+        timer = asyncio.get_running_loop().call_later(delay, run)
+        self._timers.add(timer)
+
+    def journal_put(self, message: MemoryMessage):
+        self._journal_record(message.to_record())
+
+    def journal_ack(self, message: MemoryMessage):
+        self._journal_record({"op": "ack", "id": message.delivery_tag})
+
+    def _journal_record(self, record: dict):
+        if not self._journal:
+            return
+
+        self._journal_buffer.append(json.dumps(record) + "\n")
+        if self._journal_writer is None:
+            self._journal_writer = asyncio.create_task(self._write_journal())
+
+    async def _write_journal(self):
+        """
+        Appends buffered records to the journal in a thread until none are left.
+        Records are kept in order, since only one writer runs at a time.
+        """
+        try:
+            while self._journal_buffer:
+                await asyncio.sleep(JOURNAL_FLUSH_INTERVAL)
+                lines, self._journal_buffer = self._journal_buffer, []
+                await asyncio.to_thread(self._flush_journal, lines)
+        finally:
+            self._journal_writer = None
+
+    def _flush_journal(self, lines: list[str]):
+        if self._journal:
+            self._journal.write("".join(lines))
+            self._journal.flush()
+
+    def _open_journal(self):
+        """
+        Reads unacknowledged messages from the journal and compacts it, so it only
+        holds those messages before new records are appended.
+        """
+        records: dict[int, dict] = {}
+        if self.journal_path.exists():
+            with self.journal_path.open() as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Partially written record before a crash
+                    if record["op"] == "put":
+                        records[record["id"]] = record
+                    else:
+                        records.pop(record["id"], None)
+
+        with self.journal_path.open("w") as file:
+            for record in records.values():
+                file.write(json.dumps(record) + "\n")
+
+        for record in records.values():
+            self._pending.setdefault(record["queue"], []).append(record)
+
+        # Delivery tags double as journal record IDs, so they must stay unique
+        # across restarts.
+        self._delivery_tags = itertools.count(max(records, default=0) + 1)
+        self._journal = self.journal_path.open("a")
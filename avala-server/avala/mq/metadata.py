@@ -0,0 +1,45 @@
+from ..schemas import FlagMetadata
+
+TICK_HEADER = "x-avala-tick"
+EXPLOIT_HEADER = "x-avala-exploit"
+TARGET_HEADER = "x-avala-target"
+PLAYER_HEADER = "x-avala-player"
+ENQUEUED_AT_HEADER = "x-avala-enqueued-at"
+
+# Estimated time the flags were planted, which their priority is computed from
+# whenever they are published. In milliseconds, like the enqueue time.
+PLANTED_AT_HEADER = "x-avala-planted-at"
+
+
+def metadata_to_headers(metadata: FlagMetadata) -> dict:
+    """
+    Converts flag metadata to message headers. The enqueue time is stored in
+    milliseconds, since AMQP timestamps only have a resolution of one second.
+    """
+    headers = {
+        TICK_HEADER: metadata.tick,
+        EXPLOIT_HEADER: metadata.exploit,
+        TARGET_HEADER: metadata.target,
+        PLAYER_HEADER: metadata.player,
+        ENQUEUED_AT_HEADER: (
+            int(metadata.enqueued_at * 1000) if metadata.enqueued_at else None
+        ),
+    }
+    return {key: value for key, value in headers.items() if value is not None}
+
+
+def metadata_from_headers(headers: dict | None) -> FlagMetadata:
+    """
+    Reads flag metadata from message headers. Missing headers are left unset, so
+    messages published by older versions are still accepted.
+    """
+    headers = headers or {}
+    enqueued_at = headers.get(ENQUEUED_AT_HEADER)
+
+    return FlagMetadata(
+        tick=headers.get(TICK_HEADER),
+        exploit=headers.get(EXPLOIT_HEADER),
+        target=headers.get(TARGET_HEADER),
+        player=headers.get(PLAYER_HEADER),
+        enqueued_at=enqueued_at / 1000 if enqueued_at is not None else None,
+    )
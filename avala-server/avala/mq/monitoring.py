@@ -2,10 +2,20 @@ import json
 from datetime import datetime
 from queue import Queue
 
+import requests
+from avala_shared.logs import logger
+
 from ..broadcast import broadcast, emitter
+from ..config import config
 from ..schemas import FlagCounterDelta
+from .broker import get_broker
+from .rabbit_async import RabbitConnection
+
+MONITORED_QUEUES = ("submission_queue", "persisting_queue", "expired_queue")
+MANAGEMENT_API_TIMEOUT = 0.5
 
 deltas_queue: Queue = Queue()
+management_api_available = True
 
 
 async def aggregate_flags():
@@ -24,7 +34,7 @@ def fetch_and_broadcast_rates():
         if delta.queued > 0:
             retrieved_count += delta.queued
         elif delta.queued < 0:
-            submitted_count += abs(delta.queued)
+            submitted_count += abs(delta.queued) - delta.expired
 
     timestamp = datetime.now().strftime("%H:%M:%S")
 
@@ -34,7 +44,57 @@ def fetch_and_broadcast_rates():
             {
                 "retrieved_per_second": retrieved_count,
                 "submitted_per_second": submitted_count,
+                "queues": fetch_queue_stats(),
                 "timestamp": timestamp,
             }
         ),
     )
+
+
+def fetch_queue_stats() -> dict[str, dict[str, int]] | None:
+    """
+    Fetches the number of ready and unacknowledged messages and the number of
+    consumers of the monitored queues from the RabbitMQ management API. A growing
+    number of ready messages in the submission queue means the submitters are
+    falling behind, before flags start expiring.
+
+    :return: Stats of each monitored queue, or None if they are unavailable, e.g.
+             when queues are not kept in RabbitMQ.
+    :rtype: dict[str, dict[str, int]] | None
+    """
+    global management_api_available
+
+    if not isinstance(get_broker(), RabbitConnection):
+        return None
+
+    try:
+        response = requests.get(
+            "http://%s:%d/api/queues/%%2F"
+            % (config.rabbitmq.host, config.rabbitmq.management_port),
+            params={"columns": "name,messages_ready,messages_unacknowledged,consumers"},
+            auth=(config.rabbitmq.user, config.rabbitmq.password),
+            timeout=MANAGEMENT_API_TIMEOUT,
+        )
+        response.raise_for_status()
+    except requests.RequestException as e:
+        if management_api_available:
+            logger.warning(
+                "Failed to fetch queue stats from the RabbitMQ management API: {error}",
+                error=e,
+            )
+            management_api_available = False
+        return None
+
+    if not management_api_available:
+        logger.info("Fetching queue stats from the RabbitMQ management API again.")
+        management_api_available = True
+
+    return {
+        queue["name"]: {
+            "ready": queue.get("messages_ready", 0),
+            "unacked": queue.get("messages_unacknowledged", 0),
+            "consumers": queue.get("consumers", 0),
+        }
+        for queue in response.json()
+        if queue["name"] in MONITORED_QUEUES
+    }
@@ -0,0 +1,419 @@
+import asyncio
+from datetime import datetime
+from typing import Callable
+
+import asyncpg
+from avala_shared.logs import logger
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import config
+from ..database import get_async_engine
+from ..models import QueueMessage
+
+NOTIFY_CHANNEL = "avala_queue"
+
+
+def db_now():
+    """
+    Returns the current Unix timestamp on the database clock, so leases and delays
+    don't depend on clocks of the hosts running the workers.
+    """
+    return func.extract("epoch", func.now())
+
+
+def notify(routing_key: str):
+    return select(func.pg_notify(NOTIFY_CHANNEL, routing_key))
+
+
+class PostgresMessage:
+    """
+    Message leased from a Postgres queue. Mirrors the parts of aio-pika's
+    `IncomingMessage` used by the workers.
+    """
+
+    def __init__(self, queue: "PostgresQueue", row) -> None:
+        self.queue = queue
+        self.delivery_tag: int = row.id
+        self.body: bytes = row.body.encode()
+        self.headers: dict = row.headers or {}
+        self.timestamp: float | None = row.timestamp
+        self.priority: int = row.priority
+
+        # Called once the message is acknowledged or rejected, freeing a slot of
+        # the consumer's prefetch.
+        self.on_settled: Callable[[], None] | None = None
+
+    async def ack(self):
+        try:
+            await self.queue.delete(self)
+        finally:
+            self.settle()
+
+    async def reject(self, requeue: bool = False):
+        try:
+            if requeue:
+                await self.queue.release(self)
+            else:
+                await self.queue.dead_letter(self)
+        finally:
+            self.settle()
+
+    def settle(self):
+        if self.on_settled is not None:
+            self.on_settled()
+            self.on_settled = None
+
+
+class PostgresQueue:
+    """
+    Queue stored in the `queue_messages` table, with the same interface as the async
+    RabbitMQ queue.
+
+    Consumers dequeue messages in batches with `FOR UPDATE SKIP LOCKED`, so multiple
+    workers never receive the same message, and lease them for `queue.lease` seconds.
+    Acknowledging a message deletes it, while messages of a worker that died are
+    delivered again once their lease runs out. Publishers wake up consumers with
+    `NOTIFY`.
+
+    Delay queues (declared with a TTL and a dead-letter queue) don't hold messages
+    themselves. Their messages go straight to the dead-letter queue and become
+    available once the delay runs out.
+    """
+
+    def __init__(
+        self,
+        connection: "PostgresConnection",
+        routing_key: str,
+        arguments: dict | None = None,
+    ) -> None:
+        self.connection = connection
+        self.routing_key = routing_key
+        self.arguments = arguments or {}
+
+        self.message_ttl: float | None = (
+            self.arguments["x-message-ttl"] / 1000
+            if "x-message-ttl" in self.arguments
+            else None
+        )
+        self.dead_letter_routing_key: str | None = self.arguments.get(
+            "x-dead-letter-routing-key"
+        )
+
+    async def declare(self) -> "PostgresQueue":
+        return self
+
+    async def put(
+        self,
+        message: str,
+        ttl: str | None = None,
+        headers: dict | None = None,
+        timestamp: datetime | float | None = None,
+        priority: int | None = None,
+        session: AsyncSession | None = None,
+    ):
+        """
+        Publishes a message to the queue.
+
+        :param message: Content of the message.
+        :type message: str
+        :param ttl: Message expiration policy expressed in milliseconds as string, defaults to None.
+        :type ttl: str, optional
+        :param headers: Message headers, defaults to None.
+        :type headers: dict, optional
+        :param timestamp: Message timestamp as a datetime or a Unix timestamp, defaults to None.
+        :type timestamp: datetime | float, optional
+        :param priority: Message priority, defaults to None.
+        :type priority: int, optional
+        :param session: Session to publish the message in, defaults to None. The message
+                        is then published once the session's transaction is committed.
+        :type session: AsyncSession, optional
+        """
+        if isinstance(timestamp, datetime):
+            timestamp = timestamp.timestamp()
+
+        routing_key, delay = self.routing_key, 0.0
+        if self.message_ttl is not None and self.dead_letter_routing_key:
+            routing_key, delay = self.dead_letter_routing_key, self.message_ttl
+
+        statements = [
+            insert(QueueMessage).values(
+                queue=routing_key,
+                body=message,
+                headers=headers,
+                timestamp=timestamp,
+                priority=priority or 0,
+                available_at=db_now() + delay,
+                expires_at=db_now() + int(ttl) / 1000 if ttl else None,
+            )
+        ]
+        if not delay:
+            statements.append(notify(routing_key))
+
+        if session is not None:
+            for statement in statements:
+                await session.execute(statement)
+            return
+
+        async with get_async_engine().begin() as conn:
+            for statement in statements:
+                await conn.execute(statement)
+
+    async def get(self) -> PostgresMessage | None:
+        """
+        Leases the next available message of the queue without waiting.
+
+        :return: Received message, or None if the queue is empty.
+        :rtype: PostgresMessage | None
+        """
+        while True:
+            messages, fetched_count = await self.dequeue(1)
+            if messages or not fetched_count:
+                return messages[0] if messages else None
+
+    async def dequeue(self, limit: int) -> tuple[list[PostgresMessage], int]:
+        """
+        Leases up to `limit` available messages in priority order. Messages that
+        expired while waiting are dead-lettered instead of being returned.
+
+        :param limit: Maximum number of messages to lease.
+        :type limit: int
+        :return: Leased messages and the number of rows taken from the queue,
+                 including expired ones.
+        :rtype: tuple[list[PostgresMessage], int]
+        """
+        next_ids = (
+            select(QueueMessage.id)
+            .where(
+                QueueMessage.queue == self.routing_key,
+                QueueMessage.available_at <= db_now(),
+            )
+            .order_by(QueueMessage.priority.desc(), QueueMessage.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            # Otherwise Postgres may run the subquery again for each row it updates,
+            # taking more than `limit` messages.
+            .cte("next_ids")
+            .prefix_with("MATERIALIZED")
+        )
+        statement = (
+            update(QueueMessage)
+            .where(QueueMessage.id.in_(select(next_ids.c.id)))
+            .values(available_at=db_now() + config.queue.lease)
+            .returning(
+                QueueMessage.id,
+                QueueMessage.body,
+                QueueMessage.headers,
+                QueueMessage.timestamp,
+                QueueMessage.priority,
+                (QueueMessage.expires_at <= db_now()).label("expired"),
+            )
+        )
+
+        async with get_async_engine().begin() as conn:
+            rows = list((await conn.execute(statement)).all())
+
+        # RETURNING doesn't preserve the order of the subquery.
+        rows.sort(key=lambda row: (-row.priority, row.id))
+
+        expired_ids = [row.id for row in rows if row.expired]
+        if expired_ids:
+            await self._dead_letter_ids(expired_ids)
+
+        messages = [PostgresMessage(self, row) for row in rows if not row.expired]
+        return messages, len(rows)
+
+    async def size(self) -> int:
+        """
+        Returns the number of messages in the queue.
+
+        :return: Number of messages in the queue.
+        :rtype: int
+        """
+        async with get_async_engine().connect() as conn:
+            return (
+                await conn.execute(
+                    select(func.count(QueueMessage.id)).where(
+                        QueueMessage.queue == self.routing_key
+                    )
+                )
+            ).scalar_one()
+
+    async def add_consumer(self, callback: Callable):
+        self.connection.spawn(self._consume(callback))
+
+    async def delete(self, message: PostgresMessage):
+        async with get_async_engine().begin() as conn:
+            await conn.execute(
+                delete(QueueMessage).where(QueueMessage.id == message.delivery_tag)
+            )
+
+    async def release(self, message: PostgresMessage):
+        """
+        Ends the lease of a message, making it available again right away.
+        """
+        async with get_async_engine().begin() as conn:
+            await conn.execute(
+                update(QueueMessage)
+                .where(QueueMessage.id == message.delivery_tag)
+                .values(available_at=db_now())
+            )
+            await conn.execute(notify(self.routing_key))
+
+    async def dead_letter(self, message: PostgresMessage):
+        await self._dead_letter_ids([message.delivery_tag])
+
+    async def _dead_letter_ids(self, ids: list[int]):
+        """
+        Moves messages to the dead-letter queue of this queue, or deletes them if this
+        queue has none.
+        """
+        async with get_async_engine().begin() as conn:
+            if not self.dead_letter_routing_key:
+                await conn.execute(delete(QueueMessage).where(QueueMessage.id.in_(ids)))
+                return
+
+            await conn.execute(
+                update(QueueMessage)
+                .where(QueueMessage.id.in_(ids))
+                .values(
+                    queue=self.dead_letter_routing_key,
+                    available_at=db_now(),
+                    expires_at=None,
+                )
+            )
+            await conn.execute(notify(self.dead_letter_routing_key))
+
+    async def _consume(self, callback: Callable):
+        """
+        Dequeues messages in batches and passes them to the callback. Waits for a
+        notification from a publisher, or polls after `queue.poll_interval` seconds
+        to pick up delayed messages and messages with expired leases.
+
+        Like RabbitMQ, a consumer holds at most `prefetch` unacknowledged messages,
+        so multiple consumers share the queue, and messages aren't held until their
+        lease runs out and they are delivered again.
+        """
+        wakeup = self.connection.get_wakeup_event(self.routing_key)
+        prefetch = self.connection.prefetch
+        unacknowledged = 0
+        settled = asyncio.Event()
+
+        def release():
+            nonlocal unacknowledged
+            unacknowledged -= 1
+            settled.set()
+
+        while True:
+            while unacknowledged >= prefetch:
+                settled.clear()
+                await settled.wait()
+
+            limit = prefetch - unacknowledged
+            wakeup.clear()
+            try:
+                messages, fetched_count = await self.dequeue(limit)
+            except Exception as e:
+                logger.error(
+                    "Failed to dequeue from {routing_key}: {error}",
+                    routing_key=self.routing_key,
+                    error=e,
+                )
+                await asyncio.sleep(config.queue.poll_interval)
+                continue
+
+            unacknowledged += len(messages)
+            for message in messages:
+                message.on_settled = release
+                await callback(message)
+
+            if fetched_count < limit:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), config.queue.poll_interval)
+                except TimeoutError:
+                    pass
+
+
+class PostgresConnection:
+    """
+    Connection to queues stored in Postgres, with the same interface as the async
+    RabbitMQ connection. Queries run on the shared async engine, while a dedicated
+    connection listens for notifications from publishers.
+    """
+
+    def __init__(self) -> None:
+        self.queues: dict[str, PostgresQueue] = {}
+        self.prefetch: int = config.queue.prefetch
+
+        self._listener: asyncpg.Connection | None = None
+        self._wakeups: dict[str, asyncio.Event] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def connect(self):
+        self._listener = await asyncpg.connect(config.database.dsn(direct=True))
+        await self._listener.add_listener(NOTIFY_CHANNEL, self._on_notification)
+
+        logger.info("Connected to Postgres queues.")
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        if self._listener is not None:
+            await self._listener.close()
+            self._listener = None
+
+        logger.info("Closed Postgres queue connection.")
+
+    async def declare_queue(
+        self,
+        routing_key: str,
+        durable: bool = False,
+        arguments: dict | None = None,
+    ) -> PostgresQueue:
+        """
+        Registers a queue on the connection. All queues share the `queue_messages`
+        table, which is created along with other tables.
+        """
+        queue = PostgresQueue(self, routing_key, arguments=arguments)
+        self.add_queue(queue)
+        return queue
+
+    async def set_prefetch(self, count: int):
+        """
+        Sets the number of unacknowledged messages each consumer added afterwards
+        may hold.
+        """
+        self.prefetch = count
+
+    async def ack(self, message: PostgresMessage, multiple: bool = False):
+        await message.ack()
+
+    async def reject(self, message: PostgresMessage, requeue: bool = False):
+        await message.reject(requeue=requeue)
+
+    def add_queue(self, queue: PostgresQueue):
+        self.queues[queue.routing_key] = queue
+
+    def get_queue(self, routing_key: str):
+        return self.queues.get(routing_key, None)
+
+    def get_wakeup_event(self, routing_key: str) -> asyncio.Event:
+        return self._wakeups.setdefault(routing_key, asyncio.Event())
+
+    def spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _on_notification(self, connection, pid, channel, payload):
+        if payload in self._wakeups:
+            self._wakeups[payload].set()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
@@ -0,0 +1,107 @@
+from datetime import datetime
+
+from ..config import config
+from .metadata import PLANTED_AT_HEADER
+from .retry import get_flag_age
+
+# RabbitMQ recommends keeping the number of priorities small, since each
+# priority level is backed by its own internal queue.
+MAX_PRIORITY = 10
+
+
+def get_submission_queue_arguments() -> dict:
+    """
+    Returns arguments of the submission queue. Every process declaring the queue
+    must use the same arguments, or RabbitMQ refuses the declaration.
+
+    Flags that expire in the queue, or are rejected by the submitter for being too
+    old, are dead-lettered to the expired queue so the persister can mark them.
+    """
+    return {
+        "x-max-priority": MAX_PRIORITY,
+        "x-dead-letter-exchange": "",
+        "x-dead-letter-routing-key": "expired_queue",
+    }
+
+
+def apply_queue_options(routing_key: str, arguments: dict | None) -> dict | None:
+    """
+    Merges options configured for the queue under `rabbitmq.queues` into its base
+    arguments. The RabbitMQ wrappers apply this to every declaration, so the server,
+    submitter and persister always declare a queue with the same arguments.
+    Otherwise, RabbitMQ refuses the declaration with a PRECONDITION_FAILED error.
+
+    :param routing_key: Name of the declared queue.
+    :type routing_key: str
+    :param arguments: Arguments the queue is declared with by the code.
+    :type arguments: dict | None
+    :return: Arguments to declare the queue with.
+    :rtype: dict | None
+    """
+    # Queues that can't be configured, such as retry queues, have no options.
+    options = config.rabbitmq.queues.get(routing_key)  # type: ignore[call-overload]
+    if options is None:
+        return arguments
+
+    arguments = dict(arguments or {})
+
+    if options.type == "quorum":
+        arguments["x-queue-type"] = "quorum"
+        # Quorum queues don't support priorities, so flags are submitted in the
+        # order they were enqueued.
+        arguments.pop("x-max-priority", None)
+    elif options.lazy:
+        arguments["x-queue-mode"] = "lazy"
+
+    if options.max_length is not None:
+        arguments["x-max-length"] = options.max_length
+        arguments["x-overflow"] = options.overflow
+
+    if options.message_ttl is not None:
+        arguments["x-message-ttl"] = int(options.message_ttl * 1000)
+
+    return arguments
+
+
+def get_planted_at(
+    headers: dict | None, timestamp: datetime | float | int | None
+) -> datetime | float | int | None:
+    """
+    Returns the estimated time flags of a message were planted, or the timestamp of
+    the message if it was published by an older version without the header.
+
+    :param headers: Headers of the message.
+    :type headers: dict | None
+    :param timestamp: AMQP timestamp of the message.
+    :type timestamp: datetime | float | int | None
+    :return: Time the flags were planted.
+    :rtype: datetime | float | int | None
+    """
+    planted_at = (headers or {}).get(PLANTED_AT_HEADER)
+    if planted_at is not None:
+        return planted_at / 1000
+    return timestamp
+
+
+def get_flag_priority(timestamp: datetime | float | int | None) -> int | None:
+    """
+    Returns the priority of a flag based on how much of its lifetime has passed.
+    Flags closer to expiry get a higher priority, so they are submitted ahead of
+    fresh ones. Returns None if the submission queue is a quorum queue, since those
+    don't support priorities.
+
+    :param timestamp: Time the flag was planted (see `get_planted_at`).
+    :type timestamp: datetime | float | int | None
+    :return: Message priority between 0 and `MAX_PRIORITY`, or None.
+    :rtype: int | None
+    """
+    options = config.rabbitmq.queues.get("submission_queue")
+    if options is not None and options.type == "quorum":
+        return None
+
+    age = get_flag_age(timestamp)
+    if age is None:
+        return 0
+
+    priority = int(age * MAX_PRIORITY // config.game.flag_ttl)
+    return max(0, min(priority, MAX_PRIORITY))
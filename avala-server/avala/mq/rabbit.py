@@ -1,3 +1,5 @@
+from concurrent.futures import Future
+from functools import partial
 from typing import Callable
 
 import pika
@@ -6,6 +8,7 @@ from pika import BlockingConnection
 from pika.adapters.blocking_connection import BlockingChannel
 
 from ..config import config
+from .queues import apply_queue_options
 
 
 class RabbitQueue:
@@ -36,7 +39,7 @@ class RabbitQueue:
             durable=durable,
             exclusive=exclusive,
             auto_delete=auto_delete,
-            arguments=arguments,
+            arguments=apply_queue_options(self.routing_key, arguments),
         )
         if not self.silent:
             logger.info("Declared queue {routing_key}.", routing_key=self.routing_key)
@@ -58,7 +61,14 @@ class RabbitQueue:
                     type=exchange_type,
                 )
 
-    def put(self, message: str, ttl: str | None = None):
+    def put(
+        self,
+        message: str,
+        ttl: str | None = None,
+        headers: dict | None = None,
+        timestamp: int | None = None,
+        priority: int | None = None,
+    ):
         """
         Publishes a message to the queue.
 
@@ -66,12 +76,23 @@ class RabbitQueue:
         :type message: str
         :param ttl: Message expiration policy expressed in milliseconds as string, defaults to None.
         :type ttl: str, optional
+        :param headers: Message headers, defaults to None.
+        :type headers: dict, optional
+        :param timestamp: Message timestamp as a Unix timestamp in seconds, defaults to None.
+        :type timestamp: int, optional
+        :param priority: Message priority, used by queues declared with x-max-priority, defaults to None.
+        :type priority: int, optional
         """
         self.channel.basic_publish(
             exchange=self.exchange,
             routing_key=self.routing_key,
             body=message,
-            properties=pika.BasicProperties(expiration=ttl),
+            properties=pika.BasicProperties(
+                expiration=ttl,
+                headers=headers,
+                timestamp=timestamp,
+                priority=priority,
+            ),
         )
 
     def get(self):
@@ -113,6 +134,8 @@ class RabbitConnection:
                     config.rabbitmq.user,
                     config.rabbitmq.password,
                 ),
+                heartbeat=config.rabbitmq.heartbeat,
+                blocked_connection_timeout=config.rabbitmq.blocked_connection_timeout,
             )
         )
         self.channel = self.connection.channel()
@@ -157,9 +180,47 @@ class RabbitConnection:
     def get_queue(self, routing_key: str):
         return self.queues.get(routing_key, None)
 
+    def set_prefetch(self, count: int):
+        """
+        Limits the number of unacknowledged messages delivered to consumers of the
+        channel, so multiple consumers of a queue share its messages.
+
+        :param count: Maximum number of unacknowledged messages.
+        :type count: int
+        """
+        self.channel.basic_qos(prefetch_count=count)
+
+    def call_later(self, delay: float, callback: Callable):
+        """
+        Schedules a callback to run on the connection's thread while consuming.
+        """
+        self.connection.call_later(delay, callback)
+
     def start_consuming(self):
         self.channel.start_consuming()
 
+    def stop_consuming_threadsafe(self):
+        """
+        Stops consuming from a thread other than the one running the connection.
+        """
+        self.connection.add_callback_threadsafe(self.channel.stop_consuming)
+
+    def process_data_events_until(self, future: Future, time_limit: float = 0.1):
+        """
+        Processes I/O events, such as heartbeats and callbacks scheduled by other
+        threads, until the future is done.
+
+        :param future: Future of the work running on another thread.
+        :type future: Future
+        :param time_limit: Maximum number of seconds to block on each iteration, defaults to 0.1.
+        :type time_limit: float, optional
+        """
+        while not future.done():
+            self.connection.process_data_events(time_limit=time_limit)
+
+        # Run callbacks scheduled right before the future completed.
+        self.connection.process_data_events(time_limit=0)
+
     def __enter__(self):
         self.connect()
         return self
@@ -168,4 +229,51 @@ class RabbitConnection:
         self.close()
 
 
+class ThreadsafeQueue:
+    """
+    Proxy of a queue that publishes from any thread. Messages are published on the
+    thread running the connection.
+    """
+
+    def __init__(self, queue: RabbitQueue, connection: BlockingConnection) -> None:
+        self.queue = queue
+        self.connection = connection
+
+    def put(self, *args, **kwargs):
+        """
+        Schedules publishing of a message. Accepts the same arguments as `RabbitQueue.put`.
+        """
+        self.connection.add_callback_threadsafe(
+            partial(self.queue.put, *args, **kwargs)
+        )
+
+
+class ThreadsafeConnection:
+    """
+    Proxy of a connection that can be used from threads other than the one running
+    the connection. Pika connections are not thread-safe, so acks, rejects and
+    publishes are scheduled with `add_callback_threadsafe` and run on the connection's
+    thread in the order they were made. The connection's thread must keep processing
+    events for them to run.
+    """
+
+    def __init__(self, connection: RabbitConnection) -> None:
+        self.connection = connection
+
+    def ack(self, delivery_tag: int, multiple: bool = False):
+        self._schedule(self.connection.ack, delivery_tag, multiple)
+
+    def reject(self, delivery_tag: int, requeue: bool = False):
+        self._schedule(self.connection.reject, delivery_tag, requeue)
+
+    def get_queue(self, routing_key: str):
+        queue = self.connection.get_queue(routing_key)
+        if queue is None:
+            return None
+        return ThreadsafeQueue(queue, self.connection.connection)
+
+    def _schedule(self, callback: Callable, *args):
+        self.connection.connection.add_callback_threadsafe(partial(callback, *args))
+
+
 rabbit = RabbitConnection()
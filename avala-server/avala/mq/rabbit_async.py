@@ -1,10 +1,13 @@
+from datetime import datetime
 from typing import Callable
 
 import aio_pika
 from aio_pika import Channel, IncomingMessage, Message, RobustConnection
+from aio_pika.abc import AbstractIncomingMessage
 from avala_shared.logs import logger
 
 from ..config import config
+from .queues import apply_queue_options
 
 
 class RabbitQueue:
@@ -41,7 +44,7 @@ class RabbitQueue:
             durable=self.durable,
             exclusive=self.exclusive,
             auto_delete=self.auto_delete,
-            arguments=self.arguments,
+            arguments=apply_queue_options(self.routing_key, self.arguments),
         )
         logger.info("Declared queue {routing_key}.", routing_key=self.routing_key)
 
@@ -63,7 +66,14 @@ class RabbitQueue:
 
         return self
 
-    async def put(self, message: str, ttl: str | None = None):
+    async def put(
+        self,
+        message: str,
+        ttl: str | None = None,
+        headers: dict | None = None,
+        timestamp: datetime | float | None = None,
+        priority: int | None = None,
+    ):
         """
         Publishes a message to the queue.
 
@@ -71,6 +81,12 @@ class RabbitQueue:
         :type message: str
         :param ttl: Message expiration policy expressed in milliseconds as string, defaults to None.
         :type ttl: int, optional
+        :param headers: Message headers, defaults to None.
+        :type headers: dict, optional
+        :param timestamp: Message timestamp as a datetime or a Unix timestamp, defaults to None.
+        :type timestamp: datetime | float, optional
+        :param priority: Message priority, used by queues declared with x-max-priority, defaults to None.
+        :type priority: int, optional
         """
         exchange = (
             await self.channel.get_exchange(self.exchange)
@@ -83,18 +99,24 @@ class RabbitQueue:
             message=Message(
                 body=message.encode(),
                 expiration=int(ttl) // 1000 if ttl else None,
+                headers=headers,
+                timestamp=timestamp,
+                priority=priority,
             ),
         )
 
-    async def get(self):
+    async def get(self) -> AbstractIncomingMessage | None:
         """
         Performs a basic get operation on the queue.
+
+        :return: Received message, or None if the queue is empty.
+        :rtype: AbstractIncomingMessage | None
         """
         queue = await self.channel.get_queue(
             name=self.routing_key,
             ensure=True,
         )
-        return await queue.get()
+        return await queue.get(fail=False)
 
     async def size(self):
         """
@@ -131,6 +153,7 @@ class RabbitConnection:
             port=config.rabbitmq.port,
             login=config.rabbitmq.user,
             password=config.rabbitmq.password,
+            heartbeat=config.rabbitmq.heartbeat,
         )
         self.channel = await self.connection.channel()
 
@@ -168,6 +191,34 @@ class RabbitConnection:
         """
         await message.reject(requeue=requeue)
 
+    async def set_prefetch(self, count: int):
+        """
+        Limits the number of unacknowledged messages delivered to consumers of the
+        channel, so multiple consumers of a queue share its messages.
+
+        :param count: Maximum number of unacknowledged messages.
+        :type count: int
+        """
+        await self.channel.set_qos(prefetch_count=count)
+
+    async def declare_queue(
+        self,
+        routing_key: str,
+        durable: bool = False,
+        arguments: dict | None = None,
+    ) -> RabbitQueue:
+        """
+        Declares a queue on the connection's channel and registers it on the connection.
+        """
+        queue = await RabbitQueue(
+            channel=self.channel,
+            routing_key=routing_key,
+            durable=durable,
+            arguments=arguments,
+        ).declare()
+        self.add_queue(queue)
+        return queue
+
     def add_queue(self, queue: RabbitQueue):
         self.queues[queue.routing_key] = queue
 
@@ -0,0 +1,68 @@
+import time
+from datetime import datetime, timezone
+
+from ..config import config
+
+ATTEMPTS_HEADER = "x-avala-attempts"
+
+
+def get_retry_delay(attempt: int) -> float:
+    """
+    Returns the delay in seconds before the given submission attempt of a flag. Delays
+    grow through the configured backoff tiers and stay at the last tier afterwards.
+
+    :param attempt: Number of the retry, starting from 1.
+    :type attempt: int
+    :return: Delay in seconds.
+    :rtype: float
+    """
+    tiers = config.submitter.retry_delays
+    return tiers[min(attempt, len(tiers)) - 1]
+
+
+def get_retry_queue_name(delay: float) -> str:
+    """
+    Returns the name of the delay queue holding flags for the given number of seconds.
+    """
+    return "submission_retry_%gs" % delay
+
+
+def get_retry_queue_arguments(delay: float) -> dict:
+    """
+    Returns arguments for a delay queue. Messages sit in the delay queue until their
+    TTL runs out, after which RabbitMQ dead-letters them back to the submission queue.
+    """
+    return {
+        "x-message-ttl": int(delay * 1000),
+        "x-dead-letter-exchange": "",
+        "x-dead-letter-routing-key": "submission_queue",
+    }
+
+
+def get_flag_age(timestamp: datetime | float | int | None) -> float | None:
+    """
+    Returns the number of seconds since the flag was enqueued.
+
+    :param timestamp: AMQP timestamp of the message, as returned by pika (int) or aio-pika (datetime).
+    :type timestamp: datetime | float | int | None
+    :return: Age of the flag in seconds, or None if the message has no timestamp.
+    :rtype: float | None
+    """
+    if timestamp is None:
+        return None
+    if isinstance(timestamp, datetime):
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        timestamp = timestamp.timestamp()
+    return time.time() - timestamp
+
+
+def flag_expires_within(
+    timestamp: datetime | float | int | None, seconds: float = 0
+) -> bool:
+    """
+    Checks whether the flag will be past its TTL after the given number of seconds.
+    Flags without a timestamp never expire on the submitter side.
+    """
+    age = get_flag_age(timestamp)
+    return age is not None and age + seconds >= config.game.flag_ttl
@@ -1,13 +1,20 @@
 import json
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, Response, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from ..attack_data import attack_data_updated_event
+from .. import attack_data
+from ..attack_data import (
+    EncodedAttackData,
+    attack_data_updated_event,
+    load_attack_data_snapshot,
+    wait_for_new_version,
+)
 from ..auth import CurrentUser
-from ..database import get_sync_db
-from ..state import StateManager
+from ..broadcast import broadcast
+from ..config import config
+from ..schemas import AttackDataUpdate
 
 router = APIRouter(prefix="/attack-data", tags=["Attack data"])
 
@@ -15,42 +22,200 @@ router = APIRouter(prefix="/attack-data", tags=["Attack data"])
 @router.get("/subscribe")
 async def get_latest_attack_data(
     username: CurrentUser,
-    response: Response,
-    db: Annotated[Session, Depends(get_sync_db)],
+    request: Request,
+    since: str | None = None,
+    timeout: Annotated[float | None, Query(gt=0)] = None,
+    delta: bool = False,
 ):
     """
     Waits for and returns the latest attack data when it is updated.
-    """
-    await attack_data_updated_event.wait()
 
-    with StateManager(db) as state:
-        attack_data = state.attack_data
+    If `since` is the version the client already has, returns right away if the
+    current version differs, or otherwise waits until a newer version is published,
+    a reload finishes or the timeout passes, responding with 304 if there is none.
+    Clients should pass a `timeout` ending with the tick. With `delta`, only
+    changes since that version are returned if it's recent enough, marked by the
+    `X-Avala-Delta-Base` header.
+    """
+    if since is None:
+        await attack_data_updated_event.wait()
+        return snapshot_response(request, attack_data.current_snapshot)
 
-    if attack_data:
-        return json.loads(attack_data)
-    else:
-        response.status_code = status.HTTP_202_ACCEPTED
-        return {
-            "detail": "Attack data not fetched yet.",
-        }
+    max_timeout = config.attack_data.long_poll_timeout
+    snapshot = await wait_for_new_version(
+        since, min(timeout or max_timeout, max_timeout)
+    )
+    return snapshot_response(request, snapshot, known_version=since, delta=delta)
 
 
 @router.get("/current")
-def get_current_attack_data(
-    username: CurrentUser,
-    response: Response,
-    db: Annotated[Session, Depends(get_sync_db)],
-):
+async def get_current_attack_data(username: CurrentUser, request: Request):
     """
     Returns the current available attack data.
     """
-    with StateManager(db) as state:
-        attack_data = state.attack_data
+    return snapshot_response(request, attack_data.current_snapshot)
+
+
+@router.get("/stream")
+async def stream_attack_data(username: CurrentUser, payload: bool = False):
+    """
+    Pushes an event with the version and tick of attack data as soon as new attack
+    data is stored, starting with the current version. With `payload`, events also
+    carry the attack data itself.
+    """
+    return StreamingResponse(
+        attack_data_event_stream(payload),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+        },
+    )
+
+
+async def attack_data_event_stream(payload: bool):
+    try:
+        async with broadcast.subscribe(channel="attack_data") as subscriber:
+            # Sent after subscribing, so no update can slip in between.
+            snapshot = attack_data.current_snapshot
+            if snapshot is not None:
+                yield attack_data_event(
+                    AttackDataUpdate(version=snapshot.version, tick=snapshot.tick),
+                    payload,
+                )
+
+            async for event in subscriber:  # type: ignore[union-attr]
+                update = AttackDataUpdate.model_validate_json(event.message)  # type: ignore[union-attr]
+                if payload:
+                    # Announced attack data is already stored, so workers other than
+                    # the leader load it instead of leaving out the payload.
+                    await load_attack_data_snapshot(update.version)
+                yield attack_data_event(update, payload)
+    except Exception:
+        return
+
+
+def attack_data_event(update: AttackDataUpdate, payload: bool) -> str:
+    """
+    Formats an attack data update as a server-sent event. The payload is embedded as
+    already encoded, and left out if this process doesn't have that version yet.
+    """
+    data = update.model_dump_json()
+
+    snapshot = attack_data.current_snapshot
+    if payload and snapshot is not None and snapshot.version == update.version:
+        data = '{"version": %s, "tick": %s, "attack_data": %s}' % (
+            json.dumps(update.version),
+            json.dumps(update.tick),
+            snapshot.body.decode(),
+        )
+
+    return "event: attack_data\ndata: %s\n\n" % data
+
+
+# Routes of slices must stay below fixed routes, which would otherwise be matched
+# as service names.
+
+
+@router.get("/{service}")
+async def get_service_attack_data(
+    service: str, username: CurrentUser, request: Request
+):
+    """
+    Returns the current attack data of a single service, for all of its targets.
+    """
+    snapshot = attack_data.current_snapshot
+    if snapshot is None:
+        return snapshot_response(request, None)
+
+    if service not in snapshot.services:
+        raise HTTPException(status_code=404, detail="Service not found.")
+
+    return snapshot_response(request, snapshot.services[service])
+
+
+@router.get("/{service}/{target}")
+async def get_target_attack_data(
+    service: str, target: str, username: CurrentUser, request: Request
+):
+    """
+    Returns the current attack data of a single target of a service.
+    """
+    snapshot = attack_data.current_snapshot
+    if snapshot is None:
+        return snapshot_response(request, None)
+
+    if (service, target) not in snapshot.targets:
+        raise HTTPException(status_code=404, detail="Target not found.")
+
+    return snapshot_response(request, snapshot.targets[(service, target)])
+
+
+def snapshot_response(
+    request: Request,
+    snapshot: EncodedAttackData | None,
+    known_version: str | None = None,
+    delta: bool = False,
+) -> Response:
+    """
+    Serves the pre-encoded attack data, compressed if the client accepts it. Clients
+    that already have the current version, by sending its ETag in `If-None-Match` or
+    as `known_version`, get an empty 304 response instead. Responses carry the
+    version and the tick of the attack data in `X-Avala-Version` and `X-Avala-Tick`.
+
+    If `delta` is set and a delta from `known_version` is available, the delta is
+    served instead of the whole attack data.
+    """
+    if snapshot is None:
+        return JSONResponse(
+            {"detail": "Attack data not fetched yet."},
+            status_code=status.HTTP_202_ACCEPTED,
+        )
+
+    headers = {
+        "ETag": snapshot.etag,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+        "X-Avala-Version": snapshot.version,
+    }
+    if snapshot.tick is not None:
+        headers["X-Avala-Tick"] = str(snapshot.tick)
+
+    if snapshot.version == known_version or snapshot.etag in parse_header_tokens(
+        request.headers.get("if-none-match")
+    ):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    document = snapshot
+    if delta and known_version in snapshot.deltas:
+        document = snapshot.deltas[known_version]
+        headers["ETag"] = document.etag
+        headers["X-Avala-Delta-Base"] = known_version
+
+    accepted_encodings = parse_header_tokens(request.headers.get("accept-encoding"))
+    for encoding, body in document.encodings.items():
+        if encoding in accepted_encodings:
+            return Response(
+                body,
+                media_type="application/json",
+                headers=headers | {"Content-Encoding": encoding},
+            )
+
+    return Response(document.body, media_type="application/json", headers=headers)
+
+
+def parse_header_tokens(header: str | None) -> set[str]:
+    """
+    Returns values of a comma-separated header, without parameters such as q-values.
+    Values with `q=0` are explicitly refused, so they are left out.
+    """
+    if not header:
+        return set()
 
-    if attack_data:
-        return json.loads(attack_data)
-    else:
-        response.status_code = status.HTTP_202_ACCEPTED
-        return {
-            "detail": "Attack data not fetched yet.",
-        }
+    tokens = set()
+    for item in header.split(","):
+        value, *params = [part.strip() for part in item.split(";")]
+        if any(param.replace(" ", "") in ("q=0", "q=0.0") for param in params):
+            continue
+        tokens.add(value)
+    return tokens
@@ -1,4 +1,5 @@
 import time
+from datetime import datetime
 from typing import Annotated
 
 from avala_shared.logs import logger
@@ -7,19 +8,23 @@ from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
 from pyparsing import ParseException
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Session
 
 from ..auth import CurrentUser
 from ..broadcast import emitter
 from ..config import config
-from ..database import get_async_db, get_sync_db
+from ..database import get_async_db
 from ..models import Flag
-from ..mq.rabbit_async import rabbit
-from ..scheduler import get_tick_number
+from ..mq.broker import get_broker
+from ..mq.envelopes import pack
+from ..mq.metadata import PLANTED_AT_HEADER, metadata_to_headers
+from ..mq.postgres import PostgresConnection
+from ..mq.queues import get_flag_priority
+from ..scheduler import get_tick_elapsed, get_tick_number
 from ..schemas import (
     FlagCounterDelta,
     FlagEnqueueRequest,
     FlagEnqueueResponse,
+    FlagMetadata,
     SearchMetadata,
     SearchPagingMetadata,
     SearchResult,
@@ -58,13 +63,38 @@ async def enqueue(
         for value in new_flag_values
     ]
     db.add_all(new_flags)
-    await db.commit()
 
-    submission_queue = rabbit.get_queue("submission_queue")
-    for flag in new_flag_values:
-        await submission_queue.put(
-            flag,
-            ttl=str(config.game.flag_ttl * 1000),
+    enqueued_at = time.time()
+    metadata_headers = metadata_to_headers(
+        FlagMetadata(
+            tick=current_tick,
+            exploit=flags.exploit,
+            target=flags.target,
+            player=username,
+            enqueued_at=enqueued_at,
+        )
+    )
+    # Flags retrieved during this tick were planted no later than its start, so
+    # their age is estimated from it. Flags enqueued late in a tick then go ahead
+    # of fresher ones. Retried flags keep the estimate, so they never lose priority.
+    planted_at = enqueued_at - get_tick_elapsed(datetime.now()).total_seconds()
+    metadata_headers[PLANTED_AT_HEADER] = int(planted_at * 1000)
+    priority = get_flag_priority(planted_at)
+
+    if isinstance(get_broker(), PostgresConnection):
+        # Flags and their queue messages are committed in a single transaction.
+        await publish_flags(
+            new_flag_values,
+            metadata_headers,
+            enqueued_at,
+            priority=priority,
+            session=db,
+        )
+        await db.commit()
+    else:
+        await db.commit()
+        await publish_flags(
+            new_flag_values, metadata_headers, enqueued_at, priority=priority
         )
 
     emitter.emit(
@@ -96,14 +126,49 @@ async def enqueue(
     )
 
 
+async def publish_flags(
+    values: list[str],
+    metadata_headers: dict,
+    enqueued_at: float,
+    **kwargs,
+):
+    """
+    Publishes new flags to the submission queue, packed into a single envelope if
+    envelopes are enabled. Extra keyword arguments are passed to the queue's `put`.
+    """
+    if not values:
+        return
+
+    submission_queue = get_broker().get_queue("submission_queue")
+
+    if config.rabbitmq.envelopes:
+        body, headers = pack(values)
+        await submission_queue.put(
+            body,
+            ttl=str(config.game.flag_ttl * 1000),
+            headers=metadata_headers | (headers or {}),
+            timestamp=int(enqueued_at),
+            **kwargs,
+        )
+    else:
+        for flag in values:
+            await submission_queue.put(
+                flag,
+                ttl=str(config.game.flag_ttl * 1000),
+                headers=metadata_headers,
+                timestamp=int(enqueued_at),
+                **kwargs,
+            )
+
+
 @router.get("/search", response_model=SearchResults)
-def search(
+async def search(
     username: CurrentUser,
     query: str = Query("tick >= -1"),
     page: int = Query(1, ge=1),
     show: int = Query(25, le=100),
     sort: list[str] | None = Query(None),
-    db: Session = Depends(get_sync_db),
+    db: AsyncSession = Depends(get_async_db),
 ) -> SearchResults:
     # Build search query
     try:
@@ -135,16 +200,24 @@ def search(
     # Run query
     start = time.time()
     try:
-        flag_query = db.query(Flag).filter(sqlalchemy_query).order_by(*sort_expressions)
+        flag_query = (
+            select(Flag)
+            .where(sqlalchemy_query)
+            .order_by(*sort_expressions)
+            .offset((page - 1) * show)
+            .limit(show)
+        )
         results = [
             SearchResult.model_validate(flag)
-            for flag in flag_query.offset((page - 1) * show).limit(show).all()
+            for flag in (await db.execute(flag_query)).scalars().all()
         ]
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to run the query: %s" % e)
     elapsed = time.time() - start
 
-    total = db.query(func.count(Flag.id)).filter(sqlalchemy_query).scalar()
+    total = (
+        await db.execute(select(func.count(Flag.id)).where(sqlalchemy_query))
+    ).scalar_one()
     total_pages = (total + show - 1) // show
 
     return SearchResults(
@@ -1,16 +1,16 @@
-from datetime import datetime, timedelta
+from datetime import timedelta
 from typing import Annotated
 
 from fastapi import APIRouter, Depends
 from fastapi.responses import StreamingResponse
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy import BigInteger, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..auth import CurrentUser
 from ..broadcast import broadcast
 from ..config import config
-from ..database import get_sync_db
-from ..models import Flag
+from ..database import get_async_db
+from ..models import Flag, FlagStatusCount
 from ..scheduler import get_tick_number
 from ..schemas import (
     DashboardViewStats,
@@ -24,59 +24,90 @@ router = APIRouter(prefix="/stats", tags=["Statistics"])
 
 
 @router.get("/dashboard", response_model=DashboardViewStats)
-def dashboard_view_stats(
-    db: Annotated[Session, Depends(get_sync_db)],
+async def dashboard_view_stats(
+    db: Annotated[AsyncSession, Depends(get_async_db)],
     username: CurrentUser,
 ) -> DashboardViewStats:
-    expiration_time = datetime.now() - timedelta(seconds=config.game.flag_ttl)
-
-    accepted = db.query(Flag).filter(Flag.status == "accepted").count()
-    rejected = db.query(Flag).filter(Flag.status == "rejected").count()
+    # Counts are kept up to date by triggers on the flags table, so they're read
+    # without scanning it.
+    counts: dict[str | None, int] = dict(
+        (
+            await db.execute(
+                select(
+                    FlagStatusCount.status,
+                    func.sum(FlagStatusCount.count).cast(BigInteger),
+                ).group_by(FlagStatusCount.status)
+            )
+        )
+        .tuples()
+        .all()
+    )
 
+    # Flags whose messages were lost stay queued forever, so only flags that could
+    # still be submitted are counted as queued.
     queued = (
-        db.query(Flag)
-        .filter(Flag.status == "queued", Flag.timestamp >= expiration_time)
-        .count()
+        await db.execute(
+            select(func.count(Flag.id)).where(
+                Flag.status == "queued",
+                Flag.timestamp > func.now() - timedelta(seconds=config.game.flag_ttl),
+            )
+        )
+    ).scalar_one()
+
+    return DashboardViewStats(
+        accepted=counts.get("accepted", 0),
+        rejected=counts.get("rejected", 0),
+        queued=queued,
+        expired=counts.get("expired", 0),
     )
-    return DashboardViewStats(accepted=accepted, rejected=rejected, queued=queued)
 
 
 @router.get("/database", response_model=DatabaseViewStats)
-def database_view_stats(
-    db: Annotated[Session, Depends(get_sync_db)],
+async def database_view_stats(
+    db: Annotated[AsyncSession, Depends(get_async_db)],
     username: CurrentUser,
 ) -> DatabaseViewStats:
     current_tick = get_tick_number()
 
-    current_tick_flags = db.query(Flag).filter(Flag.tick == current_tick).count()
-    last_tick_flags = db.query(Flag).filter(Flag.tick == current_tick - 1).count()
-    manually_submitted = (
-        db.query(Flag)
-        .filter(Flag.target == "unknown", Flag.exploit == "manual")
-        .count()
-    )
-    total_flags = db.query(Flag).count()
+    # All counts are taken in a single scan of the flags table.
+    counts = (
+        await db.execute(
+            select(
+                func.count(Flag.id).filter(Flag.tick == current_tick),
+                func.count(Flag.id).filter(Flag.tick == current_tick - 1),
+                func.count(Flag.id).filter(
+                    Flag.target == "unknown", Flag.exploit == "manual"
+                ),
+                func.count(Flag.id),
+            )
+        )
+    ).one()
 
     return DatabaseViewStats(
-        current_tick=current_tick_flags,
-        last_tick=last_tick_flags,
-        manual=manually_submitted,
-        total=total_flags,
+        current_tick=counts[0],
+        last_tick=counts[1],
+        manual=counts[2],
+        total=counts[3],
     )
 
 
 @router.get("/timeline", response_model=list[TickStats])
-def timeline_view_stats(
-    db: Annotated[Session, Depends(get_sync_db)],
+async def timeline_view_stats(
+    db: Annotated[AsyncSession, Depends(get_async_db)],
     username: CurrentUser,
 ) -> list[TickStats]:
     current_tick = get_tick_number()
 
-    tick_stats: dict[int, int] = dict(
-        db.query(Flag.tick, func.count(Flag.id).label("count"))
-        .filter(Flag.status == "accepted")
-        .group_by(Flag.tick)
-        .order_by(Flag.tick)
+    tick_stats: dict[int | None, int] = dict(
+        (
+            await db.execute(
+                select(Flag.tick, func.count(Flag.id).label("count"))
+                .where(Flag.status == "accepted")
+                .group_by(Flag.tick)
+                .order_by(Flag.tick)
+            )
+        )
+        .tuples()
         .all()
     )
 
@@ -87,20 +118,21 @@ def timeline_view_stats(
 
 
 @router.get("/exploits")
-def exploits(
-    db: Annotated[Session, Depends(get_sync_db)],
+async def exploits(
+    db: Annotated[AsyncSession, Depends(get_async_db)],
     username: CurrentUser,
 ):
     last_tick = get_tick_number() - 1
     ten_ticks_ago = last_tick - 9
 
     results = (
-        db.query(Flag.exploit, Flag.tick, func.count(Flag.id).label("accepted_count"))
-        .filter(Flag.status == "accepted", Flag.tick >= ten_ticks_ago)
-        .group_by(Flag.exploit, Flag.tick)
-        .order_by(Flag.exploit, Flag.tick)
-        .all()
-    )
+        await db.execute(
+            select(Flag.exploit, Flag.tick, func.count(Flag.id).label("accepted_count"))
+            .where(Flag.status == "accepted", Flag.tick >= ten_ticks_ago)
+            .group_by(Flag.exploit, Flag.tick)
+            .order_by(Flag.exploit, Flag.tick)
+        )
+    ).all()
 
     all_ticks = list(range(ten_ticks_ago, last_tick + 1))
 
@@ -159,3 +191,24 @@ async def rabbit_event_stream():
                 yield "data: %s\n\n" % event.message
     except Exception:
         return
+
+
+@router.get("/stream/submitter")
+async def stream_submitter(username: CurrentUser):
+    return StreamingResponse(
+        submitter_event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+        },
+    )
+
+
+async def submitter_event_stream():
+    try:
+        async with broadcast.subscribe(channel="submitter") as subscriber:
+            async for event in subscriber:
+                yield "data: %s\n\n" % event.message
+    except Exception:
+        return
@@ -1,18 +1,20 @@
 from datetime import datetime, timedelta
 
-from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from avala_shared.logs import logger
 
 from .attack_data import reload_attack_data
 from .config import config
+from .database import compact_flag_status_counts
 from .mq.monitoring import fetch_and_broadcast_rates
 
 
-def initialize_scheduler() -> BackgroundScheduler:
+def initialize_scheduler() -> AsyncIOScheduler:
     """
     Initializes the APScheduler instance and schedules the tick announcer and attack data reloader.
+    Coroutine jobs run on the server's event loop, while other jobs run in its default executor.
     """
-    scheduler: BackgroundScheduler = BackgroundScheduler()
+    scheduler: AsyncIOScheduler = AsyncIOScheduler()
 
     now = datetime.now()
     scheduler.add_job(
@@ -39,6 +41,13 @@ def initialize_scheduler() -> BackgroundScheduler:
         next_run_time=(datetime.now() + timedelta(seconds=1)).replace(microsecond=0),
     )
 
+    scheduler.add_job(
+        func=compact_flag_status_counts,
+        trigger="interval",
+        seconds=60,
+        id="flag_status_count_compactor",
+    )
+
     print_current_tick(now)
     return scheduler
 
@@ -22,6 +22,43 @@ class FlagSubmissionResponse(BaseModel):
         return cls(value=data[0], status=data[1], response=data[2])
 
 
+class FlagMetadata(BaseModel):
+    tick: int | None = None
+    exploit: str | None = None
+    target: str | None = None
+    player: str | None = None
+    enqueued_at: float | None = None
+
+
+class FlagVerdict(FlagSubmissionResponse):
+    metadata: FlagMetadata = FlagMetadata()
+    verdict_at: float | None = None
+
+    @classmethod
+    def from_response(
+        cls,
+        response: FlagSubmissionResponse,
+        metadata: FlagMetadata,
+        verdict_at: float,
+    ) -> "FlagVerdict":
+        return cls(
+            value=response.value,
+            status=response.status,
+            response=response.response,
+            metadata=metadata,
+            verdict_at=verdict_at,
+        )
+
+    @property
+    def latency(self) -> float | None:
+        """
+        Seconds between enqueuing the flag and receiving its verdict.
+        """
+        if self.metadata.enqueued_at is None or self.verdict_at is None:
+            return None
+        return self.verdict_at - self.metadata.enqueued_at
+
+
 class FlagEnqueueRequest(BaseModel):
     values: list[str]
     exploit: str
@@ -80,6 +117,7 @@ class DashboardViewStats(BaseModel):
     accepted: int
     rejected: int
     queued: int
+    expired: int
 
 
 class TickStats(BaseModel):
@@ -104,3 +142,19 @@ class FlagCounterDelta(BaseModel):
     discarded: int
     accepted: int
     rejected: int
+    expired: int = 0
+
+
+class SubmitterBatchStats(BaseModel):
+    lane: int
+    batch_size: int | None  # None if unlimited
+    flags: int
+    latency: float
+    accepted: int
+    rejected: int
+    requeued: int
+
+
+class AttackDataUpdate(BaseModel):
+    version: str
+    tick: int | None
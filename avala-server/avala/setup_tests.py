@@ -1,3 +1,6 @@
+import asyncio
+import inspect
+import json
 import os
 import random
 import string
@@ -8,6 +11,7 @@ from typing import Callable
 
 from avala_shared.logs import logger
 
+from .attack_data import call_fetch_json, fetch_validators
 from .attack_data import import_user_functions as import_attack_data_functions
 from .config import config
 
@@ -82,17 +86,20 @@ def test_attack_data_functions_import():
 
 @test("Fetch attack data.", dependencies=[test_attack_data_functions_import])
 def test_attack_data_fetch_json():
-    fetch_json, _ = import_attack_data_functions()
-    json_or_list = fetch_json()
-    assert isinstance(
+    json_or_list = fetch_attack_data()
+    assert json_or_list is None or isinstance(
         json_or_list, (dict, list)
-    ), "Fetch function must return a dictionary or a list."
+    ), "Fetch function must return a dictionary, a list, a JSON response body or None."
 
 
 @test("Process attack data.", dependencies=[test_attack_data_fetch_json])
 def test_attack_data_process_json():
-    fetch_json, process_json = import_attack_data_functions()
-    obj = process_json(fetch_json())
+    _, process_json = import_attack_data_functions()
+    json_or_list = fetch_attack_data()
+    if json_or_list is None:
+        return  # Not modified, so there is nothing to process.
+
+    obj = process_json(json_or_list)
 
     assert isinstance(obj, dict), "Object is not a dictionary"
 
@@ -131,18 +138,23 @@ def test_flag_submission() -> None:
     prepare = import_submitter_function("prepare")
     cleanup = import_submitter_function("cleanup")
 
-    if prepare:
-        prepare()
-
     flags: list[str] = [gen_test_flag() for _ in range(50)]
-    responses: list[tuple[str, str, str]] = []
 
-    if config.submitter.streams:
-        for flag in flags:
-            response = submit(flag)
-            responses.append(response)
-    else:
-        responses = submit(flags)
+    async def submit_flags() -> list[tuple[str, str, str]]:
+        # Runs on a single event loop, so async resources opened in prepare can
+        # still be used by submit and cleanup.
+        if prepare:
+            await call_user_function(prepare)
+
+        try:
+            if config.submitter.streams:
+                return [await call_user_function(submit, flag) for flag in flags]
+            return await call_user_function(submit, flags)
+        finally:
+            if cleanup:
+                await call_user_function(cleanup)
+
+    responses = asyncio.run(submit_flags())
 
     assert responses, "No responses received."
     assert all(
@@ -168,10 +180,22 @@ def test_flag_submission() -> None:
         )
     )
 
-    if cleanup:
-        cleanup()
 
-    submit = import_submitter_function("submit")
+def fetch_attack_data():
+    """
+    Fetches attack data the way the server does. The fetch function may be async,
+    takes validators for conditional requests if it has a parameter, and may return
+    the raw response body, which is parsed here. None means not modified.
+    """
+    fetch_json, _ = import_attack_data_functions()
+
+    # Without validators, the game server has nothing to answer 304 Not Modified to.
+    fetch_validators.clear()
+    json_or_list = asyncio.run(call_fetch_json(fetch_json))
+
+    if isinstance(json_or_list, (bytes, str)):
+        json_or_list = json.loads(json_or_list)
+    return json_or_list
 
 
 def import_submitter_function(function_name: str):
@@ -186,6 +210,13 @@ def import_submitter_function(function_name: str):
     return getattr(imported_module, function_name, None)
 
 
+async def call_user_function(func: Callable, *args):
+    """Calls a user written function, awaiting it if it's async."""
+    if inspect.iscoroutinefunction(func):
+        return await func(*args)
+    return func(*args)
+
+
 def gen_test_flag():
     return "TEST_" + "".join(
         random.choices(string.ascii_uppercase + string.digits, k=30)
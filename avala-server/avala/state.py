@@ -1,4 +1,6 @@
+from sqlalchemy import select
 from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from .models import State
@@ -45,3 +47,49 @@ class StateManager:
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         pass
+
+
+class AsyncStateManager:
+    """
+    Async variant of `StateManager`, for use on the event loop. Values are read and
+    written with `get` and `put` only, since attribute access can't be awaited.
+    """
+
+    def __init__(self, db: AsyncSession) -> None:
+        self.db: AsyncSession = db
+
+    async def get(self, key: str) -> str | None:
+        return (
+            await self.db.execute(select(State.value).where(State.key == key))
+        ).scalar_one_or_none()
+
+    async def get_many(self, *keys: str) -> tuple[str | None, ...]:
+        """
+        Reads multiple values in a single query.
+
+        :return: Values in the order of the given keys, None for missing keys.
+        :rtype: tuple[str | None, ...]
+        """
+        values: dict[str | None, str | None] = dict(
+            (
+                await self.db.execute(
+                    select(State.key, State.value).where(State.key.in_(keys))
+                )
+            )
+            .tuples()
+            .all()
+        )
+        return tuple(values.get(key) for key in keys)
+
+    async def put(self, key: str, value: str):
+        if not isinstance(value, str):
+            raise TypeError("Stored state value must be a string.")
+
+        await self.db.execute(
+            insert(State)
+            .values(key=key, value=value)
+            .on_conflict_do_update(
+                index_elements=[State.key],
+                set_={"value": value},
+            )
+        )
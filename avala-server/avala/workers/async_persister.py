@@ -0,0 +1,185 @@
+import asyncio
+import time
+
+from avala_shared.logs import logger
+from sqlalchemy import select, update
+
+from ..broadcast import emitter
+from ..database import get_async_db_session
+from ..models import Flag
+from ..mq.envelopes import unpack
+from ..mq.memory import MemoryConnection, MemoryMessage
+from ..mq.postgres import PostgresConnection, PostgresMessage
+from ..schemas import FlagCounterDelta, FlagVerdict
+from .persister import BATCH_SIZE, INTERVAL, latency_tracker
+
+
+class AsyncPersister:
+    """
+    Persister used with the Postgres queue backend, and by the server in all-in-one
+    mode. Works like the standalone persister, but reads from Postgres or in-memory
+    queues and writes to the database from an event loop.
+
+    :param connection: Connection holding the persisting and expired queues.
+    :type connection: PostgresConnection | MemoryConnection
+    :param owns_connection: Connect and close the connection, defaults to True.
+    :type owns_connection: bool, optional
+    """
+
+    def __init__(
+        self,
+        connection: PostgresConnection | MemoryConnection,
+        owns_connection: bool = True,
+    ) -> None:
+        self.connection = connection
+        self.owns_connection = owns_connection
+
+    async def start(self):
+        if self.owns_connection:
+            await self.connection.connect()
+
+        await self.connection.declare_queue("persisting_queue", durable=True)
+        await self.connection.declare_queue("expired_queue", durable=True)
+
+        try:
+            while True:
+                await asyncio.sleep(INTERVAL)
+                try:
+                    await self._persist_responses_in_batches()
+                    await self._persist_expired_flags_in_batches()
+                except Exception as e:
+                    logger.error("Failed to persist flag responses: {error}", error=e)
+        finally:
+            if self.owns_connection:
+                await self.connection.close()
+
+    async def _persist_responses_in_batches(self):
+        persisting_queue = self.connection.get_queue("persisting_queue")
+
+        while True:
+            persisting_buffer: list[FlagVerdict] = []
+            messages: list[PostgresMessage | MemoryMessage] = []
+
+            try:
+                while len(persisting_buffer) < BATCH_SIZE:
+                    message = await persisting_queue.get()
+                    if message is None:
+                        break
+
+                    messages.append(message)
+                    for item in unpack(message.body, message.headers):
+                        persisting_buffer.append(FlagVerdict.model_validate_json(item))
+
+                if not persisting_buffer:
+                    break
+
+                await self._persist_responses(persisting_buffer)
+            except Exception:
+                await self._requeue(messages)
+                raise
+
+            for message in messages:
+                await message.ack()
+
+    async def _persist_responses(self, persisting_buffer: list[FlagVerdict]):
+        """
+        Persists responses from the persistence buffer into the database.
+        """
+        logger.info(
+            "Persisting {count} flag responses...", count=len(persisting_buffer)
+        )
+
+        flag_responses_map = {fr.value: fr for fr in persisting_buffer}
+
+        async with get_async_db_session() as db:
+            flag_records_to_update = (
+                await db.execute(
+                    select(Flag.id, Flag.value).where(
+                        Flag.value.in_(list(flag_responses_map.keys()))
+                    )
+                )
+            ).all()
+
+            updates = [
+                {
+                    "id": flag_id,
+                    "status": flag_responses_map[value].status,
+                    "response": flag_responses_map[value].response,
+                }
+                for flag_id, value in flag_records_to_update
+            ]
+            if updates:
+                await db.execute(update(Flag), updates)
+
+        logger.info("Updated {count} records.", count=len(updates))
+
+        persisted_at = time.time()
+        for verdict in persisting_buffer:
+            if verdict.metadata.enqueued_at is not None:
+                latency_tracker.observe(
+                    verdict.metadata.exploit,
+                    persisted_at - verdict.metadata.enqueued_at,
+                )
+        latency_tracker.report_if_due()
+
+    async def _persist_expired_flags_in_batches(self):
+        """
+        Marks flags dead-lettered to the expired queue as expired in the database.
+        """
+        expired_queue = self.connection.get_queue("expired_queue")
+
+        while True:
+            expired_flags: list[str] = []
+            messages: list[PostgresMessage | MemoryMessage] = []
+
+            try:
+                while len(expired_flags) < BATCH_SIZE:
+                    message = await expired_queue.get()
+                    if message is None:
+                        break
+
+                    messages.append(message)
+                    expired_flags.extend(unpack(message.body, message.headers))
+
+                if not expired_flags:
+                    break
+
+                async with get_async_db_session() as db:
+                    result = await db.execute(
+                        update(Flag)
+                        .where(Flag.value.in_(expired_flags), Flag.status == "queued")
+                        .values(status="expired")
+                        .execution_options(synchronize_session=False)
+                    )
+                    updated_count = result.rowcount
+            except Exception:
+                await self._requeue(messages)
+                raise
+
+            for message in messages:
+                await message.ack()
+
+            logger.info(
+                "Marked {count} flags as <yellow>expired</>.", count=updated_count
+            )
+
+            emitter.emit(
+                "flags",
+                FlagCounterDelta(
+                    queued=-updated_count,
+                    discarded=0,
+                    accepted=0,
+                    rejected=0,
+                    expired=updated_count,
+                ).model_dump_json(exclude_unset=True),
+            )
+
+    async def _requeue(self, messages: list[PostgresMessage | MemoryMessage]):
+        """
+        Returns messages of a batch that couldn't be persisted to their queue, so
+        they are persisted on the next run. The standalone persister gets the same
+        from RabbitMQ, which requeues unacknowledged messages once its connection
+        closes.
+        """
+        for message in messages:
+            await message.reject(requeue=True)
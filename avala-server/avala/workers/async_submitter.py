@@ -0,0 +1,565 @@
+import asyncio
+import inspect
+import time
+from types import ModuleType
+from typing import Callable
+
+from aio_pika import IncomingMessage
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from avala_shared.logs import logger
+
+from ..broadcast import emitter
+from ..config import config
+from ..mq.envelopes import pack, strip_envelope_headers, unpack
+from ..mq.memory import MemoryConnection
+from ..mq.metadata import metadata_from_headers
+from ..mq.postgres import PostgresConnection
+from ..mq.queues import (
+    get_flag_priority,
+    get_planted_at,
+    get_submission_queue_arguments,
+)
+from ..mq.rabbit_async import RabbitConnection
+from ..mq.retry import (
+    ATTEMPTS_HEADER,
+    flag_expires_within,
+    get_retry_delay,
+    get_retry_queue_arguments,
+    get_retry_queue_name,
+)
+from ..schemas import FlagCounterDelta, FlagMetadata, FlagSubmissionResponse
+from .batching import AdaptiveBatchSize, get_batch_size
+from .rate_limit import TokenBucket
+from .submitter import (
+    build_verdicts,
+    calculate_next_run_time,
+    emit_submission_stats,
+    import_user_module,
+    record_batch,
+)
+
+
+class UserModuleLanes:
+    """
+    Submission lanes of the async submitter, each running the user module's submit
+    function for one batch or flag at a time.
+
+    Async functions run on the event loop, so all lanes share one module. Sync
+    functions run in threads, and every lane gets its own copy of the module, like
+    lanes of the threaded submitter. Module-level state such as a connection opened
+    by `prepare` is then never used by two submissions at once.
+
+    :param user_module: Module with the user's submit, prepare and cleanup functions.
+    :type user_module: ModuleType
+    :param lanes: Number of lanes.
+    :type lanes: int
+    """
+
+    def __init__(self, user_module: ModuleType, lanes: int) -> None:
+        if inspect.iscoroutinefunction(user_module.submit):
+            self.modules = [user_module]
+            lane_modules = [user_module] * lanes
+        else:
+            self.modules = [user_module] + [
+                import_user_module() for _ in range(lanes - 1)
+            ]
+            lane_modules = self.modules
+
+        self.idle: asyncio.Queue[ModuleType] = asyncio.Queue()
+        for module in lane_modules:
+            self.idle.put_nowait(module)
+
+    async def submit(self, flags: str | list[str]):
+        """
+        Submits flags on the next idle lane. If submitting fails, the lane's module
+        reconnects to the flag checker before the error is raised.
+        """
+        module = await self.idle.get()
+        try:
+            return await call_user_function(module.submit, flags)
+        except Exception:
+            await self.reconnect(module)
+            raise
+        finally:
+            self.idle.put_nowait(module)
+
+    async def prepare(self):
+        for module in self.modules:
+            await call_user_function(getattr(module, "prepare", None))
+
+    async def cleanup(self):
+        for module in self.modules:
+            await call_user_function(getattr(module, "cleanup", None))
+
+    async def reconnect(self, module: ModuleType):
+        """
+        Calls cleanup and prepare functions of a module after a failed submission, so
+        the next submission starts with a fresh connection to the flag checker.
+        """
+        try:
+            await call_user_function(getattr(module, "cleanup", None))
+            await call_user_function(getattr(module, "prepare", None))
+        except Exception as e:
+            logger.error("Failed to reconnect to the flag checker: {error}", error=e)
+
+
+class AsyncSubmitter:
+    """
+    Submitter used when the user module defines `async def submit`, with the Postgres
+    queue backend, and by the server in all-in-one mode. Flags are consumed with
+    aio-pika (or from Postgres or in-memory queues) and submitted as asyncio tasks,
+    so up to `submitter.workers` batches can be in flight at once and a slow flag
+    checker never blocks broker heartbeats.
+    """
+
+    def __init__(
+        self,
+        user_module: ModuleType,
+        rate_limiter: TokenBucket | None = None,
+        batching: AdaptiveBatchSize | None = None,
+        connection: (
+            RabbitConnection | PostgresConnection | MemoryConnection | None
+        ) = None,
+        owns_connection: bool = True,
+    ) -> None:
+        self.lanes = UserModuleLanes(user_module, config.submitter.workers)
+        self.rate_limiter = rate_limiter
+        self.batching = batching
+
+        # A connection that isn't owned is connected and closed by the caller.
+        self.connection = connection or RabbitConnection()
+        self.owns_connection = owns_connection
+
+        self.submission_buffer: list[str] = []
+        self.message_map: dict[str, IncomingMessage] = {}
+
+        self.in_flight: asyncio.Semaphore
+        self.tasks: set[asyncio.Task] = set()
+
+    async def start(self):
+        try:
+            if self.owns_connection:
+                await self.connection.connect()
+        except Exception as e:
+            logger.error(
+                "Failed to connect to the message queue: {error}",
+                error=e,
+            )
+            return
+
+        self.in_flight = asyncio.Semaphore(config.submitter.workers)
+        await self._declare_queues()
+        await self.connection.set_prefetch(config.submitter.prefetch_count)
+        submission_queue = self.connection.get_queue("submission_queue")
+
+        await self.lanes.prepare()
+
+        try:
+            if config.submitter.per_tick or config.submitter.interval:
+                interval, next_run_time = calculate_next_run_time()
+
+                scheduler = AsyncIOScheduler()
+                scheduler.add_job(
+                    func=self._submit_flags_scheduled_job,
+                    trigger="interval",
+                    seconds=interval.total_seconds(),
+                    id="submitter",
+                    next_run_time=next_run_time,
+                )
+                scheduler.start()
+            elif config.submitter.batch_size:
+                await submission_queue.add_consumer(
+                    self._submit_flags_in_batches_consumer
+                )
+                self._spawn(self._flush_submission_buffer_periodically())
+            elif config.submitter.streams:
+                await submission_queue.add_consumer(
+                    self._submit_flags_in_stream_consumer
+                )
+
+            await asyncio.Future()  # Run until cancelled
+        finally:
+            await self.lanes.cleanup()
+            if self.owns_connection:
+                await self.connection.close()
+
+    async def _submit_flags_in_batches_consumer(self, message: IncomingMessage):
+        flags = await self._buffer_message(
+            message, self.submission_buffer, self.message_map
+        )
+
+        logger.debug(
+            "Received <b>{count}</> flags ({total} flags in buffer)",
+            count=len(flags),
+            total=len(self.submission_buffer),
+        )
+
+        if len(self.submission_buffer) < get_batch_size(self.batching):
+            return  # Skip submission if batch size not reached
+
+        self._submit_buffered_flags()
+
+    async def _flush_submission_buffer_periodically(self):
+        """
+        Submits buffered flags even if the batch size is not reached, so flags don't
+        wait in the buffer when the queue runs dry.
+        """
+        while True:
+            await asyncio.sleep(config.submitter.flush_interval)
+            if self.submission_buffer:
+                logger.info(
+                    "Flushing {count} buffered flags.",
+                    count=len(self.submission_buffer),
+                )
+                self._submit_buffered_flags()
+
+    def _submit_buffered_flags(self):
+        self._spawn(
+            self._submit_flags_from_buffer(
+                self.submission_buffer,
+                self.message_map,
+            )
+        )
+
+        self.submission_buffer = []
+        self.message_map = {}
+
+    async def _submit_flags_scheduled_job(self):
+        submission_queue = self.connection.get_queue("submission_queue")
+        batches = []
+
+        while True:
+            submission_buffer: list[str] = []
+            message_map: dict[str, IncomingMessage] = {}
+
+            batch_size = get_batch_size(self.batching)
+            while len(submission_buffer) < batch_size:
+                message = await submission_queue.get()
+                if message is None:
+                    break
+
+                await self._buffer_message(message, submission_buffer, message_map)
+
+            if not submission_buffer:
+                break
+
+            logger.info(
+                "Pulled {count} flags from the submission queue.",
+                count=len(submission_buffer),
+            )
+            batches.append(
+                asyncio.create_task(
+                    self._submit_flags_from_buffer(submission_buffer, message_map)
+                )
+            )
+
+            if len(submission_buffer) < batch_size:
+                break
+
+        if not batches:
+            logger.info(
+                "No flags remaining in the submission queue. Submission skipped."
+            )
+            return
+
+        await asyncio.gather(*batches)
+
+    async def _buffer_message(
+        self,
+        message: IncomingMessage,
+        submission_buffer: list[str],
+        message_map: dict[str, IncomingMessage],
+    ) -> list[str]:
+        """
+        Unpacks flags from a received message into the submission buffer. Messages
+        whose flags are too old to be accepted are dropped right away.
+
+        :return: Flags added to the buffer.
+        :rtype: list[str]
+        """
+        if flag_expires_within(message.timestamp):
+            await self._drop_expired_message(message)
+            return []
+
+        flags = unpack(message.body, message.headers)
+        for flag in flags:
+            submission_buffer.append(flag)
+            message_map[flag] = message
+
+        return flags
+
+    async def _submit_flags_from_buffer(
+        self,
+        submission_buffer: list[str],
+        message_map: dict[str, IncomingMessage],
+    ):
+        """
+        Submits flags from the submission buffer. At most `submitter.workers` buffers
+        are submitted at the same time. Messages are acknowledged once all of their
+        flags are persisted or sent for retry.
+        """
+        responses: list[FlagSubmissionResponse] = []
+        response_statuses: list[str] = []
+
+        async with self.in_flight:
+            # Envelopes may fill the buffer past the batch size, and the adaptive
+            # batch size may shrink in the meantime, so flags are submitted in
+            # multiple batches if needed.
+            i = 0
+            while i < len(submission_buffer):
+                batch_size = min(
+                    get_batch_size(self.batching), len(submission_buffer) - i
+                )
+                batch = submission_buffer[i : i + int(batch_size)]
+                i += len(batch)
+
+                await self._wait_for_rate_limit(len(batch))
+                logger.info("Submitting <b>{count}</> flags...", count=len(batch))
+
+                started_at = time.monotonic()
+                try:
+                    response_tuples = await self.lanes.submit(batch)
+                except Exception as e:
+                    logger.error(
+                        "Failed to submit {count} flags, requeueing them: {error}",
+                        count=len(batch),
+                        error=e,
+                    )
+                    if self.batching:
+                        self.batching.record_failure()
+                    continue
+                latency = time.monotonic() - started_at
+
+                batch_statuses: list[str] = []
+                for response_tuple in response_tuples:
+                    response = FlagSubmissionResponse.from_tuple(response_tuple)
+                    if response.status != "requeued":
+                        responses.append(response)
+                    batch_statuses.append(response.status)
+
+                response_statuses.extend(batch_statuses)
+                record_batch(0, self.batching, len(batch), batch_statuses, latency)
+
+        metadata = {
+            id(message): metadata_from_headers(message.headers)
+            for message in message_map.values()
+        }
+        await self._persist_responses(
+            responses,
+            {flag: metadata[id(message)] for flag, message in message_map.items()},
+        )
+
+        resolved_flags = {response.value for response in responses}
+        await self._settle_messages(
+            [flag for flag in submission_buffer if flag not in resolved_flags],
+            message_map,
+        )
+
+        emit_submission_stats(response_statuses)
+
+    async def _submit_flags_in_stream_consumer(self, message: IncomingMessage):
+        self._spawn(self._submit_flags_from_stream(message))
+
+    async def _submit_flags_from_stream(self, message: IncomingMessage):
+        if flag_expires_within(message.timestamp):
+            await self._drop_expired_message(message)
+            return
+
+        flags = unpack(message.body, message.headers)
+        responses: list[FlagSubmissionResponse] = []
+        requeued_flags: list[str] = []
+
+        for flag in flags:
+            logger.debug("Received flag <b>{flag}</>", flag=flag)
+
+            async with self.in_flight:
+                await self._wait_for_rate_limit(1)
+                try:
+                    response_tuple = await self.lanes.submit(flag)
+                except Exception as e:
+                    logger.error(
+                        "Failed to submit flag <b>{flag}</>, requeueing it: {error}",
+                        flag=flag,
+                        error=e,
+                    )
+                    requeued_flags.append(flag)
+                    continue
+
+            if not response_tuple:
+                logger.debug("<blue>Requeued</blue> {flag}", flag=flag)
+                requeued_flags.append(flag)
+                continue
+
+            response = FlagSubmissionResponse.from_tuple(response_tuple)
+            if response.status == "requeued":
+                logger.debug(
+                    "<blue>Requeued</blue> {response}", response=response.response
+                )
+                requeued_flags.append(flag)
+                continue
+
+            responses.append(response)
+            logger.debug(
+                (
+                    "<green>Accepted</green> {response}"
+                    if response.status == "accepted"
+                    else "<red>Rejected</red> {response}"
+                ),
+                response=response.response,
+            )
+
+        metadata = metadata_from_headers(message.headers)
+        await self._persist_responses(responses, {flag: metadata for flag in flags})
+        await self._settle_messages(
+            requeued_flags, {flag: message for flag in flags}, [message]
+        )
+
+        if responses:
+            accepted = sum(response.status == "accepted" for response in responses)
+            emitter.emit(
+                "flags",
+                FlagCounterDelta(
+                    queued=-len(responses),
+                    discarded=0,
+                    accepted=accepted,
+                    rejected=len(responses) - accepted,
+                ).model_dump_json(exclude_unset=True),
+            )
+
+    async def _declare_queues(self):
+        """
+        Declares queues used by the submitter and registers them on the connection,
+        including a delay queue for each configured retry delay.
+        """
+        await self.connection.declare_queue(
+            "submission_queue",
+            durable=True,
+            arguments=get_submission_queue_arguments(),
+        )
+        await self.connection.declare_queue("persisting_queue", durable=True)
+        await self.connection.declare_queue("expired_queue", durable=True)
+        for delay in set(config.submitter.retry_delays):
+            await self.connection.declare_queue(
+                get_retry_queue_name(delay),
+                durable=True,
+                arguments=get_retry_queue_arguments(delay),
+            )
+
+    async def _persist_responses(
+        self,
+        responses: list[FlagSubmissionResponse],
+        metadata: dict[str, FlagMetadata],
+    ):
+        """
+        Publishes flag verdicts to the persisting queue, packed into a single
+        envelope if envelopes are enabled.
+        """
+        if not responses:
+            return
+
+        persisting_queue = self.connection.get_queue("persisting_queue")
+        serialized = [
+            verdict.model_dump_json() for verdict in build_verdicts(responses, metadata)
+        ]
+
+        if config.rabbitmq.envelopes:
+            body, headers = pack(serialized)
+            await persisting_queue.put(body, headers=headers)
+        else:
+            for item in serialized:
+                await persisting_queue.put(item)
+
+    async def _settle_messages(
+        self,
+        requeued_flags: list[str],
+        message_map: dict[str, IncomingMessage],
+        messages: list[IncomingMessage] | None = None,
+    ):
+        """
+        Sends requeued flags for retry, grouped by the message they arrived in, and
+        acknowledges all messages in the buffer.
+        """
+        if messages is None:
+            messages = list({id(m): m for m in message_map.values()}.values())
+
+        requeued_by_message: dict[int, list[str]] = {}
+        for flag in requeued_flags:
+            requeued_by_message.setdefault(id(message_map[flag]), []).append(flag)
+
+        for message in messages:
+            if id(message) in requeued_by_message:
+                await self._retry_flags(requeued_by_message[id(message)], message)
+            await message.ack()
+
+    async def _retry_flags(self, flags: list[str], message: IncomingMessage):
+        """
+        Moves flags to the delay queue of their next retry attempt. The flags return to
+        the submission queue once the delay runs out. Flags that would expire while
+        waiting are sent to the expired queue instead.
+        """
+        headers = strip_envelope_headers(message.headers)
+        attempt = int(headers.get(ATTEMPTS_HEADER, 0)) + 1
+        delay = get_retry_delay(attempt)
+
+        body, envelope_headers = pack(flags)
+        headers.update(envelope_headers or {})
+
+        if flag_expires_within(message.timestamp, delay):
+            await self.connection.get_queue("expired_queue").put(body, headers=headers)
+            logger.debug("Dropped {count} expired flags.", count=len(flags))
+            return
+
+        headers[ATTEMPTS_HEADER] = attempt
+        await self.connection.get_queue(get_retry_queue_name(delay)).put(
+            body,
+            headers=headers,
+            timestamp=message.timestamp,
+            priority=get_flag_priority(get_planted_at(headers, message.timestamp)),
+        )
+
+        logger.debug(
+            "Retrying {count} flags in {delay}s (attempt {attempt}).",
+            count=len(flags),
+            delay=delay,
+            attempt=attempt,
+        )
+
+    async def _drop_expired_message(self, message: IncomingMessage):
+        """
+        Drops a message with flags too old to be accepted by the flag checker. Rejected
+        messages are dead-lettered to the expired queue, where the persister picks them up.
+        """
+        await message.reject()
+        logger.debug("Dropped expired message {tag}.", tag=message.delivery_tag)
+
+    async def _wait_for_rate_limit(self, flag_count: int):
+        """
+        Waits until the rate limiter allows submitting the given number of flags.
+        """
+        rate_limit = config.submitter.rate_limit
+        if not self.rate_limiter or rate_limit is None:
+            return
+
+        tokens = flag_count if rate_limit.unit == "flags" else 1
+        await self.rate_limiter.acquire_async(tokens)
+
+    def _spawn(self, coroutine):
+        """
+        Runs a coroutine as a background task and keeps a reference to it until it's done.
+        """
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+
+async def call_user_function(func: Callable | None, *args):
+    """
+    Calls an optional user function that may be either sync or async. Sync functions
+    run in a thread, since they would otherwise block the event loop, which runs the
+    whole server in all-in-one mode.
+    """
+    if func is None:
+        return None
+    if inspect.iscoroutinefunction(func):
+        return await func(*args)
+    return await asyncio.to_thread(func, *args)
@@ -0,0 +1,111 @@
+import threading
+
+from avala_shared.logs import logger
+
+from ..config import AdaptiveBatchingConfig, config
+
+
+class AdaptiveBatchSize:
+    """
+    Batch size adjusted after every submitted batch, following the additive increase,
+    multiplicative decrease (AIMD) scheme. The size grows by a constant step while
+    full batches are submitted within the target latency, and is cut by a factor as
+    soon as a batch is too slow, too many of its flags get requeued, or the
+    submission fails. Shared by all submission lanes, since they talk to the same
+    flag checker.
+
+    :param settings: Bounds and tuning of the adaptive batch size.
+    :type settings: AdaptiveBatchingConfig
+    :param initial_size: Batch size to start from. Clamped to the configured bounds.
+    :type initial_size: float
+    """
+
+    def __init__(self, settings: AdaptiveBatchingConfig, initial_size: float) -> None:
+        self.settings = settings
+        self._size = int(max(settings.min_size, min(initial_size, settings.max_size)))
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def record(self, flag_count: int, latency: float, requeued_count: int) -> int:
+        """
+        Adjusts the batch size based on the outcome of a submitted batch.
+
+        :param flag_count: Number of flags in the batch.
+        :type flag_count: int
+        :param latency: Duration of the submit call in seconds.
+        :type latency: float
+        :param requeued_count: Number of flags requeued or missing from the response.
+        :type requeued_count: int
+        :return: New batch size.
+        :rtype: int
+        """
+        if latency > self.settings.target_latency:
+            return self._decrease(
+                "submission took %.2fs (target %.2fs)"
+                % (latency, self.settings.target_latency)
+            )
+        if requeued_count > flag_count * self.settings.max_requeue_ratio:
+            return self._decrease(
+                "%d of %d flags were requeued" % (requeued_count, flag_count)
+            )
+        if flag_count >= self._size:
+            # Only full batches tell whether the checker can handle more.
+            return self._increase()
+        return self._size
+
+    def record_failure(self) -> int:
+        """
+        Shrinks the batch size after a submission raised an exception.
+
+        :return: New batch size.
+        :rtype: int
+        """
+        return self._decrease("submission failed")
+
+    def _increase(self) -> int:
+        with self._lock:
+            previous = self._size
+            self._size = min(
+                self._size + self.settings.increase,
+                self.settings.max_size,
+            )
+
+        if self._size != previous:
+            logger.debug(
+                "Increased batch size from {previous} to <b>{size}</>.",
+                previous=previous,
+                size=self._size,
+            )
+        return self._size
+
+    def _decrease(self, reason: str) -> int:
+        with self._lock:
+            previous = self._size
+            self._size = max(
+                int(self._size * self.settings.decrease_factor),
+                self.settings.min_size,
+            )
+
+        if self._size != previous:
+            logger.info(
+                "Decreased batch size from {previous} to <b>{size}</> because {reason}.",
+                previous=previous,
+                size=self._size,
+                reason=reason,
+            )
+        return self._size
+
+
+def get_batch_size(batching: AdaptiveBatchSize | None) -> float:
+    """
+    Returns the number of flags to submit at once, either the current adaptive size
+    or the static size from the configuration.
+    """
+    if batching:
+        return batching.size
+    return (
+        config.submitter.batch_size or config.submitter.max_batch_size or float("inf")
+    )
@@ -0,0 +1,93 @@
+import threading
+import time
+from bisect import bisect_left
+
+from avala_shared.logs import logger
+
+# Upper bounds of histogram buckets in seconds. The last bucket catches everything
+# slower, up to the flag TTL.
+BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, float("inf"))
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket histogram of latencies in seconds.
+    """
+
+    def __init__(self) -> None:
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """
+        Returns the upper bound of the bucket containing the given quantile.
+
+        :param q: Quantile between 0 and 1.
+        :type q: float
+        :return: Upper bound of the bucket in seconds, or the largest observed
+                 latency if the quantile falls into the last bucket.
+        :rtype: float
+        """
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class LatencyTracker:
+    """
+    Tracks latencies per exploit and periodically logs a summary of each exploit's
+    histogram. Histograms are reset after each report, so every summary covers only
+    the latest reporting window. Safe to share between submission lanes.
+
+    :param label: Describes the measured latency in the logged summary.
+    :type label: str
+    :param report_interval: Minimum number of seconds between two reports.
+    :type report_interval: float
+    """
+
+    def __init__(self, label: str, report_interval: float = 60) -> None:
+        self.label = label
+        self.report_interval = report_interval
+        self.histograms: dict[str, LatencyHistogram] = {}
+        self.last_report = time.monotonic()
+        self._lock = threading.Lock()
+
+    def observe(self, exploit: str | None, seconds: float | None):
+        if seconds is None:
+            return
+        with self._lock:
+            self.histograms.setdefault(
+                exploit or "unknown", LatencyHistogram()
+            ).observe(max(seconds, 0.0))
+
+    def report_if_due(self):
+        with self._lock:
+            if time.monotonic() - self.last_report < self.report_interval:
+                return
+            histograms, self.histograms = self.histograms, {}
+            self.last_report = time.monotonic()
+
+        for exploit, histogram in sorted(histograms.items()):
+            logger.info(
+                "{label} of <b>{exploit}</>: p50 ≤ {p50:.2f}s, p95 ≤ {p95:.2f}s, p99 ≤ {p99:.2f}s, max {max:.2f}s, mean {mean:.2f}s over <b>{count}</> flags.",
+                label=self.label,
+                exploit=exploit,
+                p50=histogram.quantile(0.5),
+                p95=histogram.quantile(0.95),
+                p99=histogram.quantile(0.99),
+                max=histogram.max,
+                mean=histogram.total / histogram.count,
+                count=histogram.count,
+            )
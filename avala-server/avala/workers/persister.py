@@ -1,18 +1,35 @@
+import asyncio
+import time
+
 from apscheduler.schedulers.blocking import BlockingScheduler
 from avala_shared.logs import logger
 from sqlalchemy.orm import Session
 
+from ..broadcast import emitter
+from ..config import config
 from ..database import get_sync_db_session
 from ..models import Flag
+from ..mq.envelopes import unpack
 from ..mq.rabbit import RabbitConnection, RabbitQueue
-from ..schemas import FlagSubmissionResponse
+from ..schemas import FlagCounterDelta, FlagVerdict
+from .latency import LatencyTracker
 
 # TODO: Make configurable
 BATCH_SIZE = 1000
 INTERVAL = 5
 
+latency_tracker = LatencyTracker("Enqueue-to-persist latency")
+
 
 def main():
+    emitter.connect()
+
+    if config.queue.backend == "postgres":
+        from ..mq.postgres import PostgresConnection
+        from .async_persister import AsyncPersister
+
+        asyncio.run(AsyncPersister(PostgresConnection()).start())
+        return
     with get_sync_db_session() as db:
         worker = Persister(db)
         worker.start()
@@ -49,7 +66,7 @@ class Persister:
             )
 
             while True:
-                persisting_buffer: list[FlagSubmissionResponse] = []
+                persisting_buffer: list[FlagVerdict] = []
                 delivery_tag_map: dict[str, int] = {}
 
                 while len(persisting_buffer) < BATCH_SIZE:
@@ -66,11 +83,12 @@ class Persister:
                             )
                         break
 
-                    fr = FlagSubmissionResponse.model_validate_json(body)
-                    persisting_buffer.append(fr)
-                    delivery_tag_map[fr.value] = method.delivery_tag
+                    for item in unpack(body, properties.headers):
+                        fr = FlagVerdict.model_validate_json(item)
+                        persisting_buffer.append(fr)
+                        delivery_tag_map[fr.value] = method.delivery_tag
 
-                    if len(persisting_buffer) == BATCH_SIZE:
+                    if len(persisting_buffer) >= BATCH_SIZE:
                         logger.info(
                             "Batch size reached. Pulled {count} responses from the persisting queue.",
                             count=len(persisting_buffer),
@@ -86,9 +104,61 @@ class Persister:
                     connection,
                 )
 
+            self._persist_expired_flags_in_batches(connection)
+
+    def _persist_expired_flags_in_batches(self, connection: RabbitConnection) -> None:
+        """
+        Marks flags dead-lettered to the expired queue as expired in the database.
+        """
+        expired_queue = RabbitQueue(
+            connection.channel,
+            "expired_queue",
+            durable=True,
+            silent=True,
+        )
+
+        while True:
+            expired_flags: list[str] = []
+            last_delivery_tag = 0
+
+            while len(expired_flags) < BATCH_SIZE:
+                method, properties, body = expired_queue.get()
+                if method is None:
+                    break
+
+                expired_flags.extend(unpack(body, properties.headers))
+                last_delivery_tag = method.delivery_tag
+
+            if not expired_flags:
+                break
+
+            with self.db.begin():
+                updated_count = (
+                    self.db.query(Flag)
+                    .filter(Flag.value.in_(expired_flags), Flag.status == "queued")
+                    .update({Flag.status: "expired"}, synchronize_session=False)
+                )
+
+            connection.ack(last_delivery_tag, multiple=True)
+
+            logger.info(
+                "Marked {count} flags as <yellow>expired</>.", count=updated_count
+            )
+
+            emitter.emit(
+                "flags",
+                FlagCounterDelta(
+                    queued=-updated_count,
+                    discarded=0,
+                    accepted=0,
+                    rejected=0,
+                    expired=updated_count,
+                ).model_dump_json(exclude_unset=True),
+            )
+
     def _persist_responses(
         self,
-        persisting_buffer: list[FlagSubmissionResponse],
+        persisting_buffer: list[FlagVerdict],
         delivery_tag_map: dict[str, int],
         connection: RabbitConnection,
     ) -> None:
@@ -130,6 +200,15 @@ class Persister:
 
         connection.ack(max(delivery_tag_map.values()), multiple=True)
 
+        persisted_at = time.time()
+        for verdict in persisting_buffer:
+            if verdict.metadata.enqueued_at is not None:
+                latency_tracker.observe(
+                    verdict.metadata.exploit,
+                    persisted_at - verdict.metadata.enqueued_at,
+                )
+        latency_tracker.report_if_due()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,67 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by all submission lanes. Tokens are refilled
+    continuously at `rate` tokens per second, up to `capacity` tokens.
+
+    Acquiring more tokens than currently available puts the bucket into debt, and
+    the caller waits until the debt is paid off. This keeps the average rate within
+    the limit even when a single batch is larger than the bucket capacity.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate: float = rate
+        self.capacity: float = capacity
+
+        self._tokens: float = capacity
+        self._updated_at: float = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        Takes the given number of tokens from the bucket, blocking until they are available.
+
+        :param tokens: Number of tokens to take, defaults to 1.
+        :type tokens: float, optional
+        :return: Number of seconds spent waiting.
+        :rtype: float
+        """
+        delay = self._reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    async def acquire_async(self, tokens: float = 1) -> float:
+        """
+        Takes the given number of tokens from the bucket without blocking the event loop.
+
+        :param tokens: Number of tokens to take, defaults to 1.
+        :type tokens: float, optional
+        :return: Number of seconds spent waiting.
+        :rtype: float
+        """
+        delay = self._reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    def _reserve(self, tokens: float) -> float:
+        """
+        Reserves tokens and returns how long the caller has to wait before using them.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity,
+                self._tokens + (now - self._updated_at) * self.rate,
+            )
+            self._updated_at = now
+            self._tokens -= tokens
+
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
@@ -1,39 +1,141 @@
+import asyncio
+import inspect
+import math
 import os
 import sys
+import threading
+import time
 from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from importlib import import_module, reload
+from importlib.util import find_spec, module_from_spec
+from types import ModuleType
 
 from apscheduler.schedulers.blocking import BlockingScheduler
 from avala_shared.logs import logger
+from pika import BasicProperties
 
 from ..broadcast import emitter
 from ..config import config
-from ..mq.rabbit import RabbitConnection, RabbitQueue
+from ..mq.envelopes import pack, strip_envelope_headers, unpack
+from ..mq.metadata import metadata_from_headers
+from ..mq.queues import (
+    get_flag_priority,
+    get_planted_at,
+    get_submission_queue_arguments,
+)
+from ..mq.rabbit import RabbitConnection, RabbitQueue, ThreadsafeConnection
+from ..mq.retry import (
+    ATTEMPTS_HEADER,
+    flag_expires_within,
+    get_retry_delay,
+    get_retry_queue_arguments,
+    get_retry_queue_name,
+)
 from ..scheduler import (
     game_has_started,
     get_next_tick_start,
     get_tick_elapsed,
 )
-from ..schemas import FlagCounterDelta, FlagSubmissionResponse
+from ..schemas import (
+    FlagCounterDelta,
+    FlagMetadata,
+    FlagSubmissionResponse,
+    FlagVerdict,
+    SubmitterBatchStats,
+)
+from .batching import AdaptiveBatchSize, get_batch_size
+from .latency import LatencyTracker
+from .rate_limit import TokenBucket
+
+# Shared by all submission lanes.
+latency_tracker = LatencyTracker("Enqueue-to-verdict latency")
 
 
 def main():
     emitter.connect()
-    worker = Submitter()
-    worker.start()
+
+    rate_limiter = create_rate_limiter()
+    batching = create_batching()
+
+    try:
+        user_module = import_user_module()
+    except Exception:
+        user_module = None  # Reported by the submitter during initialization.
+
+    submit = getattr(user_module, "submit", None)
+    if submit and (
+        config.queue.backend == "postgres" or inspect.iscoroutinefunction(submit)
+    ):
+        from ..mq.postgres import PostgresConnection
+        from .async_submitter import AsyncSubmitter
+
+        connection = (
+            PostgresConnection() if config.queue.backend == "postgres" else None
+        )
+        asyncio.run(
+            AsyncSubmitter(user_module, rate_limiter, batching, connection).start()
+        )
+        return
+
+    lanes = [
+        Submitter(lane=lane, rate_limiter=rate_limiter, batching=batching)
+        for lane in range(config.submitter.workers)
+    ]
+    if len(lanes) == 1:
+        lanes[0].start()
+        return
+
+    threads = [
+        threading.Thread(
+            target=worker.start,
+            name="submission-lane-%d" % worker.lane,
+            daemon=True,
+        )
+        for worker in lanes
+    ]
+    for thread in threads:
+        thread.start()
+
+    logger.info("Started <b>{count}</> submission lanes.", count=len(threads))
+
+    for thread in threads:
+        thread.join()
 
 
 class Submitter:
-    def __init__(self) -> None:
+    """
+    Consumes flags from the submission queue and submits them using the user module.
+
+    The user's submit function runs on a dedicated thread of the lane, so a slow flag
+    checker never blocks the thread running the RabbitMQ connection and heartbeats
+    keep flowing. Acks, rejects and publishes made while submitting are marshalled
+    back to the connection's thread.
+    """
+
+    def __init__(
+        self,
+        lane: int = 0,
+        rate_limiter: TokenBucket | None = None,
+        batching: AdaptiveBatchSize | None = None,
+    ) -> None:
+        self.lane = lane
+        self.rate_limiter = rate_limiter
+        self.batching = batching
+
         self.scheduler: BlockingScheduler
         self.connection: RabbitConnection
+        self.threadsafe_connection: ThreadsafeConnection
+
+        # A single thread keeps submissions of a lane in order.
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="submission-lane-%d-submit" % lane
+        )
+        self.failure: BaseException | None = None
 
         self.submission_buffer: list[str]
         self.delivery_tag_map: dict[str, int]
-
-        self.submission_queue: RabbitQueue
-        self.persisting_queue: RabbitQueue
+        self.properties_map: dict[int, BasicProperties]
 
         self.ready = False
         self._initialize()
@@ -43,7 +145,7 @@ class Submitter:
         TODO: Docstrings
         """
         try:
-            self.submit = self._import_user_function("submit")
+            user_module = import_user_module()
         except Exception as e:
             logger.error(
                 "Unable to load module <b>{module}</>: {error}",
@@ -52,6 +154,7 @@ class Submitter:
             )
             return
 
+        self.submit = getattr(user_module, "submit", None)
         if self.submit is None:
             logger.error(
                 "Required function not found within <b>{module}.py</>. Please make sure the module contains <b>submit</> function.",
@@ -59,11 +162,11 @@ class Submitter:
             )
             return
 
-        self.prepare = self._import_user_function("prepare")
-        self.cleanup = self._import_user_function("cleanup")
+        self.prepare = getattr(user_module, "prepare", None)
+        self.cleanup = getattr(user_module, "cleanup", None)
 
         if config.submitter.per_tick or config.submitter.interval:
-            interval, next_run_time = self._calculate_next_run_time()
+            interval, next_run_time = calculate_next_run_time()
 
             self.scheduler = BlockingScheduler()
             self.scheduler.add_job(
@@ -73,9 +176,10 @@ class Submitter:
                 id="submitter",
                 next_run_time=next_run_time,
             )
-        elif config.submitter.batch_size:
+        elif config.submitter.batch_size or config.submitter.streams:
             self.submission_buffer = []
             self.delivery_tag_map = {}
+            self.properties_map = {}
 
             self.connection = RabbitConnection()
             try:
@@ -87,98 +191,110 @@ class Submitter:
                 )
                 return
 
-            self.submission_queue = RabbitQueue(
-                self.connection.channel, "submission_queue", durable=True
-            )
-            self.persisting_queue = RabbitQueue(
-                self.connection.channel, "persisting_queue", durable=True
-            )
-
-            self.submission_queue.add_consumer(self._submit_flags_in_batches_consumer)
-        elif config.submitter.streams:
-            self.connection = RabbitConnection()
-            try:
-                self.connection.connect()
-            except Exception as e:
-                logger.error(
-                    "Failed to connect to RabbitMQ: {error}",
-                    error=e,
-                )
-                return
+            self._declare_queues(self.connection)
+            self.threadsafe_connection = ThreadsafeConnection(self.connection)
+            submission_queue = self.connection.get_queue("submission_queue")
 
-            self.submission_queue = RabbitQueue(
-                self.connection.channel, "submission_queue", durable=True
-            )
-            self.persisting_queue = RabbitQueue(
-                self.connection.channel, "persisting_queue", durable=True
-            )
+            # Without a prefetch limit, the first consumer would receive the whole
+            # backlog, leaving nothing for other lanes and submitter replicas.
+            self.connection.set_prefetch(config.submitter.prefetch_count)
 
-            self.submission_queue.add_consumer(self._submit_flags_in_stream_consumer)
+            if config.submitter.batch_size:
+                submission_queue.add_consumer(self._submit_flags_in_batches_consumer)
+                self.connection.call_later(
+                    config.submitter.flush_interval, self._flush_submission_buffer
+                )
+            else:
+                submission_queue.add_consumer(self._submit_flags_in_stream_consumer)
 
         self.ready = True
 
     def start(self):
         if not self.ready:
             return
-        if config.submitter.per_tick or config.submitter.interval:
-            self.scheduler.start()
-        elif config.submitter.batch_size:
-            self.connection.start_consuming()
-        elif config.submitter.streams:
-            if self.prepare:
-                self.prepare()
-            self.connection.start_consuming()
+
+        # Every lane holds its own copy of the user module, so each lane gets
+        # its own connection to the flag checker.
+        if self.prepare:
+            self.prepare()
+
+        try:
+            if config.submitter.per_tick or config.submitter.interval:
+                self.scheduler.start()
+            elif config.submitter.batch_size or config.submitter.streams:
+                self.connection.start_consuming()
+        finally:
+            self.executor.shutdown(wait=True, cancel_futures=True)
             if self.cleanup:
                 self.cleanup()
 
+        if self.failure:
+            raise self.failure
+
     def _submit_flags_in_batches_consumer(self, ch, method, properties, body):
         """TODO docstring"""
-        flag = body.decode().strip()
-
-        self.submission_buffer.append(flag)
-        self.delivery_tag_map[flag] = method.delivery_tag
+        flags = self._buffer_message(
+            method.delivery_tag,
+            properties,
+            body,
+            self.submission_buffer,
+            self.delivery_tag_map,
+            self.properties_map,
+            self.connection,
+        )
 
         logger.debug(
-            "Received flag <b>{flag}</> ({count} flags in buffer)",
-            flag=flag,
-            count=len(self.submission_buffer),
+            "Received <b>{count}</> flags ({total} flags in buffer)",
+            count=len(flags),
+            total=len(self.submission_buffer),
         )
 
-        if len(self.submission_buffer) < config.submitter.batch_size:
+        if len(self.submission_buffer) < get_batch_size(self.batching):
             return  # Skip submission if batch size not reached
 
-        self._submit_flags_from_buffer(
+        self._submit_buffered_flags()
+
+    def _flush_submission_buffer(self):
+        """
+        Submits buffered flags even if the batch size is not reached, so flags don't
+        wait in the buffer when the queue runs dry. Reschedules itself.
+        """
+        if self.submission_buffer:
+            logger.info(
+                "Flushing {count} buffered flags.", count=len(self.submission_buffer)
+            )
+            self._submit_buffered_flags()
+
+        self.connection.call_later(
+            config.submitter.flush_interval, self._flush_submission_buffer
+        )
+
+    def _submit_buffered_flags(self):
+        self._submit_in_background(
+            self._submit_flags_from_buffer,
             self.submission_buffer,
             self.delivery_tag_map,
-            self.persisting_queue,
-            self.connection,
+            self.properties_map,
+            self.threadsafe_connection,
         )
 
-        self.submission_buffer.clear()
-        self.delivery_tag_map.clear()
+        self.submission_buffer = []
+        self.delivery_tag_map = {}
+        self.properties_map = {}
 
     def _submit_flags_scheduled_job(self):
         try:
             connection = RabbitConnection(silent=True)
             with connection:
-                submission_queue = RabbitQueue(
-                    connection.channel,
-                    "submission_queue",
-                    durable=True,
-                    silent=True,
-                )
-
-                persisting_queue = RabbitQueue(
-                    connection.channel,
-                    "persisting_queue",
-                    durable=True,
-                    silent=True,
-                )
+                self._declare_queues(connection, silent=True)
+                submission_queue = connection.get_queue("submission_queue")
 
                 while True:
-                    submission_buffer = []
-                    delivery_tag_map = {}
-                    while len(submission_buffer) < config.submitter.max_batch_size:
+                    submission_buffer: list[str] = []
+                    delivery_tag_map: dict[str, int] = {}
+                    properties_map: dict[int, BasicProperties] = {}
+                    batch_size = get_batch_size(self.batching)
+                    while len(submission_buffer) < batch_size:
                         method, properties, body = submission_queue.get()
                         if method is None:
                             if submission_buffer:
@@ -192,11 +308,17 @@ class Submitter:
                                 )
                             break
 
-                        flag = body.decode().strip()
-                        submission_buffer.append(flag)
-                        delivery_tag_map[flag] = method.delivery_tag
-
-                        if len(submission_buffer) == config.submitter.max_batch_size:
+                        self._buffer_message(
+                            method.delivery_tag,
+                            properties,
+                            body,
+                            submission_buffer,
+                            delivery_tag_map,
+                            properties_map,
+                            connection,
+                        )
+
+                        if len(submission_buffer) >= batch_size:
                             logger.info(
                                 "Batch size reached. Pulled {count} flags from the submission queue.",
                                 count=len(submission_buffer),
@@ -206,70 +328,132 @@ class Submitter:
                     if not submission_buffer:
                         break
 
-                    self._submit_flags_from_buffer(
+                    # Keep processing heartbeats and scheduled acks of the job's own
+                    # connection while the flags are being submitted.
+                    future = self.executor.submit(
+                        self._submit_flags_from_buffer,
                         submission_buffer,
                         delivery_tag_map,
-                        persisting_queue,
-                        connection,
+                        properties_map,
+                        ThreadsafeConnection(connection),
                     )
+                    connection.process_data_events_until(future)
+                    future.result()
         except Exception as e:
             logger.error(
                 "Failed to connect to RabbitMQ: {error}",
                 error=e,
             )
 
-    def _submit_flags_from_buffer(
+    def _buffer_message(
         self,
+        delivery_tag: int,
+        properties: BasicProperties,
+        body: bytes,
         submission_buffer: list[str],
         delivery_tag_map: dict[str, int],
-        persisting_queue: RabbitQueue,
+        properties_map: dict[int, BasicProperties],
         connection: RabbitConnection,
+    ) -> list[str]:
+        """
+        Unpacks flags from a received message into the submission buffer. Messages
+        whose flags are too old to be accepted are dropped right away.
+
+        :return: Flags added to the buffer.
+        :rtype: list[str]
+        """
+        if flag_expires_within(properties.timestamp):
+            self._drop_expired_message(delivery_tag, connection)
+            return []
+
+        flags = unpack(body, properties.headers)
+        for flag in flags:
+            submission_buffer.append(flag)
+            delivery_tag_map[flag] = delivery_tag
+        properties_map[delivery_tag] = properties
+
+        return flags
+
+    def _submit_flags_from_buffer(
+        self,
+        submission_buffer: list[str],
+        delivery_tag_map: dict[str, int],
+        properties_map: dict[int, BasicProperties],
+        connection: ThreadsafeConnection,
     ):
         """
-        Submits flags from the submission buffer.
+        Submits flags from the submission buffer. Requeued flags and flags missing
+        from the response are sent to a delay queue to be retried later. Messages
+        are acknowledged once all of their flags are persisted or sent for retry.
         """
         if not submission_buffer:
             logger.info("No flags in buffer. Submission skipped.")
             return
 
-        logger.info("Submitting <b>{count}</> flags...", count=len(submission_buffer))
-
+        responses: list[FlagSubmissionResponse] = []
         response_statuses: list[str] = []
-        dropped_flags: set[str] = set(submission_buffer)
-
-        for response_tuple in self.submit(submission_buffer):
-            response = FlagSubmissionResponse.from_tuple(response_tuple)
-            if response.status != "requeued":
-                connection.ack(delivery_tag_map[response.value])
-                persisting_queue.put(response.model_dump_json())
-                dropped_flags.discard(response.value)
 
-            response_statuses.append(response.status)
+        # Envelopes may fill the buffer past the batch size, and the adaptive batch
+        # size may shrink in the meantime, so flags are submitted in multiple
+        # batches if needed.
+        i = 0
+        while i < len(submission_buffer):
+            batch_size = min(get_batch_size(self.batching), len(submission_buffer) - i)
+            batch = submission_buffer[i : i + int(batch_size)]
+            i += len(batch)
 
-        for flag in dropped_flags:
-            connection.reject(delivery_tag_map[flag], requeue=True)
+            self._wait_for_rate_limit(len(batch))
+            logger.info("Submitting <b>{count}</> flags...", count=len(batch))
 
-        stats = Counter(response_statuses)
-        logger.info(
-            "<green>{accepted} accepted</green>, <red>{rejected} rejected</red>, <blue>{requeued} requeued</blue>",
-            accepted=stats["accepted"],
-            rejected=stats["rejected"],
-            requeued=stats["requeued"],
+            started_at = time.monotonic()
+            try:
+                response_tuples = self.submit(batch)
+            except Exception as e:
+                # The flags are left unresolved, so they are sent for retry below.
+                logger.error(
+                    "Failed to submit {count} flags, requeueing them: {error}",
+                    count=len(batch),
+                    error=e,
+                )
+                if self.batching:
+                    self.batching.record_failure()
+                continue
+            latency = time.monotonic() - started_at
+
+            batch_statuses: list[str] = []
+            for response_tuple in response_tuples:
+                response = FlagSubmissionResponse.from_tuple(response_tuple)
+                if response.status != "requeued":
+                    responses.append(response)
+                batch_statuses.append(response.status)
+
+            response_statuses.extend(batch_statuses)
+            record_batch(self.lane, self.batching, len(batch), batch_statuses, latency)
+
+        metadata = {
+            delivery_tag: metadata_from_headers(properties.headers)
+            for delivery_tag, properties in properties_map.items()
+        }
+        self._persist_responses(
+            responses,
+            {flag: metadata[tag] for flag, tag in delivery_tag_map.items()},
+            connection,
         )
 
-        emitter.emit(
-            "flags",
-            FlagCounterDelta(
-                queued=(stats["accepted"] + stats["rejected"]) * -1,
-                discarded=0,
-                accepted=stats["accepted"],
-                rejected=stats["rejected"],
-            ).model_dump_json(exclude_unset=True),
+        resolved_flags = {response.value for response in responses}
+        self._settle_messages(
+            [flag for flag in submission_buffer if flag not in resolved_flags],
+            delivery_tag_map,
+            properties_map,
+            connection,
         )
 
+        emit_submission_stats(response_statuses)
+
     def _submit_flag_or_exit(self, flag: str):
         attempts = 10
         while attempts:
+            self._wait_for_rate_limit(1)
             try:
                 return self.submit(flag)
             except Exception:
@@ -286,19 +470,51 @@ class Submitter:
         exit(1)
 
     def _submit_flags_in_stream_consumer(self, ch, method, properties, body):
-        flag = body.decode().strip()
-        logger.debug("Received flag <b>{flag}</>", flag=flag)
+        self._submit_in_background(
+            self._submit_flags_from_stream,
+            method.delivery_tag,
+            properties,
+            body,
+            self.threadsafe_connection,
+        )
 
-        response_tuple = self._submit_flag_or_exit(flag)
-        if not response_tuple:
-            logger.debug("<blue>Requeued</blue> {flag}", flag=flag)
-            ch.basic_reject(delivery_tag=method.delivery_tag, requeue=True)
+    def _submit_flags_from_stream(
+        self,
+        delivery_tag: int,
+        properties: BasicProperties,
+        body: bytes,
+        connection: ThreadsafeConnection,
+    ):
+        """
+        Submits flags of a single message one by one. Expiry is checked here rather
+        than on receipt, since the message may wait behind earlier ones.
+        """
+        if flag_expires_within(properties.timestamp):
+            self._drop_expired_message(delivery_tag, connection)
             return
 
-        response = FlagSubmissionResponse.from_tuple(response_tuple)
-        if response.status != "requeued":
-            ch.basic_ack(delivery_tag=method.delivery_tag)
-            self.persisting_queue.put(response.model_dump_json())
+        flags = unpack(body, properties.headers)
+        responses: list[FlagSubmissionResponse] = []
+        requeued_flags: list[str] = []
+
+        for flag in flags:
+            logger.debug("Received flag <b>{flag}</>", flag=flag)
+
+            response_tuple = self._submit_flag_or_exit(flag)
+            if not response_tuple:
+                logger.debug("<blue>Requeued</blue> {flag}", flag=flag)
+                requeued_flags.append(flag)
+                continue
+
+            response = FlagSubmissionResponse.from_tuple(response_tuple)
+            if response.status == "requeued":
+                logger.debug(
+                    "<blue>Requeued</blue> {response}", response=response.response
+                )
+                requeued_flags.append(flag)
+                continue
+
+            responses.append(response)
             logger.debug(
                 (
                     "<green>Accepted</green> {response}"
@@ -308,60 +524,384 @@ class Submitter:
                 response=response.response,
             )
 
+        metadata = metadata_from_headers(properties.headers)
+        self._persist_responses(
+            responses, {flag: metadata for flag in flags}, connection
+        )
+        self._settle_messages(
+            requeued_flags,
+            {flag: delivery_tag for flag in flags},
+            {delivery_tag: properties},
+            connection,
+        )
+
+        if responses:
+            accepted = sum(response.status == "accepted" for response in responses)
             emitter.emit(
                 "flags",
                 FlagCounterDelta(
-                    queued=-1,
+                    queued=-len(responses),
                     discarded=0,
-                    accepted=1 if response.status == "accepted" else 0,
-                    rejected=1 if response.status == "rejected" else 0,
+                    accepted=accepted,
+                    rejected=len(responses) - accepted,
                 ).model_dump_json(exclude_unset=True),
             )
+
+    def _declare_queues(self, connection: RabbitConnection, silent: bool = False):
+        """
+        Declares queues used by the submitter and registers them on the connection,
+        including a delay queue for each configured retry delay.
+        """
+        connection.add_queue(
+            RabbitQueue(
+                connection.channel,
+                "submission_queue",
+                durable=True,
+                arguments=get_submission_queue_arguments(),
+                silent=silent,
+            )
+        )
+        connection.add_queue(
+            RabbitQueue(
+                connection.channel,
+                "persisting_queue",
+                durable=True,
+                silent=silent,
+            )
+        )
+        connection.add_queue(
+            RabbitQueue(
+                connection.channel,
+                "expired_queue",
+                durable=True,
+                silent=silent,
+            )
+        )
+        for delay in set(config.submitter.retry_delays):
+            connection.add_queue(
+                RabbitQueue(
+                    connection.channel,
+                    get_retry_queue_name(delay),
+                    durable=True,
+                    arguments=get_retry_queue_arguments(delay),
+                    silent=silent,
+                )
+            )
+
+    def _persist_responses(
+        self,
+        responses: list[FlagSubmissionResponse],
+        metadata: dict[str, FlagMetadata],
+        connection: ThreadsafeConnection,
+    ):
+        """
+        Publishes flag verdicts to the persisting queue, packed into a single
+        envelope if envelopes are enabled. Metadata is carried in the body of each
+        verdict, since an envelope may hold flags from different messages.
+        """
+        if not responses:
+            return
+
+        persisting_queue = connection.get_queue("persisting_queue")
+        serialized = [
+            verdict.model_dump_json() for verdict in build_verdicts(responses, metadata)
+        ]
+
+        if config.rabbitmq.envelopes:
+            body, headers = pack(serialized)
+            persisting_queue.put(body, headers=headers)
         else:
-            logger.debug("<blue>Requeued</blue> {response}", response=response.response)
-            ch.basic_reject(delivery_tag=method.delivery_tag, requeue=True)
+            for message in serialized:
+                persisting_queue.put(message)
+
+    def _settle_messages(
+        self,
+        requeued_flags: list[str],
+        delivery_tag_map: dict[str, int],
+        properties_map: dict[int, BasicProperties],
+        connection: ThreadsafeConnection,
+    ):
+        """
+        Sends requeued flags for retry, grouped by the message they arrived in, and
+        acknowledges all messages in the buffer.
+        """
+        requeued_by_message: dict[int, list[str]] = {}
+        for flag in requeued_flags:
+            requeued_by_message.setdefault(delivery_tag_map[flag], []).append(flag)
+
+        for delivery_tag, properties in properties_map.items():
+            if delivery_tag in requeued_by_message:
+                self._retry_flags(
+                    requeued_by_message[delivery_tag], properties, connection
+                )
+            connection.ack(delivery_tag)
+
+    def _retry_flags(
+        self,
+        flags: list[str],
+        properties: BasicProperties,
+        connection: ThreadsafeConnection,
+    ):
+        """
+        Moves flags to the delay queue of their next retry attempt. The flags return to
+        the submission queue once the delay runs out. Flags that would expire while
+        waiting are sent to the expired queue instead.
+        """
+        headers = strip_envelope_headers(properties.headers)
+        attempt = headers.get(ATTEMPTS_HEADER, 0) + 1
+        delay = get_retry_delay(attempt)
 
-    def _import_user_function(self, function_name: str):
-        """Imports and reloads user written functions used for the actual flag submission."""
-        module_name = (
-            config.submitter.module if config.submitter.module else "submitter"
+        body, envelope_headers = pack(flags)
+        headers.update(envelope_headers or {})
+
+        if flag_expires_within(properties.timestamp, delay):
+            connection.get_queue("expired_queue").put(body, headers=headers)
+            logger.debug("Dropped {count} expired flags.", count=len(flags))
+            return
+
+        headers[ATTEMPTS_HEADER] = attempt
+        connection.get_queue(get_retry_queue_name(delay)).put(
+            body,
+            headers=headers,
+            timestamp=properties.timestamp,
+            priority=get_flag_priority(get_planted_at(headers, properties.timestamp)),
         )
 
-        cwd = os.getcwd()
-        if cwd not in sys.path:
-            sys.path.append(cwd)
+        logger.debug(
+            "Retrying {count} flags in {delay}s (attempt {attempt}).",
+            count=len(flags),
+            delay=delay,
+            attempt=attempt,
+        )
 
-        imported_module = reload(import_module(module_name))
-        return getattr(imported_module, function_name, None)
+    def _drop_expired_message(
+        self,
+        delivery_tag: int,
+        connection: RabbitConnection | ThreadsafeConnection,
+    ):
+        """
+        Drops a message with flags too old to be accepted by the flag checker. Rejected
+        messages are dead-lettered to the expired queue, where the persister picks them up.
+        """
+        connection.reject(delivery_tag)
+        logger.debug("Dropped expired message {tag}.", tag=delivery_tag)
 
-    def _calculate_next_run_time(self) -> tuple[timedelta, datetime]:
-        now = datetime.now()
-        tick_duration = config.game.tick_duration
-        next_tick_start = get_next_tick_start(now)
+    def _submit_in_background(self, func, *args):
+        """
+        Runs a submission on the lane's submission thread, so the consumer callback
+        returns right away and the connection keeps processing heartbeats.
+        """
+        future = self.executor.submit(func, *args)
+        future.add_done_callback(self._on_submission_done)
 
-        interval: timedelta
+    def _on_submission_done(self, future: Future):
+        """
+        Stops consuming if a submission failed. Unacknowledged messages are then
+        redelivered by RabbitMQ.
+        """
+        if future.cancelled() or future.exception() is None:
+            return
 
-        if config.submitter.per_tick:
-            interval = tick_duration / (config.submitter.per_tick - 1)
-        elif config.submitter.interval:
-            interval = timedelta(seconds=config.submitter.interval)
-        else:
-            raise ValueError(
-                "Either config.submitter.per_tick or config.submitter.interval have to be set."
-            )
+        self.failure = future.exception()
+        if not isinstance(self.failure, SystemExit):
+            logger.error("Failed to submit flags: {error}", error=self.failure)
+        self.connection.stop_consuming_threadsafe()
 
-        if game_has_started():
-            tick_elapsed = get_tick_elapsed(now)
+    def _wait_for_rate_limit(self, flag_count: int):
+        """
+        Blocks until the shared rate limiter allows submitting the given number of flags.
+        """
+        rate_limit = config.submitter.rate_limit
+        if not self.rate_limiter or rate_limit is None:
+            return
 
-            next_run_time = (
-                next_tick_start
-                - tick_duration
-                + (tick_elapsed // interval + 1) * interval
+        tokens = flag_count if rate_limit.unit == "flags" else 1
+        waited = self.rate_limiter.acquire(tokens)
+        if waited:
+            logger.debug(
+                "Lane {lane} waited {waited:.2f}s for the rate limit.",
+                lane=self.lane,
+                waited=waited,
             )
-        else:
-            next_run_time = config.game.game_starts_at + interval
 
-        return interval, next_run_time
+
+def create_rate_limiter() -> TokenBucket | None:
+    """
+    Creates the rate limiter shared by all submission lanes, if a rate limit is set.
+    """
+    if not config.submitter.rate_limit:
+        return None
+
+    return TokenBucket(
+        rate=config.submitter.rate_limit.rate,
+        capacity=config.submitter.rate_limit.capacity,
+    )
+
+
+def create_batching() -> AdaptiveBatchSize | None:
+    """
+    Creates the adaptive batch size shared by all submission lanes, if enabled.
+    """
+    if not config.submitter.adaptive_batching:
+        return None
+
+    return AdaptiveBatchSize(
+        config.submitter.adaptive_batching,
+        initial_size=get_batch_size(None),
+    )
+
+
+def import_user_module() -> ModuleType:
+    """
+    Imports a fresh copy of the user written module used for the actual flag submission.
+    Each submission lane gets its own copy, so module-level state such as an open
+    connection to the flag checker is not shared between lanes.
+    """
+    module_name = config.submitter.module if config.submitter.module else "submitter"
+
+    cwd = os.getcwd()
+    if cwd not in sys.path:
+        sys.path.append(cwd)
+
+    spec = find_spec(module_name)
+    if spec is None or spec.loader is None:
+        raise ModuleNotFoundError("No module named '%s'" % module_name)
+
+    imported_module = module_from_spec(spec)
+    spec.loader.exec_module(imported_module)
+    return imported_module
+
+
+def calculate_next_run_time() -> tuple[timedelta, datetime]:
+    now = datetime.now()
+    tick_duration = config.game.tick_duration
+    next_tick_start = get_next_tick_start(now)
+
+    interval: timedelta
+
+    if config.submitter.per_tick:
+        interval = tick_duration / (config.submitter.per_tick - 1)
+    elif config.submitter.interval:
+        interval = timedelta(seconds=config.submitter.interval)
+    else:
+        raise ValueError(
+            "Either config.submitter.per_tick or config.submitter.interval have to be set."
+        )
+
+    if game_has_started():
+        tick_elapsed = get_tick_elapsed(now)
+
+        next_run_time = (
+            next_tick_start - tick_duration + (tick_elapsed // interval + 1) * interval
+        )
+    else:
+        next_run_time = config.game.game_starts_at + interval
+
+    return interval, next_run_time
+
+
+def build_verdicts(
+    responses: list[FlagSubmissionResponse],
+    metadata: dict[str, FlagMetadata],
+) -> list[FlagVerdict]:
+    """
+    Attaches metadata of the submitted flags to their responses and records the
+    enqueue-to-verdict latency of each flag.
+
+    :param responses: Responses returned by the submit function.
+    :type responses: list[FlagSubmissionResponse]
+    :param metadata: Metadata of the submitted flags, read from message headers.
+    :type metadata: dict[str, FlagMetadata]
+    :return: Verdicts to publish to the persisting queue.
+    :rtype: list[FlagVerdict]
+    """
+    verdict_at = time.time()
+    verdicts = [
+        FlagVerdict.from_response(
+            response, metadata.get(response.value, FlagMetadata()), verdict_at
+        )
+        for response in responses
+    ]
+
+    for verdict in verdicts:
+        latency_tracker.observe(verdict.metadata.exploit, verdict.latency)
+    latency_tracker.report_if_due()
+
+    return verdicts
+
+
+def record_batch(
+    lane: int,
+    batching: AdaptiveBatchSize | None,
+    flag_count: int,
+    response_statuses: list[str],
+    latency: float,
+):
+    """
+    Feeds the outcome of a submitted batch to the adaptive batch size, if enabled,
+    and emits the batch stats along with the batch size chosen for the next batch.
+
+    :param lane: Submission lane that submitted the batch.
+    :type lane: int
+    :param batching: Adaptive batch size, or None if batch size is static.
+    :type batching: AdaptiveBatchSize | None
+    :param flag_count: Number of flags in the batch.
+    :type flag_count: int
+    :param response_statuses: Statuses of responses returned for the batch.
+    :type response_statuses: list[str]
+    :param latency: Duration of the submit call in seconds.
+    :type latency: float
+    """
+    stats = Counter(response_statuses)
+    # Flags missing from the response are retried just like requeued ones.
+    requeued = flag_count - stats["accepted"] - stats["rejected"]
+
+    if batching:
+        batching.record(flag_count, latency, requeued)
+
+    batch_size = get_batch_size(batching)
+    logger.debug(
+        "Submitted {count} flags in {latency:.2f}s. Next batch size is <b>{size}</>.",
+        count=flag_count,
+        latency=latency,
+        size=batch_size,
+    )
+
+    emitter.emit(
+        "submitter",
+        SubmitterBatchStats(
+            lane=lane,
+            batch_size=None if math.isinf(batch_size) else int(batch_size),
+            flags=flag_count,
+            latency=latency,
+            accepted=stats["accepted"],
+            rejected=stats["rejected"],
+            requeued=requeued,
+        ).model_dump_json(),
+    )
+
+
+def emit_submission_stats(response_statuses: list[str]):
+    """
+    Logs the outcome of a submitted batch and emits the flag counter deltas.
+    """
+    stats = Counter(response_statuses)
+    logger.info(
+        "<green>{accepted} accepted</green>, <red>{rejected} rejected</red>, <blue>{requeued} requeued</blue>",
+        accepted=stats["accepted"],
+        rejected=stats["rejected"],
+        requeued=stats["requeued"],
+    )
+
+    emitter.emit(
+        "flags",
+        FlagCounterDelta(
+            queued=(stats["accepted"] + stats["rejected"]) * -1,
+            discarded=0,
+            accepted=stats["accepted"],
+            rejected=stats["rejected"],
+        ).model_dump_json(exclude_unset=True),
+    )
 
 
 if __name__ == "__main__":
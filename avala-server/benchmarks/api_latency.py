@@ -0,0 +1,169 @@
+"""
+Load-tests a running Avala server with mixed traffic: exploits enqueueing flags while
+dashboards poll statistics and users run searches, the way the API is used during
+a game.
+
+Reports throughput and latency percentiles of enqueue and dashboard requests. Run it
+from a workspace containing server.yaml, against the server before and after a
+change, and compare p99 latency of both kinds of requests:
+
+    python benchmarks/api_latency.py --duration 60 --exploits 50 --dashboards 20
+    python benchmarks/api_latency.py --url http://10.10.0.2:2024 --password hunter2
+"""
+
+import argparse
+import random
+import string
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from avala.config import config
+
+DASHBOARD_PATHS = [
+    "/stats/dashboard",
+    "/stats/database",
+    "/stats/timeline",
+    "/stats/exploits",
+    "/flags/search?query=tick%20%3E%3D%20-1&page=1&show=25",
+    "/flags/search?query=status%20is%20accepted&page=2&show=25&sort=timestamp%20desc",
+]
+
+
+class Recorder:
+    """
+    Collects latencies of requests made by all virtual users, grouped by kind.
+    """
+
+    def __init__(self) -> None:
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, latency: float, ok: bool):
+        with self._lock:
+            self.latencies[kind].append(latency)
+            if not ok:
+                self.errors[kind] += 1
+
+
+def random_flag() -> str:
+    return "FLAG{%s}" % "".join(random.choices(string.ascii_letters, k=32))
+
+
+def request(session: requests.Session, recorder: Recorder, kind: str, **kwargs):
+    started_at = time.perf_counter()
+    try:
+        ok = session.request(timeout=30, **kwargs).ok
+    except requests.RequestException:
+        ok = False
+    recorder.record(kind, time.perf_counter() - started_at, ok)
+
+
+def exploit_user(
+    url: str, auth: tuple[str, str], recorder: Recorder, deadline: float, flags: int
+):
+    """
+    Enqueues batches of new flags back to back, like an exploit running against
+    many targets.
+    """
+    with requests.Session() as session:
+        session.auth = auth
+        while time.time() < deadline:
+            request(
+                session,
+                recorder,
+                "enqueue",
+                method="POST",
+                url=url + "/flags/queue",
+                json={
+                    "values": [random_flag() for _ in range(flags)],
+                    "exploit": "load_test",
+                    "target": "10.10.%d.%d"
+                    % (random.randint(0, 255), random.randint(1, 254)),
+                },
+            )
+
+
+def dashboard_user(
+    url: str,
+    auth: tuple[str, str],
+    recorder: Recorder,
+    deadline: float,
+    interval: float,
+):
+    """
+    Polls statistics and runs searches like an open dashboard.
+    """
+    with requests.Session() as session:
+        session.auth = auth
+        while time.time() < deadline:
+            request(
+                session,
+                recorder,
+                "dashboard",
+                method="GET",
+                url=url + random.choice(DASHBOARD_PATHS),
+            )
+            time.sleep(random.uniform(0, 2 * interval))
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:%d" % config.server.port)
+    parser.add_argument("--password", default=config.server.password or "")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--exploits", type=int, default=50)
+    parser.add_argument(
+        "--flags", type=int, default=5, help="Flags per enqueue request."
+    )
+    parser.add_argument("--dashboards", type=int, default=20)
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=0.5,
+        help="Average seconds between requests of a dashboard.",
+    )
+    args = parser.parse_args()
+
+    auth = ("load_test", args.password)
+    recorder = Recorder()
+    deadline = time.time() + args.duration
+
+    with ThreadPoolExecutor(args.exploits + args.dashboards) as executor:
+        for _ in range(args.exploits):
+            executor.submit(
+                exploit_user, args.url, auth, recorder, deadline, args.flags
+            )
+        for _ in range(args.dashboards):
+            executor.submit(
+                dashboard_user, args.url, auth, recorder, deadline, args.interval
+            )
+
+    for kind, latencies in sorted(recorder.latencies.items()):
+        latencies.sort()
+        print(
+            "{kind:>9}: {count:,} requests ({rate:,.0f}/s, {errors} failed), "
+            "latency p50 {p50:.4f}s p95 {p95:.4f}s p99 {p99:.4f}s "
+            "max {max:.4f}s".format(
+                kind=kind,
+                count=len(latencies),
+                rate=len(latencies) / args.duration,
+                errors=recorder.errors[kind],
+                p50=percentile(latencies, 0.5),
+                p95=percentile(latencies, 0.95),
+                p99=percentile(latencies, 0.99),
+                max=latencies[-1],
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
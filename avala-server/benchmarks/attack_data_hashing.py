@@ -0,0 +1,116 @@
+"""
+Compares ways of fingerprinting fetched attack data, which happens every time the
+game server is polled for new flag IDs, before clients can be woken up.
+
+Reports the time taken by the previous approach (normalizing the data in Python,
+then hashing it with MD5), the canonical fingerprint (serializing with sorted keys,
+then hashing it with BLAKE2), and the short-circuit for raw response bodies that are
+identical to the last one. Run it from a workspace containing server.yaml:
+
+    python benchmarks/attack_data_hashing.py --size 5
+    python benchmarks/attack_data_hashing.py --file teams.json
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import string
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from avala.attack_data import fingerprint_attack_data, fingerprint_bytes
+
+
+def generate_teams_json(size: float) -> bytes:
+    """
+    Generates a teams.json-like document of roughly `size` megabytes, with flag IDs
+    of several services for every team over the last five ticks.
+    """
+
+    def random_string(length: int) -> str:
+        return "".join(random.choices(string.ascii_letters + string.digits, k=length))
+
+    services = 10
+    ticks = 5
+    team_size = services * ticks * 66  # Approximate bytes of flag IDs per team
+    teams = max(1, int(size * 1_000_000 / team_size))
+
+    return json.dumps(
+        {
+            "teams": [
+                {"id": i, "name": random_string(12), "ip": f"10.60.{i}.1"}
+                for i in range(teams)
+            ],
+            "flag_ids": {
+                f"service{s}": {
+                    f"10.60.{t}.1": [
+                        {"username": random_string(12), "note": random_string(20)}
+                        for _ in range(ticks)
+                    ]
+                    for t in range(teams)
+                }
+                for s in range(services)
+            },
+        }
+    ).encode()
+
+
+def previous_fingerprint(data: Any) -> str:
+    """
+    Fingerprint used before, which rebuilt the whole document in Python.
+    """
+
+    def normalize(data: Any) -> Any:
+        if isinstance(data, dict):
+            return {key: normalize(value) for key, value in sorted(data.items())}
+        elif isinstance(data, list):
+            normalized_list = [normalize(item) for item in data]
+            try:
+                return sorted(normalized_list)
+            except TypeError:
+                return normalized_list
+        return data
+
+    return hashlib.md5(json.dumps(normalize(data)).encode()).hexdigest()
+
+
+def measure(func: Callable, arg: Any, repeat: int) -> float:
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        func(arg)
+    return (time.perf_counter() - started_at) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=float, default=5, help="Megabytes to generate.")
+    parser.add_argument("--file", type=Path, help="Use an existing JSON file instead.")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    raw = args.file.read_bytes() if args.file else generate_teams_json(args.size)
+    data = json.loads(raw)
+
+    results = {
+        "previous (normalize + md5)": measure(previous_fingerprint, data, args.repeat),
+        "canonical (sort_keys + blake2b)": measure(
+            fingerprint_attack_data, data, args.repeat
+        ),
+        "raw body parse + canonical": measure(
+            lambda raw: fingerprint_attack_data(json.loads(raw)), raw, args.repeat
+        ),
+        "raw body short-circuit (blake2b)": measure(
+            fingerprint_bytes, raw, args.repeat
+        ),
+    }
+
+    print("Attack data size: %.2f MB" % (len(raw) / 1_000_000))
+    baseline = results["previous (normalize + md5)"]
+    for name, seconds in results.items():
+        print("%34s: %8.2f ms (%.1fx)" % (name, seconds * 1000, baseline / seconds))
+
+
+if __name__ == "__main__":
+    main()
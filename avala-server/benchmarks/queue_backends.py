@@ -0,0 +1,123 @@
+"""
+Compares the RabbitMQ and Postgres queue backends by publishing messages to a
+temporary queue and consuming them in the same process, the way flags travel from
+the server to the submitter.
+
+Reports maximum throughput (messages acknowledged per second) and the latency
+between publishing a message and receiving it in the consumer. Run it from a
+workspace containing server.yaml, with RabbitMQ and Postgres running:
+
+    python benchmarks/queue_backends.py --backend both --messages 20000
+    python benchmarks/queue_backends.py --backend postgres --rate 500
+"""
+
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import delete
+
+from avala.database import create_tables, get_async_engine
+from avala.models import QueueMessage
+from avala.mq.postgres import PostgresConnection
+from avala.mq.rabbit_async import RabbitConnection
+
+QUEUE = "benchmark_queue"
+SENT_AT_HEADER = "x-benchmark-sent-at"
+
+
+async def run(backend: str, messages: int, publishers: int, rate: float) -> dict:
+    connection = RabbitConnection() if backend == "rabbitmq" else PostgresConnection()
+    await connection.connect()
+    queue = await connection.declare_queue(QUEUE)
+
+    latencies: list[float] = []
+    done = asyncio.Event()
+
+    async def consume(message):
+        latencies.append(time.time() - message.headers[SENT_AT_HEADER])
+        await message.ack()
+        if len(latencies) >= messages:
+            done.set()
+
+    async def publish(count: int):
+        interval = publishers / rate if rate else 0
+        for i in range(count):
+            await queue.put("FLAG{%d}" % i, headers={SENT_AT_HEADER: time.time()})
+            if interval:
+                await asyncio.sleep(interval)
+
+    await queue.add_consumer(consume)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(
+        *(
+            publish(messages // publishers + (i < messages % publishers))
+            for i in range(publishers)
+        )
+    )
+    published_at = time.perf_counter()
+    await done.wait()
+    finished_at = time.perf_counter()
+
+    await connection.close()
+
+    latencies.sort()
+    return {
+        "backend": backend,
+        "published_per_second": messages / (published_at - started_at),
+        "consumed_per_second": messages / (finished_at - started_at),
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "max": latencies[-1],
+    }
+
+
+async def cleanup(backend: str):
+    if backend == "rabbitmq":
+        async with RabbitConnection() as connection:
+            await connection.channel.queue_delete(QUEUE)
+    else:
+        async with get_async_engine().begin() as conn:
+            await conn.execute(delete(QueueMessage).where(QueueMessage.queue == QUEUE))
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--backend", choices=["rabbitmq", "postgres", "both"], default="both"
+    )
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--publishers", type=int, default=8)
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=0,
+        help="Messages published per second in total, 0 for as fast as possible.",
+    )
+    args = parser.parse_args()
+
+    await create_tables()
+
+    backends = ["rabbitmq", "postgres"] if args.backend == "both" else [args.backend]
+    for backend in backends:
+        try:
+            result = await run(backend, args.messages, args.publishers, args.rate)
+        finally:
+            await cleanup(backend)
+
+        print(
+            "{backend:>8}: published {published_per_second:,.0f} msg/s, "
+            "consumed {consumed_per_second:,.0f} msg/s, "
+            "latency p50 {p50:.4f}s p95 {p95:.4f}s p99 {p99:.4f}s "
+            "max {max:.4f}s".format(**result)
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,25 @@
+import contextlib
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+
+SERVER_YAML = Path(__file__).parents[1] / "avala/initialization/files/server.yaml"
+
+# Avala reads server.yaml from the working directory once, when its configuration is
+# first imported, so it's imported from a workspace with the default configuration.
+with tempfile.TemporaryDirectory() as workspace, contextlib.chdir(workspace):
+    shutil.copy(SERVER_YAML, workspace)
+    import avala.config  # noqa: F401
+
+
+@pytest.fixture(autouse=True)
+def workspace(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """
+    Runs each test in its own workspace holding the default configuration, so files
+    written by Avala, such as the `.avala` directory, stay out of the repository.
+    """
+    shutil.copy(SERVER_YAML, tmp_path)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
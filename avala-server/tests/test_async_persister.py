@@ -0,0 +1,46 @@
+import unittest
+from unittest import mock
+
+from avala.mq.memory import MemoryConnection
+from avala.schemas import FlagVerdict
+from avala.workers.async_persister import AsyncPersister
+
+
+class AsyncPersisterTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Batches of the persister that fail to reach the database.
+    """
+
+    async def asyncSetUp(self):
+        self.connection = MemoryConnection(maxsize=100)
+        self.addAsyncCleanup(self.connection.close)
+        self.persisting_queue = await self.connection.declare_queue("persisting_queue")
+        self.expired_queue = await self.connection.declare_queue("expired_queue")
+        self.persister = AsyncPersister(self.connection, owns_connection=False)
+
+        patch = mock.patch(
+            "avala.workers.async_persister.get_async_db_session",
+            side_effect=ConnectionRefusedError("Database is down."),
+        )
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    async def test_responses_are_requeued(self):
+        for i in range(3):
+            verdict = FlagVerdict(value="FLAG{%d}" % i, status="accepted", response="")
+            await self.persisting_queue.put(verdict.model_dump_json())
+
+        with self.assertRaises(ConnectionRefusedError):
+            await self.persister._persist_responses_in_batches()
+        self.assertEqual(await self.persisting_queue.size(), 3)
+
+    async def test_expired_flags_are_requeued(self):
+        await self.expired_queue.put("FLAG{0}")
+
+        with self.assertRaises(ConnectionRefusedError):
+            await self.persister._persist_expired_flags_in_batches()
+        self.assertEqual(await self.expired_queue.size(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,204 @@
+import gzip
+import json
+import unittest
+from collections import deque
+from unittest import mock
+
+from fastapi import Request
+
+from avala import attack_data
+from avala.attack_data import AttackDataPoller, AttackDataSnapshot, diff_attack_data
+from avala.routes.attack_data import snapshot_response
+
+
+def apply_delta(data: dict, delta: dict) -> dict:
+    """
+    Applies a delta the way clients do (see `apply_attack_data_delta` of the client).
+    """
+    data = json.loads(json.dumps(data))
+    for service, targets_delta in delta.items():
+        if targets_delta is None:
+            data.pop(service, None)
+            continue
+
+        targets = data.setdefault(service, {})
+        for target, change in targets_delta.items():
+            if change is None:
+                targets.pop(target, None)
+            elif "replace" in change:
+                targets[target] = change["replace"]
+            else:
+                targets[target] = (change["prepend"] + targets[target])[
+                    : change["length"]
+                ]
+    return data
+
+
+def create_request(**headers: str) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/attack-data/subscribe",
+            "headers": [
+                (name.replace("_", "-").encode(), value.encode())
+                for name, value in headers.items()
+            ],
+        }
+    )
+
+
+def create_snapshot(data: dict, previous: list[AttackDataSnapshot] | None = None):
+    return AttackDataSnapshot("hash", json.dumps(data), tick=5, previous=previous)
+
+
+OLD = {
+    "Notes": {
+        "10.10.1.1": ["c", "b", "a"],
+        "10.10.2.1": ["z", "y", "x"],
+        "10.10.3.1": ["q"],
+    },
+    "Removed": {"10.10.1.1": ["r"]},
+}
+
+NEW = {
+    "Notes": {
+        "10.10.1.1": ["d", "c", "b"],  # Shifted by one tick
+        "10.10.2.1": ["w", "v", "u"],  # Changed completely
+        "10.10.4.1": ["n"],  # Added
+    },
+    "Added": {"10.10.1.1": ["s"]},
+}
+
+
+class AttackDataDeltaTest(unittest.TestCase):
+    """
+    Deltas between versions of attack data.
+    """
+
+    def test_delta(self):
+        self.assertEqual(
+            diff_attack_data(OLD, NEW),
+            {
+                "Removed": None,
+                "Notes": {
+                    "10.10.1.1": {"prepend": ["d"], "length": 3},
+                    "10.10.2.1": {"replace": ["w", "v", "u"]},
+                    "10.10.3.1": None,
+                    "10.10.4.1": {"replace": ["n"]},
+                },
+                "Added": {"10.10.1.1": {"replace": ["s"]}},
+            },
+        )
+
+    def test_round_trip(self):
+        self.assertEqual(apply_delta(OLD, diff_attack_data(OLD, NEW)), NEW)
+        self.assertEqual(apply_delta(NEW, diff_attack_data(NEW, OLD)), OLD)
+
+    def test_unchanged_data_has_empty_delta(self):
+        self.assertEqual(diff_attack_data(OLD, OLD), {})
+
+    def test_snapshot_encodes_deltas_from_previous_versions(self):
+        old = create_snapshot(OLD)
+        new = create_snapshot(NEW, previous=[old])
+        self.assertEqual(list(new.deltas), [old.version])
+
+        delta = json.loads(new.deltas[old.version].body)
+        self.assertEqual(apply_delta(OLD, delta), NEW)
+
+
+class SnapshotResponseTest(unittest.TestCase):
+    """
+    Conditional and delta responses of pre-encoded attack data.
+    """
+
+    def setUp(self):
+        self.old = create_snapshot(OLD)
+        self.new = create_snapshot(NEW, previous=[self.old])
+
+    def test_full_response(self):
+        response = snapshot_response(create_request(), self.new)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.body), NEW)
+        self.assertEqual(response.headers["ETag"], self.new.etag)
+        self.assertEqual(response.headers["X-Avala-Version"], self.new.version)
+        self.assertEqual(response.headers["X-Avala-Tick"], "5")
+
+    def test_matching_etag_is_not_modified(self):
+        for if_none_match in (self.new.etag, 'W/"other", %s' % self.new.etag):
+            response = snapshot_response(
+                create_request(if_none_match=if_none_match), self.new
+            )
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.body, b"")
+
+    def test_known_version_is_not_modified(self):
+        response = snapshot_response(
+            create_request(), self.new, known_version=self.new.version, delta=True
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_stale_etag_gets_full_response(self):
+        response = snapshot_response(
+            create_request(if_none_match=self.old.etag), self.new
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_delta_response(self):
+        response = snapshot_response(
+            create_request(), self.new, known_version=self.old.version, delta=True
+        )
+        self.assertEqual(response.headers["X-Avala-Delta-Base"], self.old.version)
+        self.assertEqual(response.headers["X-Avala-Version"], self.new.version)
+        self.assertEqual(apply_delta(OLD, json.loads(response.body)), NEW)
+
+    def test_unknown_base_gets_full_response(self):
+        response = snapshot_response(
+            create_request(), self.new, known_version="unknown", delta=True
+        )
+        self.assertNotIn("X-Avala-Delta-Base", response.headers)
+        self.assertEqual(json.loads(response.body), NEW)
+
+    def test_compressed_response(self):
+        data = {"Notes": {"10.10.%d.1" % i: ["flag-id-%d" % i] for i in range(100)}}
+        snapshot = create_snapshot(data)
+
+        response = snapshot_response(
+            create_request(accept_encoding="gzip;q=1, zstd;q=0"), snapshot
+        )
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(response.body)), data)
+
+    def test_missing_attack_data(self):
+        self.assertEqual(snapshot_response(create_request(), None).status_code, 202)
+
+
+class AttackDataPollerTest(unittest.IsolatedAsyncioTestCase):
+    async def test_new_data_is_stored_before_it_is_announced(self):
+        events = []
+
+        async def store_attack_data(json_hash: str, data: str, tick: int):
+            events.append(("store", json.loads(data), attack_data.current_snapshot))
+
+        async def announce_snapshot(snapshot: AttackDataSnapshot):
+            events.append(("announce", snapshot.data, attack_data.current_snapshot))
+
+        with mock.patch.multiple(
+            attack_data,
+            current_snapshot=None,
+            raw_fingerprint=None,
+            snapshot_history=deque(),
+            store_attack_data=store_attack_data,
+            announce_snapshot=announce_snapshot,
+        ):
+            poller = AttackDataPoller(
+                lambda: json.dumps(OLD), lambda data: data, json_hash=None, tick=5
+            )
+            self.assertTrue(await poller.poll())
+            snapshot = attack_data.current_snapshot
+
+        self.assertEqual(events, [("store", OLD, None), ("announce", OLD, snapshot)])
+
+
+if __name__ == "__main__":
+    unittest.main()
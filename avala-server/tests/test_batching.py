@@ -0,0 +1,59 @@
+import unittest
+
+from avala.config import AdaptiveBatchingConfig
+from avala.workers.batching import AdaptiveBatchSize
+
+
+class AdaptiveBatchSizeTest(unittest.TestCase):
+    """
+    Additive increase, multiplicative decrease of the batch size.
+    """
+
+    def setUp(self):
+        self.settings = AdaptiveBatchingConfig(
+            min_size=10,
+            max_size=100,
+            target_latency=1,
+            increase=10,
+            decrease_factor=0.5,
+            max_requeue_ratio=0.1,
+        )
+        self.batching = AdaptiveBatchSize(self.settings, initial_size=40)
+
+    def test_initial_size_is_clamped(self):
+        self.assertEqual(AdaptiveBatchSize(self.settings, 1).size, 10)
+        self.assertEqual(AdaptiveBatchSize(self.settings, float("inf")).size, 100)
+
+    def test_full_fast_batches_grow_additively(self):
+        self.assertEqual(self.batching.record(40, latency=0.5, requeued_count=0), 50)
+        self.assertEqual(self.batching.record(50, latency=0.5, requeued_count=0), 60)
+
+    def test_growth_stops_at_max_size(self):
+        for _ in range(10):
+            self.batching.record(self.batching.size, latency=0.5, requeued_count=0)
+        self.assertEqual(self.batching.size, 100)
+
+    def test_partial_batches_keep_the_size(self):
+        self.assertEqual(self.batching.record(5, latency=0.5, requeued_count=0), 40)
+
+    def test_slow_batch_shrinks_multiplicatively(self):
+        self.assertEqual(self.batching.record(40, latency=2, requeued_count=0), 20)
+        self.assertEqual(self.batching.record(20, latency=2, requeued_count=0), 10)
+
+    def test_shrinking_stops_at_min_size(self):
+        for _ in range(10):
+            self.batching.record_failure()
+        self.assertEqual(self.batching.size, 10)
+
+    def test_few_requeued_flags_are_tolerated(self):
+        self.assertEqual(self.batching.record(40, latency=0.5, requeued_count=4), 50)
+
+    def test_requeued_flags_shrink(self):
+        self.assertEqual(self.batching.record(40, latency=0.5, requeued_count=5), 20)
+
+    def test_failure_shrinks(self):
+        self.assertEqual(self.batching.record_failure(), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
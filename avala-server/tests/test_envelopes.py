@@ -0,0 +1,39 @@
+import unittest
+
+from avala.mq.envelopes import COUNT_HEADER, pack, strip_envelope_headers, unpack
+
+
+class EnvelopeTest(unittest.TestCase):
+    """
+    Packing multiple flags or responses into a single message.
+    """
+
+    def test_single_item_is_sent_plain(self):
+        body, headers = pack(["FLAG{a}"])
+        self.assertEqual(body, "FLAG{a}")
+        self.assertIsNone(headers)
+        self.assertEqual(unpack(body.encode(), headers), ["FLAG{a}"])
+
+    def test_round_trip(self):
+        items = ["FLAG{a}", "FLAG{b}", '{"value": "FLAG{c}", "status": "accepted"}']
+        body, headers = pack(items)
+        self.assertEqual(headers, {COUNT_HEADER: 3})
+        self.assertEqual(unpack(body.encode(), headers), items)
+
+    def test_plain_message_is_a_single_item(self):
+        self.assertEqual(unpack(b"FLAG{a}\n", {"x-avala-attempts": 2}), ["FLAG{a}"])
+
+    def test_blank_lines_are_skipped(self):
+        self.assertEqual(
+            unpack(b"FLAG{a}\n\nFLAG{b}\n", {COUNT_HEADER: 2}), ["FLAG{a}", "FLAG{b}"]
+        )
+
+    def test_strip_envelope_headers(self):
+        headers = {COUNT_HEADER: 3, "x-avala-attempts": 2}
+        self.assertEqual(strip_envelope_headers(headers), {"x-avala-attempts": 2})
+        self.assertEqual(headers[COUNT_HEADER], 3)
+        self.assertEqual(strip_envelope_headers(None), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from avala.leader import LeaderElection
+
+
+class FakeLock:
+    """
+    Advisory lock held by at most one fake connection at a time.
+    """
+
+    def __init__(self) -> None:
+        self.holder: FakeConnection | None = None
+
+
+class FakeConnection:
+    """
+    Stands in for the asyncpg connection holding the leader lock.
+    """
+
+    def __init__(self, lock: FakeLock) -> None:
+        self.lock = lock
+        self.broken = False
+        self.closed = False
+
+    async def fetchval(self, query: str, *args, **kwargs):
+        if self.broken:
+            raise ConnectionResetError("Connection lost.")
+        if "pg_try_advisory_lock" in query:
+            if self.lock.holder is None:
+                self.lock.holder = self
+            return self.lock.holder is self
+        return 1
+
+    def is_closed(self) -> bool:
+        return self.closed
+
+    def terminate(self):
+        self.closed = True
+        if self.lock.holder is self:
+            self.lock.holder = None  # Postgres ends the session
+
+    async def close(self):
+        self.terminate()
+
+
+class LeaderElectionTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.lock = FakeLock()
+        self.connections: list[FakeConnection] = []
+
+        async def connect(*args, **kwargs):
+            connection = FakeConnection(self.lock)
+            self.connections.append(connection)
+            return connection
+
+        patch = mock.patch("avala.leader.asyncpg.connect", connect)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    async def start_election(self, events: list[str]) -> LeaderElection:
+        election = LeaderElection(
+            on_elected=lambda: events.append("elected"),
+            on_demoted=lambda: events.append("demoted"),
+            retry_interval=0.05,
+        )
+        await election.start()
+        self.addAsyncCleanup(election.stop)
+        return election
+
+    async def test_single_leader(self):
+        first_events: list[str] = []
+        second_events: list[str] = []
+        first = await self.start_election(first_events)
+        await asyncio.sleep(0.1)
+        second = await self.start_election(second_events)
+        await asyncio.sleep(0.1)
+
+        self.assertTrue(first.is_leader)
+        self.assertFalse(second.is_leader)
+        self.assertEqual((first_events, second_events), (["elected"], []))
+
+    async def test_other_worker_takes_over_after_stop(self):
+        first = await self.start_election([])
+        await asyncio.sleep(0.1)
+        second = await self.start_election([])
+
+        await first.stop()
+        await asyncio.sleep(0.1)
+        self.assertTrue(second.is_leader)
+
+    async def test_leader_steps_down_when_connection_fails(self):
+        events: list[str] = []
+        election = await self.start_election(events)
+        await asyncio.sleep(0.1)
+
+        self.connections[0].broken = True
+        await asyncio.sleep(0.2)
+
+        self.assertEqual(events, ["elected", "demoted", "elected"])
+        self.assertTrue(election.is_leader)
+        self.assertIs(self.lock.holder, self.connections[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
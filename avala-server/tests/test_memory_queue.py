@@ -0,0 +1,103 @@
+import unittest
+from pathlib import Path
+
+from avala.mq.memory import MemoryConnection
+
+
+class MemoryJournalTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Messages of the in-memory queues survive restarts until they are acknowledged.
+    """
+
+    async def asyncSetUp(self):
+        self.journal_path = Path("queue_journal.jsonl")
+
+    async def restart(self) -> MemoryConnection:
+        connection = MemoryConnection(maxsize=100, journal_path=self.journal_path)
+        await connection.connect()
+        self.addAsyncCleanup(connection.close)
+        await connection.declare_queue("persisting_queue")
+        return connection
+
+    async def drain(self, connection: MemoryConnection) -> list[str]:
+        queue = connection.get_queue("persisting_queue")
+        bodies = []
+        while (message := await queue.get()) is not None:
+            bodies.append(message.body.decode())
+        return bodies
+
+    async def test_unacknowledged_messages_are_replayed(self):
+        connection = await self.restart()
+        queue = connection.get_queue("persisting_queue")
+        for i in range(3):
+            await queue.put("FLAG{%d}" % i, headers={"i": i}, priority=i)
+
+        message = await queue.get()
+        self.assertEqual(message.body, b"FLAG{2}")  # Highest priority first
+        await message.ack()
+        await connection.close()
+
+        connection = await self.restart()
+        queue = connection.get_queue("persisting_queue")
+        message = await queue.get()
+        self.assertEqual((message.body, message.headers), (b"FLAG{1}", {"i": 1}))
+        self.assertEqual(await self.drain(connection), ["FLAG{0}"])
+
+    async def test_replayed_messages_can_be_acknowledged(self):
+        connection = await self.restart()
+        await connection.get_queue("persisting_queue").put("FLAG{0}")
+        await connection.close()
+
+        connection = await self.restart()
+        message = await connection.get_queue("persisting_queue").get()
+        await message.ack()
+        await connection.close()
+
+        connection = await self.restart()
+        self.assertEqual(await self.drain(connection), [])
+
+    async def test_requeued_messages_are_kept(self):
+        connection = await self.restart()
+        queue = connection.get_queue("persisting_queue")
+        await queue.put("FLAG{0}")
+        await (await queue.get()).reject(requeue=True)
+        await connection.close()
+
+        connection = await self.restart()
+        self.assertEqual(await self.drain(connection), ["FLAG{0}"])
+
+    async def test_dropped_messages_are_removed(self):
+        connection = await self.restart()
+        queue = connection.get_queue("persisting_queue")
+        await queue.put("FLAG{0}")
+        await (await queue.get()).reject()  # The queue has no dead-letter queue
+        await connection.close()
+
+        connection = await self.restart()
+        self.assertEqual(await self.drain(connection), [])
+
+    async def test_journal_is_compacted(self):
+        connection = await self.restart()
+        queue = connection.get_queue("persisting_queue")
+        for i in range(10):
+            await queue.put("FLAG{%d}" % i)
+        for _ in range(9):
+            await (await queue.get()).ack()
+        await connection.close()
+
+        await self.restart()
+        self.assertEqual(len(self.journal_path.read_text().splitlines()), 1)
+
+    async def test_partially_written_record_is_skipped(self):
+        connection = await self.restart()
+        await connection.get_queue("persisting_queue").put("FLAG{0}")
+        await connection.close()
+        with self.journal_path.open("a") as file:
+            file.write('{"op": "put", "id": 2, "que')
+
+        connection = await self.restart()
+        self.assertEqual(await self.drain(connection), ["FLAG{0}"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import asyncpg
+from sqlalchemy import delete
+
+from avala.config import config
+from avala.database import create_tables, dispose_engines, get_async_engine
+from avala.models import QueueMessage
+from avala.mq.postgres import PostgresConnection
+
+
+async def check_database():
+    """
+    Skips the test if the database configured in server.yaml isn't reachable.
+    """
+    try:
+        connection = await asyncpg.connect(config.database.dsn(), timeout=2)
+    except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+        raise unittest.SkipTest("Postgres is not available: %s" % e)
+    await connection.close()
+
+
+class PostgresQueueTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Queues stored in Postgres. Needs the database configured in server.yaml.
+    """
+
+    async def asyncSetUp(self):
+        await check_database()
+        self.addAsyncCleanup(dispose_engines)
+
+        await create_tables()
+        async with get_async_engine().begin() as conn:
+            await conn.execute(delete(QueueMessage))
+
+        self.connection = PostgresConnection()
+        self.queue = await self.connection.declare_queue(
+            "submission_queue",
+            arguments={
+                "x-dead-letter-exchange": "",
+                "x-dead-letter-routing-key": "expired_queue",
+            },
+        )
+        self.expired_queue = await self.connection.declare_queue("expired_queue")
+
+    async def enqueue(self, count: int, **kwargs):
+        for i in range(count):
+            await self.queue.put("FLAG{%d}" % i, **kwargs)
+
+    async def test_leases_in_priority_order(self):
+        await self.queue.put("FLAG{low}", priority=1)
+        await self.queue.put("FLAG{high}", priority=5)
+        await self.queue.put("FLAG{low2}", priority=1)
+
+        messages, fetched_count = await self.queue.dequeue(10)
+        self.assertEqual(fetched_count, 3)
+        self.assertEqual(
+            [message.body for message in messages],
+            [b"FLAG{high}", b"FLAG{low}", b"FLAG{low2}"],
+        )
+
+    async def test_concurrent_consumers_lease_different_messages(self):
+        await self.enqueue(20)
+
+        results = await asyncio.gather(*[self.queue.dequeue(5) for _ in range(4)])
+        self.assertEqual([fetched_count for _, fetched_count in results], [5] * 4)
+        tags = [message.delivery_tag for messages, _ in results for message in messages]
+        self.assertEqual(len(tags), 20)
+        self.assertEqual(len(set(tags)), 20)
+
+    async def test_leased_messages_are_not_delivered_again(self):
+        await self.enqueue(1)
+        self.assertIsNotNone(await self.queue.get())
+        self.assertIsNone(await self.queue.get())
+
+    async def test_expired_lease_is_delivered_again(self):
+        await self.enqueue(1)
+        with mock.patch.object(config.queue, "lease", 0.2):
+            first = await self.queue.get()
+            self.assertIsNone(await self.queue.get())
+
+            await asyncio.sleep(0.3)
+            second = await self.queue.get()
+
+        self.assertEqual(second.delivery_tag, first.delivery_tag)
+
+    async def test_ack_deletes_message(self):
+        await self.enqueue(1)
+        await (await self.queue.get()).ack()
+        self.assertEqual(await self.queue.size(), 0)
+
+    async def test_requeued_message_is_available_right_away(self):
+        await self.enqueue(1)
+        message = await self.queue.get()
+        await message.reject(requeue=True)
+        self.assertEqual((await self.queue.get()).delivery_tag, message.delivery_tag)
+
+    async def test_rejected_message_is_dead_lettered(self):
+        await self.enqueue(1)
+        await (await self.queue.get()).reject()
+        self.assertEqual(await self.queue.size(), 0)
+        self.assertEqual((await self.expired_queue.get()).body, b"FLAG{0}")
+
+    async def test_expired_message_is_dead_lettered(self):
+        await self.enqueue(1, ttl="1")
+        await asyncio.sleep(0.05)
+
+        self.assertIsNone(await self.queue.get())
+        self.assertEqual((await self.expired_queue.get()).body, b"FLAG{0}")
+
+    async def test_delay_queue(self):
+        delay_queue = await self.connection.declare_queue(
+            "submission_retry_0.2s",
+            arguments={
+                "x-message-ttl": 200,
+                "x-dead-letter-exchange": "",
+                "x-dead-letter-routing-key": "submission_queue",
+            },
+        )
+        await delay_queue.put("FLAG{0}")
+
+        self.assertIsNone(await self.queue.get())
+        await asyncio.sleep(0.3)
+        self.assertEqual((await self.queue.get()).body, b"FLAG{0}")
+
+    async def start_consumer(self, delivered: list[int]) -> PostgresConnection:
+        """
+        Starts a consumer that holds messages in a buffer and acknowledges them one
+        by one, like the submitter.
+        """
+        connection = PostgresConnection()
+        await connection.set_prefetch(5)
+        self.addAsyncCleanup(connection.close)
+        queue = await connection.declare_queue("submission_queue")
+
+        buffer: asyncio.Queue = asyncio.Queue()
+
+        async def process():
+            while True:
+                message = await buffer.get()
+                await asyncio.sleep(0.05)
+                delivered.append(message.delivery_tag)
+                await message.ack()
+
+        async def buffer_message(message):
+            await buffer.put(message)
+
+        connection.spawn(process())
+        await queue.add_consumer(buffer_message)
+        return connection
+
+    async def test_consumers_share_backlog(self):
+        await self.enqueue(40)
+        first: list[int] = []
+        second: list[int] = []
+
+        # Processing the whole backlog by one consumer takes longer than the lease,
+        # so messages held in its buffer would be delivered again.
+        with mock.patch.multiple(config.queue, lease=1, poll_interval=0.05):
+            await self.start_consumer(first)
+            await self.start_consumer(second)
+            for _ in range(100):
+                if len(first) + len(second) >= 40:
+                    break
+                await asyncio.sleep(0.05)
+            await asyncio.sleep(1.1)  # Leases of held messages would run out
+
+        self.assertTrue(first)
+        self.assertTrue(second)
+        self.assertCountEqual(first + second, set(first + second))
+        self.assertEqual(len(first + second), 40)
+        self.assertEqual(await self.queue.size(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+from unittest import mock
+
+from avala.workers.rate_limit import TokenBucket
+
+
+class TokenBucketTest(unittest.TestCase):
+    """
+    Token bucket shared by submission lanes, on a fake clock.
+    """
+
+    def setUp(self):
+        self.now = 1000.0
+        patches = [
+            mock.patch("avala.workers.rate_limit.time.monotonic", lambda: self.now),
+            mock.patch("avala.workers.rate_limit.time.sleep"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.bucket = TokenBucket(rate=10, capacity=5)
+
+    def test_full_bucket_doesnt_wait(self):
+        self.assertEqual(self.bucket.acquire(5), 0)
+
+    def test_debt_is_paid_off_at_rate(self):
+        self.bucket.acquire(5)
+        self.assertAlmostEqual(self.bucket.acquire(2), 0.2)
+        self.assertAlmostEqual(self.bucket.acquire(1), 0.3)
+
+    def test_tokens_refill_over_time(self):
+        self.bucket.acquire(5)
+        self.now += 0.5
+        self.assertEqual(self.bucket.acquire(4), 0)
+        self.assertAlmostEqual(self.bucket.acquire(2), 0.1)
+
+    def test_refill_is_capped_at_capacity(self):
+        self.bucket.acquire(5)
+        self.now += 100
+        self.assertEqual(self.bucket.acquire(5), 0)
+        self.assertAlmostEqual(self.bucket.acquire(1), 0.1)
+
+    def test_batch_larger_than_capacity_goes_into_debt(self):
+        self.assertAlmostEqual(self.bucket.acquire(25), 2)
+        self.now += 2
+        self.assertAlmostEqual(self.bucket.acquire(1), 0.1)
+
+
+class TokenBucketAsyncTest(unittest.IsolatedAsyncioTestCase):
+    async def test_waits_without_blocking(self):
+        bucket = TokenBucket(rate=100, capacity=1)
+        with mock.patch("avala.workers.rate_limit.time.sleep") as sleep:
+            self.assertEqual(await bucket.acquire_async(), 0)
+            self.assertGreater(await bucket.acquire_async(), 0)
+        sleep.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import time
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+from avala.config import config
+from avala.mq.metadata import PLANTED_AT_HEADER
+from avala.mq.queues import get_flag_priority, get_planted_at
+from avala.mq.retry import (
+    flag_expires_within,
+    get_flag_age,
+    get_retry_delay,
+    get_retry_queue_arguments,
+    get_retry_queue_name,
+)
+
+
+class RetryDelayTest(unittest.TestCase):
+    """
+    Selection of the delay queue a requeued flag waits in.
+    """
+
+    def setUp(self):
+        patch = mock.patch.object(config.submitter, "retry_delays", [1, 2, 4])
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_delays_follow_tiers(self):
+        self.assertEqual([get_retry_delay(n) for n in (1, 2, 3)], [1, 2, 4])
+
+    def test_delays_stay_at_last_tier(self):
+        self.assertEqual(get_retry_delay(4), 4)
+        self.assertEqual(get_retry_delay(100), 4)
+
+    def test_delay_queue_dead_letters_to_submission_queue(self):
+        self.assertEqual(get_retry_queue_name(0.5), "submission_retry_0.5s")
+        self.assertEqual(
+            get_retry_queue_arguments(0.5),
+            {
+                "x-message-ttl": 500,
+                "x-dead-letter-exchange": "",
+                "x-dead-letter-routing-key": "submission_queue",
+            },
+        )
+
+
+class FlagExpiryTest(unittest.TestCase):
+    """
+    Age and expiry of flags based on the timestamps of their messages.
+    """
+
+    def setUp(self):
+        patch = mock.patch.object(config.game, "flag_ttl", 300)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_age_of_every_timestamp_type(self):
+        timestamp = time.time() - 60
+        aware = datetime.fromtimestamp(timestamp, timezone.utc)
+        naive = aware.replace(tzinfo=None)  # aio-pika's timestamps are in UTC
+
+        for value in (timestamp, int(timestamp), aware, naive):
+            self.assertAlmostEqual(get_flag_age(value), 60, delta=1)
+
+    def test_flags_without_timestamp_never_expire(self):
+        self.assertIsNone(get_flag_age(None))
+        self.assertFalse(flag_expires_within(None, 10**6))
+
+    def test_expires_within(self):
+        timestamp = time.time() - 250
+        self.assertFalse(flag_expires_within(timestamp))
+        self.assertFalse(flag_expires_within(timestamp, 40))
+        self.assertTrue(flag_expires_within(timestamp, 60))
+        self.assertTrue(flag_expires_within(time.time() - 300))
+
+
+class FlagPriorityTest(unittest.TestCase):
+    """
+    Priorities of flags, which are based on the estimated time they were planted.
+    """
+
+    def setUp(self):
+        patch = mock.patch.object(config.game, "flag_ttl", 300)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_priority_grows_with_age(self):
+        self.assertEqual(get_flag_priority(time.time()), 0)
+        self.assertEqual(get_flag_priority(time.time() - 150), 5)
+        self.assertEqual(get_flag_priority(time.time() - 1000), 10)
+
+    def test_retried_flags_keep_planting_time(self):
+        enqueued_at = time.time() - 10
+        planted_at = enqueued_at - 140
+        headers = {PLANTED_AT_HEADER: int(planted_at * 1000)}
+
+        self.assertAlmostEqual(
+            get_planted_at(headers, int(enqueued_at)), planted_at, places=2
+        )
+        self.assertEqual(
+            get_flag_priority(get_planted_at(headers, int(enqueued_at))),
+            get_flag_priority(planted_at),
+        )
+
+    def test_messages_without_header_use_timestamp(self):
+        self.assertEqual(get_planted_at({}, 1234), 1234)
+        self.assertEqual(get_planted_at(None, None), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import itertools
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from sqlalchemy import delete, select, text, update
+
+from avala.config import config
+from avala.database import (
+    compact_flag_status_counts,
+    create_tables,
+    dispose_engines,
+    get_async_db_session,
+    get_async_engine,
+)
+from avala.models import Flag, FlagStatusCount
+from avala.routes.statistics import dashboard_view_stats
+
+from .test_postgres_queue import check_database
+
+
+class FlagStatusCountTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Flag counts kept by triggers on the flags table. Needs the database configured
+    in server.yaml.
+    """
+
+    async def asyncSetUp(self):
+        await check_database()
+        self.addAsyncCleanup(dispose_engines)
+
+        await create_tables()
+        async with get_async_engine().begin() as conn:
+            await conn.execute(text("TRUNCATE flags"))
+        self.ids = itertools.count()
+
+    async def add_flags(self, count: int, status: str = "queued", **kwargs):
+        async with get_async_db_session() as db:
+            db.add_all(
+                Flag(value="FLAG{%d}" % next(self.ids), status=status, **kwargs)
+                for _ in range(count)
+            )
+
+    async def set_status(self, status: str, *values: str):
+        async with get_async_db_session() as db:
+            await db.execute(
+                update(Flag).where(Flag.value.in_(values)).values(status=status)
+            )
+
+    async def get_stats(self):
+        async with get_async_db_session() as db:
+            return await dashboard_view_stats(db, "user")
+
+    async def test_counts_follow_writes(self):
+        await self.add_flags(3)
+        await self.set_status("accepted", "FLAG{0}", "FLAG{1}")
+        await self.set_status("rejected", "FLAG{1}")
+        await self.add_flags(2, status="expired")
+
+        stats = await self.get_stats()
+        self.assertEqual(
+            (stats.queued, stats.accepted, stats.rejected, stats.expired),
+            (1, 1, 1, 2),
+        )
+
+        async with get_async_db_session() as db:
+            await db.execute(delete(Flag).where(Flag.status == "expired"))
+        self.assertEqual((await self.get_stats()).expired, 0)
+
+    async def test_compaction_keeps_counts(self):
+        for i in range(3):
+            await self.add_flags(2)
+            await self.set_status("accepted", "FLAG{%d}" % (i * 2))
+            async with get_async_engine().begin() as conn:
+                await conn.execute(delete(Flag).where(Flag.status == "queued"))
+        await self.add_flags(2)
+
+        before = await self.get_stats()
+        await compact_flag_status_counts()
+        self.assertEqual(await self.get_stats(), before)
+        self.assertEqual((before.queued, before.accepted), (2, 3))
+
+        async with get_async_db_session() as db:
+            rows = (await db.execute(select(FlagStatusCount.status))).scalars().all()
+        self.assertCountEqual(rows, ["queued", "accepted"])
+
+    async def test_stale_queued_flags_are_not_counted(self):
+        with mock.patch.object(config.game, "flag_ttl", 60):
+            await self.add_flags(2)
+            await self.add_flags(
+                3, status="queued", timestamp=datetime.now() - timedelta(minutes=5)
+            )
+            self.assertEqual((await self.get_stats()).queued, 2)
+
+    async def test_existing_flags_are_counted(self):
+        await self.add_flags(2, status="accepted")
+        async with get_async_engine().begin() as conn:
+            await conn.execute(text("DROP TRIGGER flags_count_inserts ON flags"))
+            await conn.execute(delete(FlagStatusCount))
+
+        await create_tables()
+        self.assertEqual((await self.get_stats()).accepted, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
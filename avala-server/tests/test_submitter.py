@@ -0,0 +1,156 @@
+import asyncio
+import time
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import yaml
+
+from avala.broadcast import emitter
+from avala.config import AvalaConfig, config
+from avala.mq.memory import MemoryConnection
+from avala.workers.async_submitter import AsyncSubmitter
+
+
+def create_user_module(submitted: list[list[str]]) -> SimpleNamespace:
+    """
+    Creates a user module with a sync submit function that accepts every flag and
+    records the batches it was called with.
+    """
+
+    def submit(flags: list[str]):
+        time.sleep(0.01)
+        submitted.append(flags)
+        return [(flag, "accepted", "OK") for flag in flags]
+
+    return SimpleNamespace(submit=submit)
+
+
+async def wait_until(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("Condition not met within %gs." % timeout)
+        await asyncio.sleep(0.01)
+
+
+class SubmitterReplicasTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Batched submission with multiple replicas consuming the same queue.
+    """
+
+    async def asyncSetUp(self):
+        patches = [
+            mock.patch.object(emitter, "emit"),
+            mock.patch.multiple(
+                config.submitter,
+                interval=None,
+                per_tick=None,
+                batch_size=5,
+                prefetch=5,
+                flush_interval=60,
+                workers=1,
+                rate_limit=None,
+                adaptive_batching=None,
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.connection = MemoryConnection(maxsize=1000)
+        await self.connection.connect()
+        self.replicas: list[AsyncSubmitter] = []
+        self.tasks: list[asyncio.Task] = []
+
+    async def asyncTearDown(self):
+        for task in self.tasks:
+            task.cancel()
+        for replica in self.replicas:
+            for task in replica.tasks:
+                task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        await self.connection.close()
+
+    async def start_replica(self, submitted: list[list[str]]):
+        replica = AsyncSubmitter(
+            create_user_module(submitted),
+            connection=self.connection,
+            owns_connection=False,
+        )
+        self.replicas.append(replica)
+        self.tasks.append(asyncio.create_task(replica.start()))
+        await asyncio.sleep(0.05)  # Let the replica declare queues and subscribe
+
+    async def enqueue(self, count: int):
+        queue = self.connection.get_queue("submission_queue")
+        for i in range(count):
+            await queue.put("FLAG{%d}" % i)
+
+    async def test_replicas_share_queue(self):
+        first: list[list[str]] = []
+        second: list[list[str]] = []
+        await self.start_replica(first)
+        await self.start_replica(second)
+
+        await self.enqueue(40)
+        await wait_until(lambda: sum(map(len, first + second)) == 40)
+
+        # Each replica holds at most `prefetch` unacknowledged flags, so the other
+        # replica takes the next ones while the first one is submitting.
+        self.assertTrue(first)
+        self.assertTrue(second)
+        self.assertCountEqual(
+            [flag for batch in first + second for flag in batch],
+            ["FLAG{%d}" % i for i in range(40)],
+        )
+        self.assertTrue(all(len(batch) == 5 for batch in first + second))
+
+    async def test_partial_buffer_is_flushed(self):
+        config.submitter.flush_interval = 0.2
+        submitted: list[list[str]] = []
+        await self.start_replica(submitted)
+
+        await self.enqueue(3)
+        await asyncio.sleep(0.05)
+        self.assertEqual(submitted, [])  # Below the batch size
+
+        await wait_until(lambda: submitted, timeout=2)
+        self.assertEqual(sorted(submitted[0]), ["FLAG{0}", "FLAG{1}", "FLAG{2}"])
+
+
+class PrefetchValidationTest(unittest.TestCase):
+    """
+    Prefetch counts messages, while batch sizes count flags.
+    """
+
+    def validate(self, prefetch: int, envelopes: bool) -> AvalaConfig:
+        with open("server.yaml") as file:
+            data = yaml.safe_load(file)
+        data["submitter"].update(
+            interval=None, per_tick=None, batch_size=50, prefetch=prefetch
+        )
+        data["rabbitmq"]["envelopes"] = envelopes
+
+        path = Path("validated.yaml").absolute()
+        with open(path, "w") as file:
+            yaml.safe_dump(data, file)
+        with mock.patch.dict(AvalaConfig.model_config, yaml_file=path):
+            return AvalaConfig()
+
+    def test_prefetch_below_batch_size_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.validate(prefetch=10, envelopes=False)
+
+    def test_prefetch_below_batch_size_is_allowed_with_envelopes(self):
+        config = self.validate(prefetch=10, envelopes=True)
+        self.assertEqual(config.submitter.prefetch, 10)
+
+    def test_prefetch_of_batch_size_is_allowed(self):
+        config = self.validate(prefetch=50, envelopes=False)
+        self.assertEqual(config.submitter.prefetch, 50)
+
+
+if __name__ == "__main__":
+    unittest.main()